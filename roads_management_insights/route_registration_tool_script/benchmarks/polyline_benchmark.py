@@ -0,0 +1,97 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Micro-benchmark of the polyline codec.
+
+Random-walk routes (like dense road LineStrings) are encoded one route at a
+time in pure Python, one route at a time with `encode_polyline`, and all at
+once with `encode_polylines`, then decoded with `decode_polylines`.
+
+    python benchmarks/polyline_benchmark.py
+    python benchmarks/polyline_benchmark.py --points 10000 100000 --points-per-route 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polyline_codec import (
+    _encode_polyline_python,
+    decode_polylines,
+    encode_polyline,
+    encode_polylines,
+)
+
+
+def random_routes(num_points, points_per_route, seed):
+    rng = np.random.default_rng(seed)
+    num_routes = max(1, num_points // points_per_route)
+    starts = np.column_stack(
+        (rng.uniform(25, 49, num_routes), rng.uniform(-124, -67, num_routes))
+    )
+    steps = rng.normal(0, 2e-4, (num_points, 2))
+    offsets = np.linspace(0, num_points, num_routes + 1).astype(np.int64)
+    route_of_point = np.repeat(np.arange(num_routes), np.diff(offsets))
+    # Each route walks away from its own start point.
+    steps[offsets[:-1]] = 0
+    walk = np.cumsum(steps, axis=0)
+    walk -= walk[offsets[:-1]][route_of_point]
+    return starts[route_of_point] + walk, offsets
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--points-per-route", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        f"{'points':>10}{'routes':>9}{'python s':>10}{'per-route s':>13}"
+        f"{'batch s':>9}{'speedup':>9}{'decode s':>10}"
+    )
+    for num_points in args.points:
+        coords, offsets = random_routes(num_points, args.points_per_route, args.seed)
+        routes = [
+            [tuple(p) for p in coords[start:end].tolist()]
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+        expected, python_seconds = timed(lambda: [_encode_polyline_python(r) for r in routes])
+        per_route, per_route_seconds = timed(lambda: [encode_polyline(r) for r in routes])
+        batch, batch_seconds = timed(encode_polylines, coords, offsets)
+        (decoded, decoded_offsets), decode_seconds = timed(decode_polylines, batch)
+        if per_route != expected or batch != expected:
+            raise SystemExit("Encoders disagree with the reference implementation.")
+        if not (decoded_offsets == offsets).all() or np.abs(decoded - coords).max() > 5e-6:
+            raise SystemExit("Decoded coordinates do not match.")
+        print(
+            f"{num_points:>10}{len(routes):>9}{python_seconds:>10.3f}{per_route_seconds:>13.3f}"
+            f"{batch_seconds:>9.3f}{python_seconds / batch_seconds:>8.1f}x{decode_seconds:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark of per-route geometry metrics.
+
+Computes the length, center, bounding box, endpoints and encoded polyline of
+synthetic GeoJSON LineStrings, once route by route as `process_geojson_to_routes`
+used to (Python lists, one pyproj call per route) and once with `RouteGeometry`
+in batches of `--batch-size` routes.
+
+    python benchmarks/route_geometry_benchmark.py
+    python benchmarks/route_geometry_benchmark.py --routes 10000 --points-per-route 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+from pyproj import Geod
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polyline_codec import _encode_polyline_python
+from route_geometry import RouteGeometry
+
+_WGS84_GEOD = Geod(ellps="WGS84")
+
+
+def random_lines(num_routes, points_per_route, seed):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(num_routes):
+        lng, lat = rng.uniform(-124, -67), rng.uniform(25, 49)
+        line = []
+        for _ in range(rng.randint(2, 2 * points_per_route - 2)):
+            lng += rng.gauss(0, 2e-4)
+            lat += rng.gauss(0, 2e-4)
+            line.append([lng, lat])
+        lines.append(line)
+    return lines
+
+
+def per_route_metrics(lines):
+    results = []
+    for line in lines:
+        points = [(p[1], p[0]) for p in line]
+        lats = [lat for lat, _ in points]
+        lngs = [lng for _, lng in points]
+        results.append(
+            (
+                points[0],
+                points[-1],
+                sum(p[0] for p in points) / len(points),
+                sum(p[1] for p in points) / len(points),
+                min(p[0] for p in points),
+                max(p[0] for p in points),
+                min(p[1] for p in points),
+                max(p[1] for p in points),
+                _WGS84_GEOD.line_length(lngs, lats) / 1000.0,
+                _encode_polyline_python(points),
+            )
+        )
+    return results
+
+
+def batched_metrics(lines, batch_size):
+    results = []
+    for i in range(0, len(lines), batch_size):
+        geometry = RouteGeometry.from_geojson(lines[i:i + batch_size])
+        results.append(
+            (
+                geometry.start_points(),
+                geometry.end_points(),
+                geometry.centers(),
+                geometry.mins(),
+                geometry.maxs(),
+                geometry.lengths_km(),
+                geometry.encoded_polylines(),
+            )
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--routes", type=int, default=100_000)
+    parser.add_argument("--points-per-route", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    lines = random_lines(args.routes, args.points_per_route, args.seed)
+    num_points = sum(len(line) for line in lines)
+
+    start = time.perf_counter()
+    expected = per_route_metrics(lines)
+    per_route_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batches = batched_metrics(lines, args.batch_size)
+    batched_seconds = time.perf_counter() - start
+
+    lengths = np.concatenate([batch[5] for batch in batches])
+    polylines = [polyline for batch in batches for polyline in batch[6]]
+    if not np.allclose(lengths, [r[8] for r in expected], rtol=1e-12, atol=0):
+        raise SystemExit("Batched lengths do not match pyproj's line_length.")
+    if polylines != [r[9] for r in expected]:
+        raise SystemExit("Batched polylines do not match the per-route encoder.")
+
+    print(f"{args.routes} routes, {num_points} points, batches of {args.batch_size}")
+    print(f"  per route: {per_route_seconds:8.3f}s")
+    print(f"  batched:   {batched_seconds:8.3f}s ({per_route_seconds / batched_seconds:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Incremental reader and writer for large JSON documents.
+
+`iter_array_items` yields the items of one array member of a top-level JSON
+object (such as the `features` of a GeoJSON FeatureCollection) one at a time.
+The document is read from a text stream in chunks, and each item is decoded
+with the standard library's C decoder as soon as it is complete, so memory
+use depends on the size of one item, not on the size of the document.
+`read_members` reads the other, small members of such an object.
+
+`write_object` is the reverse: it writes an object whose last member is an
+array, serializing the array's items one at a time as they are produced.
+"""
+
+import itertools
+import json
+import re
+from typing import Any, Collection, Dict, Iterable, Iterator, Optional, TextIO
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+# Characters that must follow a decoded number before it is known complete.
+_NUMBER_LOOKAHEAD = 3
+
+
+class _Scanner:
+    """A read position in a text stream, refilled in chunks as needed."""
+
+    def __init__(self, stream: TextIO, chunk_size: int):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._consumed = 0
+        self._eof = False
+
+    def _read_more(self, size: int) -> bool:
+        # Drop what has been parsed so the buffer only holds unread text.
+        if self._pos:
+            self._consumed += self._pos
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        data = self._stream.read(size)
+        if not data:
+            self._eof = True
+            return False
+        self._buffer += data
+        return True
+
+    def error(self, message: str) -> ValueError:
+        return ValueError(f"{message} (at character {self._consumed + self._pos})")
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character, or '' at the end."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read_more(self._chunk_size):
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise self.error(f"Expected {char!r}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Decodes the next JSON value."""
+        self.peek()
+        size = self._chunk_size
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise self.error(f"Invalid JSON: {e.msg}") from None
+            else:
+                # A number near the end of the buffer may continue in the
+                # next chunk: "1" of "12", or "1" of "1e+5" (the decoder
+                # stops before a bare ".", "e" or "e+").
+                is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                lookahead = _NUMBER_LOOKAHEAD if is_number else 0
+                if end + lookahead < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            # The value is incomplete: read more, in growing chunks so that
+            # a value much larger than a chunk is decoded a few times at most.
+            self._read_more(size)
+            size *= 2
+
+    def skip_value(self) -> None:
+        """Consumes the next JSON value, decoding large arrays item by item."""
+        if self.peek() == "[":
+            for _ in self.array_items():
+                pass
+        else:
+            self.value()
+
+    def array_items(self) -> Iterator[Any]:
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            if char == "]":
+                self._pos += 1
+                return
+            if char != ",":
+                raise self.error("Expected ',' or ']' in array")
+            self._pos += 1
+
+    def object_keys(self) -> Iterator[str]:
+        """Yields the keys of an object; the caller consumes each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise self.error("Expected an object key")
+            key = self.value()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            if char == "}":
+                self._pos += 1
+                return
+            if char != ",":
+                raise self.error("Expected ',' or '}' in object")
+            self._pos += 1
+
+    def expect_end(self) -> None:
+        if self.peek():
+            raise self.error("Unexpected data after the JSON document")
+
+
+def iter_array_items(
+    stream: TextIO, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Any]:
+    """
+    Yields the items of the array `key` of the top-level object in `stream`.
+
+    Yields nothing if the object has no such member. The rest of the
+    document is still read to the end, so malformed JSON raises ValueError
+    just as `json.load` would.
+    """
+    scanner = _Scanner(stream, chunk_size)
+    for member in scanner.object_keys():
+        if member != key:
+            scanner.skip_value()
+            continue
+        if scanner.peek() != "[":
+            raise scanner.error(f"{key!r} is not an array")
+        yield from scanner.array_items()
+    scanner.expect_end()
+
+
+def read_members(
+    stream: TextIO, skip: Collection[str] = (), chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Dict[str, Any]:
+    """
+    Reads the members of the top-level object in `stream`, except `skip`.
+
+    Skipped members are parsed to find where they end but are not kept; an
+    array is consumed one item at a time.
+    """
+    scanner = _Scanner(stream, chunk_size)
+    members = {}
+    for key in scanner.object_keys():
+        if key in skip:
+            scanner.skip_value()
+        else:
+            members[key] = scanner.value()
+    scanner.expect_end()
+    return members
+
+
+def write_object(
+    stream: TextIO,
+    members: Dict[str, Any],
+    array_key: str,
+    items: Iterable[Any],
+    indent: Optional[int] = None,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Writes `{**members, array_key: [*items]}` to `stream`; returns the item count.
+
+    Items are consumed from `items` and serialized `batch_size` at a time.
+    With an `indent` the output is identical to `json.dumps(..., indent=indent)`;
+    without one it is compact, with no whitespace at all.
+    """
+    if indent is None:
+        separators = (",", ":")
+    else:
+        separators = (",", ": ")
+    item_separator, key_separator = separators
+    encoder = json.JSONEncoder(indent=indent, separators=separators)
+
+    def newline(level: int) -> str:
+        return "" if indent is None else "\n" + " " * (indent * level)
+
+    def dumps(value: Any, level: int) -> str:
+        text = encoder.encode(value)
+        # Strings never contain a raw newline, so every one is indentation.
+        return text if indent is None else text.replace("\n", newline(level))
+
+    stream.write("{")
+    for key, value in members.items():
+        stream.write(newline(1) + json.dumps(key) + key_separator + dumps(value, 1) + item_separator)
+    stream.write(newline(1) + json.dumps(array_key) + key_separator + "[")
+    count = 0
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            break
+        # A batch encoded as a list at level 1, without its brackets, is the
+        # next run of items of the array at level 1.
+        text = dumps(batch, 1)
+        inner = text[1:-1] if indent is None else text[1 : -len(newline(1)) - 1]
+        stream.write((item_separator if count else "") + inner)
+        count += len(batch)
+    stream.write((newline(1) if count else "") + "]" + newline(0) + "}")
+    return count
@@ -19,56 +19,32 @@ A utility script to convert a GeoJSON file (extracted from the Route Registratio
 into an RMI project export JSON format.
 """
 
+import io
+import itertools
 import json
 import uuid
 import yaml
 import sys
 import os
 import logging
+import tempfile
 import zipfile
 from datetime import datetime
-from typing import List, Tuple, Dict, Any, Optional
-from pyproj import Geod
+from typing import List, Tuple, Dict, Any, Iterable, Iterator, Optional, TextIO
+
+from json_stream import iter_array_items, read_members, write_object
+from route_geometry import RouteGeometry
 
 # --- Configuration & Logging ---
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
 
-def encode_polyline(points: List[Tuple[float, float]]) -> str:
-    """Encodes a list of (lat, lng) coordinates into a Google Polyline string."""
-    res = ""
-    last_lat = 0
-    last_lng = 0
-    for lat, lng in points:
-        lat_int = int(round(lat * 1e5))
-        lng_int = int(round(lng * 1e5))
-        d_lat = lat_int - last_lat
-        d_lng = lng_int - last_lng
-        for val in [d_lat, d_lng]:
-            val = ~(val << 1) if val < 0 else (val << 1)
-            while val >= 0x20:
-                res += chr((0x20 | (val & 0x1f)) + 63)
-                val >>= 5
-            res += chr(val + 63)
-        last_lat = lat_int
-        last_lng = lng_int
-    return res
-
-
-_WGS84_GEOD = Geod(ellps="WGS84")
-
-
-def _polyline_length_km(points: List[Tuple[float, float]]) -> float:
-    """Returns total geodesic polyline length in kilometers using pyproj."""
-    if len(points) < 2:
-        return 0.0
-    lats = [lat for lat, _ in points]
-    lngs = [lng for _, lng in points]
-    return _WGS84_GEOD.line_length(lngs, lats) / 1000.0
-
-
-def _load_geojson_data(geojson_path: str) -> Dict[str, Any]:
-    """Loads GeoJSON from a .geojson file or from a .zip archive."""
+# Features converted per batch, unless route_settings.batch_size is set.
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _iter_geojson_features(geojson_path: str) -> Iterator[Dict[str, Any]]:
+    """Streams GeoJSON features from a .geojson file or from a .zip archive."""
     if not os.path.exists(geojson_path):
         logger.error(f"GeoJSON file not found: {geojson_path}")
         sys.exit(1)
@@ -89,11 +65,13 @@ def _load_geojson_data(geojson_path: str) -> Dict[str, Any]:
                     sys.exit(1)
                 selected = members[0]
                 logger.info("Reading GeoJSON from ZIP member: %s", selected)
-                with zf.open(selected) as f:
-                    return json.load(f)
+                with zf.open(selected) as raw, io.TextIOWrapper(raw, encoding="utf-8-sig") as f:
+                    yield from iter_array_items(f, "features")
+            return
         if lower_path.endswith(".geojson"):
-            with open(geojson_path, "r") as f:
-                return json.load(f)
+            with open(geojson_path, "r", encoding="utf-8-sig") as f:
+                yield from iter_array_items(f, "features")
+            return
         logger.error("Unsupported input file format (use .geojson or .zip): %s", geojson_path)
         sys.exit(1)
     except Exception as e:
@@ -101,22 +79,73 @@ def _load_geojson_data(geojson_path: str) -> Dict[str, Any]:
         sys.exit(1)
 
 
-def _save_export_data(output_path: str, export_data: Dict[str, Any]) -> None:
-    """Saves export JSON inside a ZIP file."""
+def _batched(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Groups an iterable into lists of up to batch_size items."""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _save_export_data(
+    output_path: str,
+    header: Dict[str, Any],
+    routes: Iterable[Dict[str, Any]],
+    compact: bool = False,
+) -> int:
+    """
+    Streams export JSON into a ZIP file; returns the number of routes written.
+
+    The header members (the project) are written first, then each route as it
+    is produced, so memory use does not grow with the number of routes. The
+    ZIP is written to a temporary file and moved into place at the end, which
+    also makes it safe to overwrite the base export being read.
+    """
     lower_path = output_path.lower()
     if not lower_path.endswith(".zip"):
         logger.error("Unsupported output format (use .zip): %s", output_path)
         sys.exit(1)
 
     inner_name = f"{os.path.splitext(os.path.basename(output_path))[0]}.json"
-    payload = json.dumps(export_data, indent=4).encode("utf-8")
-    with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr(inner_name, payload)
+    fd, partial_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(output_path)), suffix=".partial"
+    )
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(partial_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            with zf.open(inner_name, "w", force_zip64=True) as raw, io.TextIOWrapper(
+                raw, encoding="utf-8"
+            ) as f:
+                num_routes = write_object(
+                    f, header, "routes", routes, indent=None if compact else 4
+                )
+        os.replace(partial_path, output_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
     logger.info("Wrote export JSON to ZIP member: %s", inner_name)
+    return num_routes
+
+
+def _open_export_member(zf: zipfile.ZipFile, base_export_path: str) -> TextIO:
+    """Opens the first .json member of a base export ZIP as text."""
+    members = [
+        name for name in zf.namelist()
+        if not name.endswith("/") and name.lower().endswith(".json")
+    ]
+    if not members:
+        logger.error(
+            "Base export ZIP does not contain a .json file: %s",
+            base_export_path,
+        )
+        sys.exit(1)
+    return io.TextIOWrapper(zf.open(members[0]), encoding="utf-8-sig")
 
 
-def _load_export_data(base_export_path: str) -> Dict[str, Any]:
-    """Loads export JSON from a .zip archive."""
+def _load_export_header(base_export_path: str) -> Dict[str, Any]:
+    """Loads everything but the routes of an export JSON from a .zip archive."""
     lower_path = base_export_path.lower()
     if not lower_path.endswith(".zip"):
         logger.error("Unsupported base export format (use .zip): %s", base_export_path)
@@ -124,53 +153,86 @@ def _load_export_data(base_export_path: str) -> Dict[str, Any]:
 
     try:
         with zipfile.ZipFile(base_export_path, "r") as zf:
-            members = [
-                name for name in zf.namelist()
-                if not name.endswith("/") and name.lower().endswith(".json")
-            ]
-            if not members:
-                logger.error(
-                    "Base export ZIP does not contain a .json file: %s",
-                    base_export_path,
-                )
-                sys.exit(1)
-            selected = members[0]
-            logger.info("Reading base export from ZIP member: %s", selected)
-            with zf.open(selected) as f:
-                return json.load(f)
+            with _open_export_member(zf, base_export_path) as f:
+                logger.info("Reading base export from ZIP member: %s", f.buffer.name)
+                return read_members(f, skip=("routes",))
     except Exception as e:
         logger.error("Failed to load base export: %s", e)
         sys.exit(1)
 
 
-def process_geojson_to_routes(geojson_path: str, project_id: int, tag: str, route_set: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Parses GeoJSON features and converts them to RMI route entries."""
-    geojson_data = _load_geojson_data(geojson_path)
+def _iter_export_routes(base_export_path: str) -> Iterator[Dict[str, Any]]:
+    """Streams the routes of an export JSON from a .zip archive."""
+    try:
+        with zipfile.ZipFile(base_export_path, "r") as zf:
+            with _open_export_member(zf, base_export_path) as f:
+                yield from iter_array_items(f, "routes")
+    except Exception as e:
+        logger.error("Failed to load base export: %s", e)
+        sys.exit(1)
 
-    routes = []
-    features = geojson_data.get('features', [])
-    logger.info(f"Found {len(features)} features in GeoJSON.")
 
+def _counted(items: Iterable[Any], counts: Dict[str, int], key: str) -> Iterator[Any]:
+    """Yields items unchanged, counting them in counts[key]."""
+    for item in items:
+        counts[key] += 1
+        yield item
+
+
+def process_geojson_to_routes(geojson_path: str, project_id: int, tag: str, route_set: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Streams GeoJSON features and converts them to RMI route entries.
+
+    Features are read and converted batch_size at a time (route_settings.batch_size),
+    so memory use does not grow with the size of the input file.
+    """
+    batch_size = max(int(route_set.get('batch_size', DEFAULT_BATCH_SIZE)), 1)
+    num_features = 0
+    for batch in _batched(_iter_geojson_features(geojson_path), batch_size):
+        num_features += len(batch)
+        yield from _routes_from_features(batch, project_id, tag, route_set)
+    logger.info(f"Read {num_features} features from GeoJSON.")
+
+
+def _routes_from_features(features: List[Dict[str, Any]], project_id: int, tag: str, route_set: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Converts a batch of GeoJSON features to RMI route entries."""
+    lines = []
+    line_props = []
     for feat in features:
         geom = feat.get('geometry', {})
         props = feat.get('properties', {})
-        
+
         if geom.get('type') != 'LineString':
             logger.warning(f"Skipping non-LineString feature: {geom.get('type')}")
             continue
-        
-        # GeoJSON is [lng, lat] -> convert to [lat, lng]
-        points = [(p[1], p[0]) for p in geom.get('coordinates', [])]
-        if not points:
+
+        coordinates = geom.get('coordinates', [])
+        if not coordinates:
             continue
-        
-        start_lat, start_lng = points[0]
-        end_lat, end_lng = points[-1]
-        waypoints = points[1:-1] if len(points) > 2 else None
-        
-        center_lat = sum(p[0] for p in points) / len(points)
-        center_lng = sum(p[1] for p in points) / len(points)
-        
+        lines.append(coordinates)
+        line_props.append(props)
+    if not lines:
+        return []
+
+    # Geometry of the whole batch, in [lat, lng] order (GeoJSON is [lng, lat]).
+    geometry = RouteGeometry.from_geojson(lines)
+    centers = geometry.centers().tolist()
+    mins = geometry.mins().tolist()
+    maxs = geometry.maxs().tolist()
+    # Always calculate length from geometry; input length is ignored.
+    lengths = geometry.lengths_km().tolist()
+    polylines = geometry.encoded_polylines()
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    routes = []
+    for i, props in enumerate(line_props):
+        # Endpoints and waypoints keep the input's JSON values (10 stays 10).
+        points = lines[i]
+        start_lng, start_lat = points[0][:2]
+        end_lng, end_lat = points[-1][:2]
+        waypoints = [[p[1], p[0]] for p in points[1:-1]]
+        center_lat, center_lng = centers[i]
+
         route_entry = {
             # Always generate fresh UUIDs for imported routes (ignore input UUID).
             "uuid": str(uuid.uuid4()),
@@ -178,13 +240,12 @@ def process_geojson_to_routes(geojson_path: str, project_id: int, tag: str, rout
             "route_name": props.get('name', f"route-{uuid.uuid4().hex[:8]}"),
             "origin": json.dumps({"lat": start_lat, "lng": start_lng}),
             "destination": json.dumps({"lat": end_lat, "lng": end_lng}),
-            "waypoints": json.dumps([[p[1], p[0]] for p in waypoints]) if waypoints else None,
+            "waypoints": json.dumps(waypoints) if waypoints else None,
             "center": json.dumps({"lat": center_lat, "lng": center_lng}),
-            "encoded_polyline": encode_polyline(points),
+            "encoded_polyline": polylines[i],
             # Route type is fixed for imported registrations.
             "route_type": "drawn",
-            # Always calculate length from geometry; input length is ignored.
-            "length": _polyline_length_km(points),
+            "length": lengths[i],
             "parent_route_id": None,
             "has_children": 0,
             "is_segmented": 0,
@@ -194,18 +255,18 @@ def process_geojson_to_routes(geojson_path: str, project_id: int, tag: str, rout
             # Sync status is fixed for imported registrations.
             "sync_status": "unsynced",
             "is_enabled": route_set.get('is_enabled', 1),
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "created_at": now,
+            "updated_at": now,
             "deleted_at": None,
             "tag": props.get('tag', tag),
             "start_lat": start_lat,
             "start_lng": start_lng,
             "end_lat": end_lat,
             "end_lng": end_lng,
-            "min_lat": min(p[0] for p in points),
-            "max_lat": max(p[0] for p in points),
-            "min_lng": min(p[1] for p in points),
-            "max_lng": max(p[1] for p in points),
+            "min_lat": mins[i][0],
+            "max_lat": maxs[i][0],
+            "min_lng": mins[i][1],
+            "max_lng": maxs[i][1],
             "latest_data_update_time": None,
             "static_duration_seconds": None,
             "current_duration_seconds": None,
@@ -219,7 +280,7 @@ def process_geojson_to_routes(geojson_path: str, project_id: int, tag: str, rout
             "segment_order": None
         }
         routes.append(route_entry)
-    
+
     return routes
 
 
@@ -235,11 +296,11 @@ def _merge_project_overrides(project: Dict[str, Any], p_info: Dict[str, Any]) ->
         project[key] = val
 
 
-def _default_route_tag(export_data: Dict[str, Any], p_info: Dict[str, Any]) -> str:
+def _default_route_tag(existing_routes: Iterable[Dict[str, Any]], p_info: Dict[str, Any]) -> str:
     """Tag for new routes: config override, else first existing route, else 'default'."""
     if "tag" in p_info and p_info["tag"] is not None:
         return str(p_info["tag"])
-    for route in export_data.get("routes") or []:
+    for route in existing_routes:
         t = route.get("tag")
         if t:
             return str(t)
@@ -267,21 +328,27 @@ def main(config_path: str):
         logger.error("Missing required paths in config.yaml")
         sys.exit(1)
 
-    # Initialize or Load Export Data
-    if base_json_path and os.path.exists(base_json_path):
+    output_set = config.get('output_settings') or {}
+
+    # Initialize or Load Export Data. Base routes are not loaded here: they are
+    # streamed from the base file straight into the output.
+    has_base = bool(base_json_path and os.path.exists(base_json_path))
+    base_routes: Iterable[Dict[str, Any]] = []
+    if has_base:
         logger.info(f"Loading base export: {base_json_path}")
-        export_data = _load_export_data(base_json_path)
+        header = _load_export_header(base_json_path)
+        base_routes = _iter_export_routes(base_json_path)
         # Project metadata comes entirely from the base file; project_info only overrides
         # keys you list (omit project_info or use {} to keep the base project unchanged).
         if p_info:
-            proj = export_data.setdefault("project", {})
+            proj = header.setdefault("project", {})
             _merge_project_overrides(proj, p_info)
             applied = sorted(k for k in p_info if k not in _PROJECT_INFO_NON_PROJECT_KEYS)
             if applied:
                 logger.info("Applied project_info overrides: %s", ", ".join(applied))
     else:
         logger.info("Generating new project structure from config.")
-        export_data = {
+        header = {
             "project": {
                 "id": p_info.get('id', 1),
                 "project_name": p_info.get('project_name', 'sample-project'),
@@ -292,23 +359,24 @@ def main(config_path: str):
                 "dataset_name": p_info.get('dataset_name', 'historical_roads_data'),
                 "viewstate": p_info.get('viewstate', '{}'),
                 "map_snapshot": p_info.get("map_snapshot", "")
-            },
-            "routes": []
+            }
         }
 
-    project_id = export_data['project'].get('id', 1)
-    tag = _default_route_tag(export_data, p_info)
+    project_id = header['project'].get('id', 1)
+    # Reads base routes only up to the first tagged one.
+    tag = _default_route_tag(_iter_export_routes(base_json_path) if has_base else [], p_info)
 
     # Extract routes from GeoJSON
     logger.info(f"Processing routes from: {geojson_path}")
     new_routes = process_geojson_to_routes(geojson_path, project_id, tag, route_set)
-    
-    # Merge (append if base exists, otherwise replace)
-    export_data['routes'].extend(new_routes)
-    logger.info(f"Merged {len(new_routes)} new routes. Total: {len(export_data['routes'])}")
 
-    # Save
-    _save_export_data(output_json_path, export_data)
+    # Merge (append if base exists, otherwise replace) while saving
+    counts = {"new": 0}
+    routes = itertools.chain(base_routes, _counted(new_routes, counts, "new"))
+    total = _save_export_data(
+        output_json_path, header, routes, compact=bool(output_set.get('compact', False))
+    )
+    logger.info(f"Merged {counts['new']} new routes. Total: {total}")
     logger.info(f"Successfully saved export JSON to: {output_json_path}")
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Google Encoded Polyline codec.
+
+`encode_polylines` and `decode_polylines` work on many routes at once: the
+coordinates of all routes are stored in one (N, 2) array of (lat, lng) rows,
+and `offsets` (length R + 1) marks where each route starts and ends, so route
+i is `coords[offsets[i]:offsets[i + 1]]`. Every step is a NumPy array
+operation over all points, with no Python loop per coordinate.
+"""
+
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Shorter lines are encoded in pure Python; NumPy's per-call overhead only
+# pays off for longer ones (see benchmarks/polyline_benchmark.py).
+_VECTORIZE_MIN_POINTS = 128
+
+# A zigzag-encoded int64 needs at most 13 five-bit chunks.
+_MAX_CHUNKS = 13
+
+
+def _encode_polyline_python(points: Sequence[Tuple[float, float]]) -> str:
+    """Encodes one route without NumPy; the reference implementation."""
+    chunks = []
+    last_lat = 0
+    last_lng = 0
+    for lat, lng in points:
+        lat_int = int(round(lat * 1e5))
+        lng_int = int(round(lng * 1e5))
+        for val in (lat_int - last_lat, lng_int - last_lng):
+            val = ~(val << 1) if val < 0 else (val << 1)
+            while val >= 0x20:
+                chunks.append(chr((0x20 | (val & 0x1f)) + 63))
+                val >>= 5
+            chunks.append(chr(val + 63))
+        last_lat = lat_int
+        last_lng = lng_int
+    return "".join(chunks)
+
+
+def encode_polyline(points: Sequence[Tuple[float, float]]) -> str:
+    """Encodes a list of (lat, lng) coordinates into a Google Polyline string."""
+    if len(points) < _VECTORIZE_MIN_POINTS:
+        return _encode_polyline_python(points)
+    coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return encode_polylines(coords, np.array([0, len(coords)]))[0]
+
+
+def encode_polylines(coords: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """
+    Encodes every route of a coordinate array; returns one string per route.
+
+    `coords` is an (N, 2) array of (lat, lng) rows and `offsets` the route
+    boundaries. The output is identical to `encode_polyline` on each route.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if not np.isfinite(coords).all():
+        raise ValueError("Coordinates must be finite.")
+    # np.round rounds half to even, exactly like Python's round().
+    ints = np.round(coords * 1e5).astype(np.int64)
+
+    # Each point minus the previous point of the same route.
+    deltas = np.empty_like(ints)
+    deltas[1:] = ints[1:] - ints[:-1]
+    starts = offsets[:-1][offsets[:-1] < offsets[1:]]
+    deltas[starts] = ints[starts]
+
+    # Interleaved lat, lng deltas, zigzag encoded: ~(v << 1) if v < 0 else v << 1.
+    values = deltas.reshape(-1)
+    values = ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+    # Five-bit chunks per value, least significant first.
+    counts = np.ones(len(values), dtype=np.int64)
+    for k in range(1, _MAX_CHUNKS):
+        counts += values >= np.uint64(1 << (5 * k))
+    ends = np.cumsum(counts)
+    chunk_value = np.repeat(values, counts)
+    chunk_index = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts, counts)
+    chunks = (chunk_value >> (np.uint64(5) * chunk_index.astype(np.uint64))) & np.uint64(0x1F)
+    # Every chunk except the last of its value carries the continuation bit.
+    chunks |= (chunk_index < np.repeat(counts, counts) - 1).astype(np.uint64) << np.uint64(5)
+    text = (chunks + np.uint64(63)).astype(np.uint8).tobytes().decode("ascii")
+
+    # Character offsets of every route: each point contributes two values.
+    boundaries = np.concatenate(([0], ends))[2 * offsets].tolist()
+    return [text[start:end] for start, end in zip(boundaries[:-1], boundaries[1:])]
+
+
+def decode_polylines(polylines: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decodes polyline strings into an (N, 2) array of (lat, lng) rows and offsets.
+
+    The inverse of `encode_polylines`, up to the 1e-5 degree precision of the
+    format.
+    """
+    lengths = np.fromiter((len(p) for p in polylines), dtype=np.int64, count=len(polylines))
+    text = "".join(polylines)
+    try:
+        data = np.frombuffer(text.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    except UnicodeEncodeError:
+        raise ValueError("Polylines must be ASCII.") from None
+    if ((data < 0) | (data > 63)).any():
+        raise ValueError("Polylines contain characters outside the encoding range.")
+
+    # A chunk without the continuation bit ends its value.
+    last = (data & 0x20) == 0
+    string_ends = np.cumsum(lengths)
+    if (lengths > 0).any() and not last[string_ends[lengths > 0] - 1].all():
+        raise ValueError("A polyline ends in the middle of a value.")
+    value_ends = np.flatnonzero(last)
+    value_starts = np.concatenate(([0], value_ends + 1))[: len(value_ends)]
+    counts = value_ends - value_starts + 1
+    if (counts > _MAX_CHUNKS).any():
+        raise ValueError("A polyline value is too long.")
+    chunk_index = np.arange(len(data)) - np.repeat(value_starts, counts)
+    shifted = (data & 0x1F).astype(np.uint64) << (np.uint64(5) * chunk_index.astype(np.uint64))
+    values = (
+        np.add.reduceat(shifted, value_starts) if len(value_starts) else shifted[:0]
+    ).astype(np.int64)
+    # Undo the zigzag encoding.
+    values = (values >> 1) ^ -(values & 1)
+
+    # Values per polyline, from the number of value ends in each string.
+    value_ends_before = np.concatenate(([0], np.cumsum(last)))
+    value_counts = np.diff(np.concatenate(([0], value_ends_before[string_ends])))
+    if (value_counts % 2).any():
+        raise ValueError("A polyline has an odd number of values.")
+    offsets = np.concatenate(([0], np.cumsum(value_counts // 2)))
+
+    # Coordinates are running sums of the deltas within each route.
+    deltas = values.reshape(-1, 2)
+    totals = np.cumsum(deltas, axis=0)
+    nonempty = offsets[:-1] < offsets[1:]
+    starts = offsets[:-1][nonempty]
+    before = np.zeros((len(offsets) - 1, 2), dtype=np.int64)
+    before[nonempty] = totals[starts] - deltas[starts]
+    route_of_point = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    coords = (totals - before[route_of_point]) / 1e5
+    return coords, offsets
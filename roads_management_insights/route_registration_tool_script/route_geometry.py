@@ -0,0 +1,94 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Columnar geometry of many routes.
+
+`RouteGeometry` keeps the points of all routes in one contiguous (N, 2) array
+of (lat, lng) rows plus `offsets` (route i is `coords[offsets[i]:offsets[i + 1]]`),
+the same layout as `polyline_codec`. Lengths, centers, bounding boxes,
+endpoints and encoded polylines are computed for every route at once, with a
+single pyproj call for all segments instead of one call per route.
+"""
+
+import itertools
+from typing import List, Sequence
+
+import numpy as np
+from pyproj import Geod
+
+from polyline_codec import encode_polylines
+
+_WGS84_GEOD = Geod(ellps="WGS84")
+
+
+class RouteGeometry:
+    """The points of a batch of non-empty routes, with per-route metrics."""
+
+    def __init__(self, coords: np.ndarray, offsets: np.ndarray):
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if (np.diff(self.offsets) < 1).any():
+            raise ValueError("Every route needs at least one point.")
+        self.starts = self.offsets[:-1]
+        self.ends = self.offsets[1:] - 1
+
+    @classmethod
+    def from_geojson(cls, coordinates: Sequence[Sequence[Sequence[float]]]) -> "RouteGeometry":
+        """Builds the geometry of GeoJSON LineString coordinates ([lng, lat, ...] points)."""
+        counts = [len(line) for line in coordinates]
+        flat = np.fromiter(
+            itertools.chain.from_iterable(
+                (point[1], point[0]) for line in coordinates for point in line
+            ),
+            dtype=np.float64,
+            count=2 * sum(counts),
+        )
+        return cls(flat, np.concatenate(([0], np.cumsum(counts, dtype=np.int64))))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def lengths_km(self) -> np.ndarray:
+        """Geodesic length of every route on the WGS84 ellipsoid, in kilometers."""
+        lats, lngs = self.coords[:, 0], self.coords[:, 1]
+        segments = np.zeros(len(self.coords))
+        if len(self.coords) > 1:
+            # One inverse geodesic call for all consecutive pairs; the pairs
+            # that join the last point of a route to the next route are dropped.
+            _, _, distances = _WGS84_GEOD.inv(lngs[:-1], lats[:-1], lngs[1:], lats[1:])
+            segments[:-1] = distances
+        segments[self.ends] = 0.0
+        return np.add.reduceat(segments, self.starts) / 1000.0
+
+    def centers(self) -> np.ndarray:
+        """Mean (lat, lng) of the points of every route."""
+        return np.add.reduceat(self.coords, self.starts) / np.diff(self.offsets)[:, None]
+
+    def mins(self) -> np.ndarray:
+        """Smallest (lat, lng) of every route."""
+        return np.minimum.reduceat(self.coords, self.starts)
+
+    def maxs(self) -> np.ndarray:
+        """Largest (lat, lng) of every route."""
+        return np.maximum.reduceat(self.coords, self.starts)
+
+    def start_points(self) -> np.ndarray:
+        return self.coords[self.starts]
+
+    def end_points(self) -> np.ndarray:
+        return self.coords[self.ends]
+
+    def encoded_polylines(self) -> List[str]:
+        return encode_polylines(self.coords, self.offsets)
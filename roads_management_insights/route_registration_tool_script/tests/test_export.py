@@ -0,0 +1,111 @@
+import json
+import os
+import sys
+import zipfile
+
+import pytest
+import yaml
+
+# Add the tool directory to the Python path to allow importing 'main'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def write_geojson(path, names):
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": [[-71.0, 42.0], [-71.01, 42.01]]},
+            "properties": {"name": name},
+        }
+        for name in names
+    ]
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+
+
+def read_export(path):
+    with zipfile.ZipFile(path) as zf:
+        (name,) = zf.namelist()
+        return zf.read(name).decode("utf-8")
+
+
+def run(tmp_path, **config):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump(config))
+    main.main(str(config_path))
+
+
+def test_saved_export_is_indented_like_json_dumps(tmp_path):
+    path = str(tmp_path / "export.zip")
+    header = {"project": {"id": 1, "project_name": "p"}}
+    routes = [{"uuid": "a", "length": 1.5}, {"uuid": "b", "waypoints": None}]
+
+    assert main._save_export_data(path, header, iter(routes)) == 2
+
+    assert read_export(path) == json.dumps({**header, "routes": routes}, indent=4)
+
+
+def test_compact_exports_have_no_whitespace(tmp_path):
+    path = str(tmp_path / "export.zip")
+    header = {"project": {"id": 1}}
+
+    main._save_export_data(path, header, iter([{"uuid": "a"}]), compact=True)
+
+    assert read_export(path) == '{"project":{"id":1},"routes":[{"uuid":"a"}]}'
+
+
+def test_merging_into_the_base_export_in_place(tmp_path):
+    geojson = tmp_path / "input.geojson"
+    export = str(tmp_path / "project.zip")
+    write_geojson(geojson, ["first", "second"])
+    paths = {"input_geojson_file": str(geojson), "output_export_file": export}
+    run(tmp_path, paths=paths, project_info={"project_name": "p", "tag": "t"})
+
+    write_geojson(geojson, ["third"])
+    run(
+        tmp_path,
+        paths={**paths, "base_export_file": export},
+        project_info={"project_name": "renamed"},
+        output_settings={"compact": True},
+    )
+
+    data = json.loads(read_export(export))
+    assert data["project"]["project_name"] == "renamed"
+    assert [r["route_name"] for r in data["routes"]] == ["first", "second", "third"]
+    # The tag of new routes defaults to that of the first base route.
+    assert {r["tag"] for r in data["routes"]} == {"t"}
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".partial")]
+
+
+def test_failed_export_leaves_the_output_untouched(tmp_path):
+    path = tmp_path / "export.zip"
+    path.write_bytes(b"previous")
+
+    def routes():
+        yield {"uuid": "a"}
+        raise RuntimeError("conversion failed")
+
+    with pytest.raises(RuntimeError):
+        main._save_export_data(str(path), {"project": {}}, routes())
+
+    assert path.read_bytes() == b"previous"
+    assert os.listdir(tmp_path) == ["export.zip"]
+
+
+def test_routes_keep_the_input_coordinate_values():
+    feature = {
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": [[10, 20], [11, 21], [12.5, 22]]},
+        "properties": {"name": "r"},
+    }
+
+    (route,) = main._routes_from_features([feature], 1, "t", {})
+
+    assert route["origin"] == '{"lat": 20, "lng": 10}'
+    assert route["destination"] == '{"lat": 22, "lng": 12.5}'
+    assert route["waypoints"] == "[[21, 11]]"
+    assert (route["start_lat"], route["start_lng"], route["end_lat"]) == (20, 10, 22)
+    # The center and bounds are computed, so they are floats.
+    assert route["center"] == '{"lat": 21.0, "lng": 11.166666666666666}'
+    assert json.dumps([route["min_lat"], route["max_lng"]]) == "[20.0, 12.5]"
@@ -0,0 +1,145 @@
+import io
+import json
+import os
+import random
+import sys
+import zipfile
+
+import pytest
+
+# Add the tool directory to the Python path to allow importing 'json_stream'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_stream import iter_array_items, read_members, write_object
+from main import process_geojson_to_routes
+
+
+def random_value(rng, depth=0):
+    kind = rng.randrange(8 if depth < 3 else 5)
+    if kind == 0:
+        return rng.randint(-10**12, 10**12)
+    if kind == 1:
+        return rng.uniform(-180, 180)
+    if kind == 2:
+        return rng.choice([True, False, None])
+    if kind in (3, 4):
+        return "".join(rng.choice('ab"\\\n é😀{}[],:') for _ in range(rng.randrange(12)))
+    if kind in (5, 6):
+        return {f"k{i}": random_value(rng, depth + 1) for i in range(rng.randrange(4))}
+    return [random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+
+
+def feature(i, coordinates=((-71.0, 42.0), (-71.1, 42.1))):
+    return {
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": [list(c) for c in coordinates]},
+        "properties": {"name": f"route-{i}"},
+    }
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_items_match_json_load(seed, chunk_size):
+    rng = random.Random(seed)
+    document = {
+        "type": "FeatureCollection",
+        "name": random_value(rng),
+        "features": [random_value(rng) for _ in range(rng.randrange(30))],
+        "bbox": [random_value(rng) for _ in range(3)],
+    }
+    text = json.dumps(document, indent=rng.choice([None, 2]), ensure_ascii=rng.random() < 0.5)
+
+    items = list(iter_array_items(io.StringIO(text), "features", chunk_size=chunk_size))
+
+    assert items == json.loads(text)["features"]
+
+
+def test_numbers_split_across_chunks_are_read_whole():
+    text = '{"features": [1234567, 89.125e3, -0.5], "count": 123456}'
+
+    for chunk_size in range(1, 12):
+        assert list(iter_array_items(io.StringIO(text), "features", chunk_size)) == [
+            1234567,
+            89125.0,
+            -0.5,
+        ]
+
+
+def test_missing_or_empty_arrays_yield_nothing():
+    assert list(iter_array_items(io.StringIO('{"type": "FeatureCollection"}'), "features")) == []
+    assert list(iter_array_items(io.StringIO('{"features": [ ]}'), "features")) == []
+    assert list(iter_array_items(io.StringIO("{}"), "features")) == []
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "[]",
+        '{"features": {}}',
+        '{"features": [1, 2',
+        '{"features": [1 2]}',
+        '{"features": [1], }',
+        '{"features": [1]} trailing',
+        '{"type": "FeatureCollection" "features": []}',
+    ],
+)
+def test_malformed_documents_raise_value_error(text):
+    with pytest.raises(ValueError):
+        list(iter_array_items(io.StringIO(text), "features", chunk_size=4))
+
+
+def test_features_are_streamed_from_a_zip_member(tmp_path):
+    path = tmp_path / "input.zip"
+    collection = {"type": "FeatureCollection", "features": [feature(i) for i in range(5)]}
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("export/roads.geojson", json.dumps(collection))
+
+    routes = list(process_geojson_to_routes(str(path), 7, "tag", {"batch_size": 2}))
+
+    assert [r["route_name"] for r in routes] == [f"route-{i}" for i in range(5)]
+    assert {r["project_id"] for r in routes} == {7}
+
+
+def test_routes_are_produced_before_the_input_is_fully_read(tmp_path):
+    path = tmp_path / "input.geojson"
+    features = [feature(i) for i in range(3)] + [{"geometry": {"type": "Point"}}]
+    # Truncated after the fourth feature: a whole-document parser fails
+    # before producing any route.
+    path.write_text(json.dumps({"features": features})[:-2])
+
+    routes = process_geojson_to_routes(str(path), 1, "tag", {"batch_size": 1})
+
+    assert next(routes)["route_name"] == "route-0"
+    assert next(routes)["route_name"] == "route-1"
+    assert next(routes)["route_name"] == "route-2"
+    with pytest.raises(SystemExit):
+        next(routes)
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("indent", [None, 4])
+def test_written_objects_match_json_dumps(seed, indent):
+    rng = random.Random(seed)
+    members = {f"m{i}": random_value(rng) for i in range(rng.randrange(3))}
+    items = [random_value(rng) for _ in range(rng.randrange(5))]
+    stream = io.StringIO()
+
+    count = write_object(
+        stream, members, "routes", iter(items), indent=indent, batch_size=rng.choice([1, 2, 1000])
+    )
+
+    separators = (",", ":") if indent is None else None
+    assert stream.getvalue() == json.dumps(
+        {**members, "routes": items}, indent=indent, separators=separators
+    )
+    assert count == len(items)
+
+
+def test_read_members_leaves_out_skipped_arrays():
+    text = json.dumps({"project": {"id": 3}, "routes": [{"uuid": "a"}] * 3, "version": 2})
+
+    assert read_members(io.StringIO(text), skip=("routes",), chunk_size=5) == {
+        "project": {"id": 3},
+        "version": 2,
+    }
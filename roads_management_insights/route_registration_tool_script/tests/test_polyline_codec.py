@@ -0,0 +1,136 @@
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+# Add the tool directory to the Python path to allow importing 'polyline_codec'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polyline_codec import (
+    _VECTORIZE_MIN_POINTS,
+    decode_polylines,
+    encode_polyline,
+    encode_polylines,
+)
+
+
+def original_encode_polyline(points):
+    """The encoder main.py used before the codec module, kept as the oracle."""
+    res = ""
+    last_lat = 0
+    last_lng = 0
+    for lat, lng in points:
+        lat_int = int(round(lat * 1e5))
+        lng_int = int(round(lng * 1e5))
+        d_lat = lat_int - last_lat
+        d_lng = lng_int - last_lng
+        for val in [d_lat, d_lng]:
+            val = ~(val << 1) if val < 0 else (val << 1)
+            while val >= 0x20:
+                res += chr((0x20 | (val & 0x1f)) + 63)
+                val >>= 5
+            res += chr(val + 63)
+        last_lat = lat_int
+        last_lng = lng_int
+    return res
+
+
+def random_coordinate(rng):
+    kind = rng.random()
+    if kind < 0.1:
+        # Exactly halfway between two 1e-5 steps, to exercise rounding.
+        return (rng.randint(-9_000_000, 9_000_000) + 0.5) / 1e5
+    if kind < 0.2:
+        return rng.choice([0.0, -0.0, 90.0, -90.0, 180.0, -180.0, 1e-6, -1e-6])
+    return rng.uniform(-180, 180)
+
+
+def random_routes(rng, num_routes, max_points):
+    routes = []
+    for _ in range(num_routes):
+        lat, lng = random_coordinate(rng), random_coordinate(rng)
+        route = []
+        for _ in range(rng.randint(0, max_points)):
+            if rng.random() < 0.1:
+                # Occasional jumps produce long multi-chunk values.
+                lat, lng = random_coordinate(rng), random_coordinate(rng)
+            else:
+                lat += rng.gauss(0, 1e-3)
+                lng += rng.gauss(0, 1e-3)
+            route.append((lat, lng))
+        routes.append(route)
+    return routes
+
+
+def flatten(routes):
+    offsets = np.cumsum([0] + [len(route) for route in routes])
+    coords = np.array([point for route in routes for point in route], dtype=float)
+    return coords.reshape(-1, 2), offsets
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_batch_encoder_matches_the_original_encoder(seed):
+    routes = random_routes(random.Random(seed), num_routes=50, max_points=40)
+
+    assert encode_polylines(*flatten(routes)) == [
+        original_encode_polyline(route) for route in routes
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_single_route_encoder_matches_the_original_encoder(seed):
+    rng = random.Random(seed)
+    # Lengths on both sides of the switch to the vectorized encoder.
+    for length in (0, 1, _VECTORIZE_MIN_POINTS - 1, _VECTORIZE_MIN_POINTS, 500):
+        route = random_routes(rng, 1, 0)[0] or [(random_coordinate(rng), random_coordinate(rng))]
+        route = (route * length)[:length]
+        for i in range(1, len(route)):
+            route[i] = (route[i - 1][0] + rng.gauss(0, 1e-2), route[i - 1][1] + rng.gauss(0, 1e-2))
+        assert encode_polyline(route) == original_encode_polyline(route)
+
+
+def test_known_polyline():
+    points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+    assert encode_polylines(np.array(points), [0, 3]) == ["_p~iF~ps|U_ulLnnqC_mqNvxq`@"]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_decoder_round_trips_encoded_routes(seed):
+    routes = random_routes(random.Random(seed), num_routes=50, max_points=40)
+    coords, offsets = flatten(routes)
+
+    decoded, decoded_offsets = decode_polylines(encode_polylines(coords, offsets))
+
+    assert decoded_offsets.tolist() == offsets.tolist()
+    assert np.array_equal(np.round(decoded * 1e5), np.round(coords * 1e5))
+
+
+def test_empty_inputs():
+    assert encode_polylines(np.empty((0, 2)), [0]) == []
+    assert encode_polylines(np.empty((0, 2)), [0, 0, 0]) == ["", ""]
+    coords, offsets = decode_polylines(["", ""])
+    assert coords.shape == (0, 2)
+    assert offsets.tolist() == [0, 0, 0]
+
+
+@pytest.mark.parametrize(
+    "polyline",
+    [
+        "_p~iF~ps|U_ulLnnqC_mqNvxq`",  # ends mid-value
+        "_p~iF",  # a latitude without its longitude
+        "_p~iF~ps|U é",  # not ASCII
+        "_p~iF~ps|U ",  # below the encoding range
+        "_" * 20 + "?",  # too many chunks for one value
+    ],
+)
+def test_decoder_rejects_malformed_polylines(polyline):
+    with pytest.raises(ValueError):
+        decode_polylines([polyline])
+
+
+def test_encoder_rejects_non_finite_coordinates():
+    with pytest.raises(ValueError):
+        encode_polylines(np.array([[1.0, float("nan")]]), [0, 1])
@@ -0,0 +1,65 @@
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+from pyproj import Geod
+
+# Add the tool directory to the Python path to allow importing 'route_geometry'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polyline_codec import encode_polyline
+from route_geometry import RouteGeometry
+
+
+def random_lines(seed, num_routes=200):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(num_routes):
+        lng, lat = rng.uniform(-179, 179), rng.uniform(-85, 85)
+        line = []
+        for _ in range(rng.choice([1, 2, 3, 25])):
+            lng += rng.gauss(0, 1e-2)
+            lat += rng.gauss(0, 1e-2)
+            # Some points carry an altitude, which is ignored.
+            line.append([lng, lat, 12.5] if rng.random() < 0.1 else [lng, lat])
+        lines.append(line)
+    return lines
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_metrics_match_per_route_computation(seed):
+    geod = Geod(ellps="WGS84")
+    lines = random_lines(seed)
+
+    geometry = RouteGeometry.from_geojson(lines)
+
+    assert len(geometry) == len(lines)
+    lengths = geometry.lengths_km()
+    centers = geometry.centers()
+    for i, line in enumerate(lines):
+        lats = [p[1] for p in line]
+        lngs = [p[0] for p in line]
+        expected_length = geod.line_length(lngs, lats) / 1000.0 if len(line) > 1 else 0.0
+        assert lengths[i] == pytest.approx(expected_length, rel=1e-12, abs=0)
+        assert centers[i] == pytest.approx([sum(lats) / len(lats), sum(lngs) / len(lngs)])
+        assert geometry.mins()[i].tolist() == [min(lats), min(lngs)]
+        assert geometry.maxs()[i].tolist() == [max(lats), max(lngs)]
+        assert geometry.start_points()[i].tolist() == [lats[0], lngs[0]]
+        assert geometry.end_points()[i].tolist() == [lats[-1], lngs[-1]]
+        assert geometry.encoded_polylines()[i] == encode_polyline(list(zip(lats, lngs)))
+
+
+def test_single_point_routes_have_no_length():
+    geometry = RouteGeometry.from_geojson([[[-71.0, 42.0]], [[-71.0, 42.0], [-71.0, 42.001]]])
+
+    lengths = geometry.lengths_km()
+
+    assert lengths[0] == 0.0
+    assert lengths[1] == pytest.approx(0.111, abs=1e-3)
+
+
+def test_empty_routes_are_rejected():
+    with pytest.raises(ValueError):
+        RouteGeometry(np.zeros((2, 2)), [0, 2, 2])
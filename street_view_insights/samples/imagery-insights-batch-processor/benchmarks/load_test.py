@@ -0,0 +1,343 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Load-tests the `/process` endpoint by replaying recorded task bodies.
+
+`capture` writes task bodies to a JSONL corpus, built by the same code as
+`process_shard`: from the shards of the run saved in STATE_FILE, or from a
+synthetic source. `replay` sends the corpus to a local or deployed `/process`
+with httpx, either open-loop at a target rate (requests start on schedule
+however slowly the service answers, and latency is measured from the
+scheduled start) or closed-loop with a fixed number of concurrent requests.
+It reports throughput, a latency histogram, tail percentiles and errors.
+
+    python benchmarks/load_test.py capture --synthetic 2000 --out corpus.jsonl
+    python benchmarks/load_test.py capture --state populate_state.json --limit 5000
+    python benchmarks/load_test.py replay corpus.jsonl --url http://localhost:8080 --qps 20
+    python benchmarks/load_test.py replay corpus.jsonl --url "$SERVICE_URL" --auth \\
+        --concurrency 80 --duration 300
+
+Replay needs httpx, from requirements-dev.txt. Deployed services are called
+with an ID token from the local credentials when `--auth` is set.
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from config import STATE_FILE
+from emulator import percentile
+from metrics import LATENCY_BUCKETS
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+
+def capture(args):
+    """Writes the task bodies of a run's shards to a JSONL corpus; returns their count."""
+    import populate_with_cloud_run as populate
+    from checkpoint import build_shard_messages, load_state
+
+    reader = None
+    if args.synthetic:
+        import pyarrow as pa
+
+        from emulator import synthetic_source
+        from sharding import SHARD_KEY_COLUMN, plan_shard_ranges, shard_message
+        from source_reader import ArrowFileSourceReader
+
+        table = synthetic_source(args.synthetic, args.observations).sort_by("asset_id")
+        table = table.add_column(
+            0, SHARD_KEY_COLUMN, pa.array(range(1, args.synthetic + 1), type=pa.int64())
+        )
+        reader = ArrowFileSourceReader(table=table)
+        messages = [
+            shard_message(None, "synthetic.source.snapshot", start, end)
+            for start, end in plan_shard_ranges(args.synthetic, populate.SHARD_SIZE)
+        ]
+    else:
+        state = load_state(args.state)
+        if not state:
+            raise SystemExit(f"No run state found in {args.state}; plan a run first.")
+        messages = build_shard_messages(state)
+
+    count = 0
+    with open(args.out, "w") as f:
+        bodies = (
+            body for message in messages for body in populate.shard_task_bodies(message, reader)
+        )
+        for body in itertools.islice(bodies, args.limit):
+            f.write(json.dumps(body) + "\n")
+            count += 1
+    return count
+
+
+def load_corpus(path):
+    with open(path) as f:
+        bodies = [line.strip() for line in f if line.strip()]
+    if not bodies:
+        raise SystemExit(f"{path} holds no task bodies.")
+    return bodies
+
+
+class LoadStats:
+    """Latencies and outcomes of the requests of a replay."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = collections.Counter()
+        self.assets = collections.Counter()
+        self.max_lag = 0.0
+
+    def record(self, latency, error=None, response=None):
+        self.latencies.append(latency)
+        if error is not None:
+            self.errors[error] += 1
+        if response is not None:
+            # Batch bodies report every asset's status.
+            with contextlib.suppress(ValueError, AttributeError, TypeError):
+                for outcome in response.json().get("results", []):
+                    self.assets[outcome.get("status", "unknown")] += 1
+
+    def report(self, elapsed, sent):
+        completed = len(self.latencies)
+        failed = sum(self.errors.values())
+        return {
+            "sent": sent,
+            "completed": completed,
+            "failed": failed,
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+            "goodput_rps": round((completed - failed) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {
+                f"p{100 * fraction:g}": round(1000 * percentile(self.latencies, fraction), 1)
+                for fraction in PERCENTILES
+            },
+            "latency_max_ms": round(1000 * max(self.latencies, default=0.0), 1),
+            "histogram": self.histogram(),
+            "errors": dict(self.errors.most_common()),
+            "asset_statuses": dict(self.assets),
+            "max_start_lag_ms": round(1000 * self.max_lag, 1),
+        }
+
+    def histogram(self):
+        counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        for latency in self.latencies:
+            index = next(
+                (i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound),
+                len(LATENCY_BUCKETS),
+            )
+            counts[index] += 1
+        labels = [f"<= {bound:g}s" for bound in LATENCY_BUCKETS] + [
+            f"> {LATENCY_BUCKETS[-1]:g}s"
+        ]
+        return dict(zip(labels, counts))
+
+
+def fetch_id_token(url):
+    """Returns an ID token for a Cloud Run URL from the local credentials."""
+    import google.auth.transport.requests
+    import google.oauth2.id_token
+
+    return google.oauth2.id_token.fetch_id_token(
+        google.auth.transport.requests.Request(), url
+    )
+
+
+async def replay(args):
+    import httpx
+
+    bodies = load_corpus(args.corpus)
+    base_url = args.url.rstrip("/")
+    headers = {"Content-Type": "application/json"}
+    if args.auth:
+        headers["Authorization"] = f"Bearer {fetch_id_token(base_url)}"
+    run = uuid.uuid4().hex[:8]
+    stats = LoadStats()
+    rng = random.Random(args.seed)
+    total = args.requests or (len(bodies) if not args.duration else None)
+    limits = httpx.Limits(
+        max_connections=args.max_connections, max_keepalive_connections=args.max_connections
+    )
+
+    async with httpx.AsyncClient(
+        base_url=base_url, headers=headers, timeout=args.timeout, limits=limits
+    ) as client:
+
+        async def send(index, scheduled):
+            body = bodies[index % len(bodies)]
+            request_headers = {}
+            if args.task_names:
+                # Unique names exercise the stage store as Cloud Tasks would.
+                request_headers = {
+                    "X-CloudTasks-QueueName": f"load-test-{run}",
+                    "X-CloudTasks-TaskName": f"{index:010d}",
+                    "X-CloudTasks-TaskRetryCount": "0",
+                }
+            stats.max_lag = max(stats.max_lag, time.perf_counter() - scheduled)
+            try:
+                response = await client.post(
+                    "/process", content=body, headers=request_headers
+                )
+            except httpx.HTTPError as e:
+                stats.record(time.perf_counter() - scheduled, type(e).__name__)
+                return
+            error = None if response.status_code < 300 else f"HTTP {response.status_code}"
+            stats.record(time.perf_counter() - scheduled, error, response)
+
+        start = time.perf_counter()
+        deadline = start + args.duration if args.duration else None
+        sent = 0
+        if args.qps:
+            # Open loop: request i starts at its scheduled time, whether or
+            # not earlier requests have finished.
+            pending = set()
+            scheduled = start
+            while (total is None or sent < total) and (deadline is None or scheduled < deadline):
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                task = asyncio.ensure_future(send(sent, scheduled))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                sent += 1
+                gap = rng.expovariate(args.qps) if args.arrival == "poisson" else 1 / args.qps
+                scheduled += gap
+            if pending:
+                await asyncio.wait(pending)
+        else:
+            # Closed loop: `concurrency` workers each send their next request
+            # as soon as the previous one returns.
+            counter = itertools.count()
+
+            async def worker():
+                nonlocal sent
+                while True:
+                    index = next(counter)
+                    if (total is not None and index >= total) or (
+                        deadline is not None and time.perf_counter() >= deadline
+                    ):
+                        return
+                    sent += 1
+                    await send(index, time.perf_counter())
+
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+    return stats.report(elapsed, sent)
+
+
+def print_report(report, args):
+    mode = f"open loop at {args.qps} rps" if args.qps else f"{args.concurrency} concurrent"
+    print(
+        f"{report['completed']} of {report['sent']} requests ({mode}) in "
+        f"{report['elapsed_seconds']:.2f}s: {report['throughput_rps']:.2f} rps, "
+        f"{report['goodput_rps']:.2f} rps succeeded"
+    )
+    print(
+        "latency "
+        + "  ".join(f"{name} {value:.1f}ms" for name, value in report["latency_ms"].items())
+        + f"  max {report['latency_max_ms']:.1f}ms"
+    )
+    if args.qps and report["max_start_lag_ms"] > 100:
+        print(
+            f"warning: requests started up to {report['max_start_lag_ms']:.0f}ms late; "
+            "the load generator is saturated."
+        )
+    widest = max(report["histogram"].values(), default=0)
+    for label, count in report["histogram"].items():
+        if count:
+            bar = "#" * max(1, round(40 * count / widest))
+            print(f"{label:>10} {count:>8} {bar}")
+    if report["errors"]:
+        print("errors: " + ", ".join(f"{name} x{count}" for name, count in report["errors"].items()))
+    if report["asset_statuses"]:
+        print(f"asset statuses: {report['asset_statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    capture_parser = commands.add_parser("capture", help="Record task bodies to a corpus.")
+    capture_parser.add_argument("--out", default="process_corpus.jsonl")
+    capture_parser.add_argument(
+        "--state", default=STATE_FILE, help="Run state whose shards are captured."
+    )
+    capture_parser.add_argument(
+        "--synthetic", type=int, help="Capture this many synthetic assets instead."
+    )
+    capture_parser.add_argument(
+        "--observations", type=int, default=2, help="Images per synthetic asset."
+    )
+    capture_parser.add_argument("--limit", type=int, help="Stop after this many bodies.")
+
+    replay_parser = commands.add_parser("replay", help="Send a corpus to /process.")
+    replay_parser.add_argument("corpus")
+    replay_parser.add_argument(
+        "--url",
+        default=os.getenv("SERVICE_URL", "http://localhost:8080"),
+        help="Service URL (default: $SERVICE_URL or http://localhost:8080).",
+    )
+    load = replay_parser.add_mutually_exclusive_group(required=True)
+    load.add_argument("--qps", type=float, help="Open-loop request rate.")
+    load.add_argument("--concurrency", type=int, help="Closed-loop concurrent requests.")
+    replay_parser.add_argument(
+        "--arrival",
+        choices=["uniform", "poisson"],
+        default="poisson",
+        help="Open-loop arrivals: evenly spaced or exponential gaps.",
+    )
+    replay_parser.add_argument(
+        "--requests", type=int, help="Requests to send (default: the corpus once)."
+    )
+    replay_parser.add_argument(
+        "--duration", type=float, help="Send for this many seconds, cycling the corpus."
+    )
+    replay_parser.add_argument("--timeout", type=float, default=600.0)
+    replay_parser.add_argument("--max-connections", type=int, default=1000)
+    replay_parser.add_argument(
+        "--task-names",
+        action="store_true",
+        help="Send unique Cloud Tasks headers so results are staged like real tasks.",
+    )
+    replay_parser.add_argument("--auth", action="store_true", help="Send an ID token.")
+    replay_parser.add_argument("--seed", type=int, default=0)
+    replay_parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    if args.command == "capture":
+        print(f"Wrote {capture(args)} task bodies to {args.out}.")
+        return
+
+    report = asyncio.run(replay(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Shows how observation selection changes the size of Gemini requests.
+
+Synthetic assets get a skewed number of observations (a few assets are seen
+dozens of times), some repeated gcs_uris, and random capture times and
+camera headings. Each selector setting is applied to every asset, and the
+resulting requests are measured in images, approximate prompt tokens (258
+per image, as Gemini counts them) and JSON bytes of the batch prediction
+request.
+
+    python benchmarks/observation_benchmark.py --assets 5000
+    python benchmarks/observation_benchmark.py --mean-observations 30 --max-images 4 8 16
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from batch_prediction import build_request
+from config import BIGQUERY_SCHEMAS, PROMPTS, SELECTED_PROMPT_KEY
+from emulator import percentile
+from observation_selector import ObservationSelector
+from schema_compiler import compile_schema
+
+IMAGE_TOKENS = 258
+
+
+def generate_assets(count, mean_observations, duplicate_rate, seed):
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    assets = []
+    for i in range(count):
+        asset_id = f"asset-{i:07d}"
+        observations = []
+        for j in range(1 + int(rng.expovariate(1 / mean_observations))):
+            index = rng.randrange(j) if j and rng.random() < duplicate_rate else j
+            capture_time = start + datetime.timedelta(hours=rng.randrange(17520))
+            observations.append(
+                {
+                    "observation_id": f"{asset_id}-{j}",
+                    "gcs_uri": f"gs://bench-imagery/{asset_id}/{index}.jpg",
+                    "capture_time": capture_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "heading": rng.uniform(0.0, 360.0),
+                }
+            )
+        assets.append({"asset_id": asset_id, "observations": observations})
+    return assets
+
+
+def measure(assets, selector, prompt, schema):
+    images = []
+    request_bytes = 0
+    start = time.perf_counter()
+    # Selectors print every asset they shrink.
+    with contextlib.redirect_stdout(io.StringIO()):
+        selected = [selector(asset) for asset in assets]
+    seconds = time.perf_counter() - start
+    for asset in selected:
+        images.append(len(asset["observations"]))
+        request_bytes += len(json.dumps(build_request(asset, prompt, schema)))
+    total_images = sum(images)
+    prompt_tokens = total_images * IMAGE_TOKENS + len(assets) * (len(prompt) // 4)
+    return {
+        "images": total_images,
+        "p50": percentile(images, 0.5),
+        "p99": percentile(images, 0.99),
+        "max": max(images),
+        "tokens_per_request": prompt_tokens / len(assets),
+        "bytes_per_request": request_bytes / len(assets),
+        "selection_us": seconds / len(assets) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--assets", type=int, default=2000)
+    parser.add_argument("--mean-observations", type=float, default=12.0)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--max-images", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    assets = generate_assets(args.assets, args.mean_observations, args.duplicate_rate, args.seed)
+    prompt = PROMPTS[SELECTED_PROMPT_KEY]
+    schema = compile_schema(BIGQUERY_SCHEMAS[SELECTED_PROMPT_KEY])
+
+    settings = [("all", None)] + [
+        (strategy, max_images)
+        for max_images in args.max_images
+        for strategy in ("most_recent", "heading_diverse")
+    ]
+    baseline = None
+    print(
+        f"{'selector':<22}{'images':>9}{'p50':>6}{'p99':>6}{'max':>6}"
+        f"{'tokens/req':>12}{'bytes/req':>11}{'saved':>8}{'us/asset':>10}"
+    )
+    for strategy, max_images in settings:
+        result = measure(assets, ObservationSelector(strategy, max_images), prompt, schema)
+        if baseline is None:
+            baseline = result["tokens_per_request"]
+        label = strategy if max_images is None else f"{strategy} K={max_images}"
+        saved = 1 - result["tokens_per_request"] / baseline
+        print(
+            f"{label:<22}{result['images']:>9}{result['p50']:>6}{result['p99']:>6}"
+            f"{result['max']:>6}{result['tokens_per_request']:>12.0f}"
+            f"{result['bytes_per_request']:>11.0f}{saved:>8.1%}{result['selection_us']:>10.1f}"
+        )
+    raw = sum(len(asset["observations"]) for asset in assets)
+    print(f"\n{len(assets)} assets with {raw} observations before deduplication.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures end-to-end pipeline throughput with the offline emulator.
+
+A synthetic source is run through start_run, Pub/Sub push, process_shard,
+Cloud Tasks and /process in a single process (see src/emulator.py), with
+the configured shard size, task batch size, result sink and rate limiter.
+Only Gemini and the cloud services are emulated.
+
+    python benchmarks/pipeline_benchmark.py --assets 2000 --latency 1.5
+    python benchmarks/pipeline_benchmark.py --error-rate 0.05 --throttle-rate 0.02
+    python benchmarks/pipeline_benchmark.py --local --workers 32
+    python benchmarks/pipeline_benchmark.py --observations 40 --task-payload reference
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from config import LOCAL_WORKERS
+from emulator import Emulator, FakeGeminiModel, synthetic_source
+from rate_limiter import AdaptiveRateLimiter
+
+
+def print_report(report):
+    print(
+        f"{report['assets']} of {report['source_rows']} assets in "
+        f"{report['elapsed_seconds']:.2f}s: {report['assets_per_second']:.1f} assets/s"
+    )
+    print(
+        f"{report['shards']} shards ({report.get('undelivered_shards', 0)} undelivered), "
+        f"{report['tasks']} tasks ({report['failed_tasks']} failed, "
+        f"{report['task_retries']} retries), {report['gemini_calls']} Gemini calls"
+    )
+    print(
+        f"task latency p50 {report['task_latency_p50_ms']:.1f}ms  "
+        f"p99 {report['task_latency_p99_ms']:.1f}ms"
+    )
+    if "task_body_bytes_max" in report:
+        print(
+            f"task body p50 {report['task_body_bytes_p50']} bytes  "
+            f"max {report['task_body_bytes_max']} bytes"
+        )
+    print(f"rows written: {report['rows_written']}")
+    print(f"rate limiter: {report['rate_limiter']}")
+    print(f"{'stage':<10} {'calls':>7} {'total s':>9} {'mean ms':>9}")
+    for stage, stats in report["stages"].items():
+        print(
+            f"{stage:<10} {stats['calls']:>7} {stats['seconds']:>9.3f} {stats['mean_ms']:>9.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--assets", type=int, default=500, help="Assets in the source.")
+    parser.add_argument("--observations", type=int, default=2, help="Images per asset.")
+    parser.add_argument(
+        "--latency", type=float, default=0.5, help="Median Gemini latency in seconds."
+    )
+    parser.add_argument(
+        "--latency-sigma", type=float, default=0.5, help="Log-normal spread of the latency."
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fraction of calls that fail (500)."
+    )
+    parser.add_argument(
+        "--throttle-rate", type=float, default=0.0, help="Fraction of calls throttled (429)."
+    )
+    parser.add_argument(
+        "--qps",
+        type=float,
+        help="Fixed Gemini rate instead of the configured adaptive limiter.",
+    )
+    parser.add_argument(
+        "--dispatches", type=int, default=50, help="Tasks the queue dispatches at once."
+    )
+    parser.add_argument(
+        "--append-latency",
+        type=float,
+        default=0.02,
+        help="Seconds per Storage Write API append.",
+    )
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="Use the local runner instead of Pub/Sub and Cloud Tasks.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=LOCAL_WORKERS,
+        help="Local runner threads (with --local).",
+    )
+    parser.add_argument(
+        "--task-payload",
+        choices=["full", "reference"],
+        default="full",
+        help="Embed assets in tasks, or refer to rows of a run manifest.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    parser.add_argument("--verbose", action="store_true", help="Show the services' logs.")
+    args = parser.parse_args()
+
+    rate_limiter = None
+    if args.qps:
+        rate_limiter = AdaptiveRateLimiter(initial_rate=args.qps, max_rate=args.qps)
+    emulator = Emulator(
+        synthetic_source(args.assets, args.observations, seed=args.seed),
+        FakeGeminiModel(
+            median_latency=args.latency,
+            latency_sigma=args.latency_sigma,
+            error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate,
+            seed=args.seed,
+        ),
+        rate_limiter=rate_limiter,
+        max_dispatches=args.dispatches,
+        append_latency=args.append_latency,
+        task_payload=args.task_payload,
+    )
+    logs = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with logs:
+        report = emulator.run_local(workers=args.workers) if args.local else emulator.run()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
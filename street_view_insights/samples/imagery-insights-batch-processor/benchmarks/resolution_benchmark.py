@@ -0,0 +1,185 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks the RESOLUTION header evaluator against the Gemini path.
+
+Both paths run over the same local JPEG fixtures. The header path reads
+ranges of each file exactly as `HeaderReader` reads GCS objects. The model
+path reads each whole file, as Gemini must, and then either waits for
+`--model-latency` seconds or, with `--live`, sends the image to Gemini.
+
+    python benchmarks/resolution_benchmark.py --count 200
+    python benchmarks/resolution_benchmark.py --fixtures ~/images --live
+"""
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from analysis import parse_model_response
+from config import EVALUATORS, PROMPTS
+from image_header import HeaderReader
+
+
+class LocalHeaderReader(HeaderReader):
+    """Reads ranges of local files and counts the bytes read."""
+
+    def __init__(self):
+        super().__init__(None)
+        self.bytes_read = 0
+        self.reads = 0
+
+    def read_range(self, gcs_uri, start, end):
+        with open(gcs_uri, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        self.bytes_read += len(data)
+        self.reads += 1
+        return data
+
+
+def make_jpeg(width, height, exif_bytes, scan_bytes):
+    """A JPEG header with an EXIF block, followed by filler scan data."""
+
+    def segment(marker, payload):
+        return struct.pack(">BBH", 0xFF, marker, len(payload) + 2) + payload
+
+    data = b"\xff\xd8" + segment(0xE0, b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00")
+    data += segment(0xE1, b"Exif\x00\x00" + os.urandom(exif_bytes))
+    data += segment(0xDB, b"\x00" + bytes(range(64)))
+    data += segment(0xC0, struct.pack(">BHHB", 8, height, width, 3) + b"\x01\x22\x00" * 3)
+    data += segment(0xDA, b"\x03\x01\x00\x02\x11\x03\x11\x00\x3f\x00")
+    # 0xFF never appears unescaped in scan data.
+    return data + os.urandom(scan_bytes).replace(b"\xff", b"\x00") + b"\xff\xd9"
+
+
+def generate_fixtures(directory, count):
+    sizes = [(640, 480), (1920, 1080), (4096, 2048), (8192, 4096)]
+    paths = []
+    for i in range(count):
+        width, height = sizes[i % len(sizes)]
+        path = os.path.join(directory, f"fixture_{i:05d}.jpg")
+        with open(path, "wb") as f:
+            # Street-level imagery often carries several KB of EXIF/XMP.
+            f.write(make_jpeg(width, height, 1024 * (i % 40), width * height // 8))
+        paths.append(path)
+    return paths
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def report(name, latencies, bytes_read, reads):
+    total = sum(latencies)
+    print(
+        f"{name:<8} {len(latencies):>6} images  {total:8.2f}s total  "
+        f"p50 {percentile(latencies, 0.5) * 1000:9.2f}ms  "
+        f"p95 {percentile(latencies, 0.95) * 1000:9.2f}ms  "
+        f"{len(latencies) / total if total else 0:10.1f} images/s  "
+        f"{bytes_read / len(latencies) / 1024:9.1f} KB/image  {reads / len(latencies):.1f} reads/image"
+    )
+
+
+def run_header_path(paths):
+    reader = LocalHeaderReader()
+    latencies, answers = [], {}
+    for path in paths:
+        start = time.perf_counter()
+        answers[path] = EVALUATORS["RESOLUTION"](
+            {"asset_id": path, "observations": [{"gcs_uri": path}]}, reader
+        )
+        latencies.append(time.perf_counter() - start)
+    report("header", latencies, reader.bytes_read, reader.reads)
+    return answers
+
+
+def run_model_path(paths, model_latency, live):
+    model = None
+    if live:
+        import vertexai
+        from vertexai.generative_models import GenerativeModel, Part
+        from config import GCP_PROJECT, LOCATION, GEMINI_MODEL
+
+        vertexai.init(project=GCP_PROJECT, location=LOCATION)
+        model = GenerativeModel(GEMINI_MODEL)
+
+    latencies, answers, bytes_read = [], {}, 0
+    for path in paths:
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            data = f.read()
+        bytes_read += len(data)
+        if model is not None:
+            response = model.generate_content(
+                [Part.from_data(data, mime_type="image/jpeg"), PROMPTS["RESOLUTION"]]
+            )
+            answers[path] = parse_model_response(response.text)
+        elif model_latency:
+            time.sleep(model_latency)
+        latencies.append(time.perf_counter() - start)
+    report("model", latencies, bytes_read, len(paths))
+    return answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", help="Directory of .jpg files (generated if omitted).")
+    parser.add_argument("--count", type=int, default=100, help="Fixtures to generate.")
+    parser.add_argument(
+        "--model-latency",
+        type=float,
+        default=0.0,
+        help="Seconds added per model call when not --live (use the latency seen in your project).",
+    )
+    parser.add_argument("--live", action="store_true", help="Send the fixtures to Gemini.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.fixtures:
+            paths = sorted(
+                os.path.join(args.fixtures, name)
+                for name in os.listdir(args.fixtures)
+                if name.lower().endswith((".jpg", ".jpeg"))
+            )
+        else:
+            paths = generate_fixtures(directory, args.count)
+        mean_size = sum(os.path.getsize(p) for p in paths) / len(paths) / 1024
+        print(f"{len(paths)} fixtures, {mean_size:.1f} KB on average")
+
+        header_answers = run_header_path(paths)
+        model_answers = run_model_path(paths, args.model_latency, args.live)
+
+    if args.live:
+        agree = sum(
+            1
+            for path in paths
+            if header_answers[path]
+            and model_answers[path].get("width") == header_answers[path]["width"]
+            and model_answers[path].get("height") == header_answers[path]["height"]
+        )
+        print(f"Gemini agreed with the header on {agree} of {len(paths)} images.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures cold-start time, from import to first request, for each service role.
+
+Every role runs in a fresh interpreter. The script times the import of the
+service module, then builds everything the role's first request needs,
+stopping short of network calls. The "eager" row builds every client of
+both services, as all roles did at import time before clients were lazy.
+Client construction needs credentials but makes no requests; set
+GOOGLE_APPLICATION_CREDENTIALS (any well-formed service account key works).
+
+    python benchmarks/startup_benchmark.py --repeat 5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# The service module of each role, and what its first request builds.
+ROLES = {
+    "process": (
+        "main",
+        """
+from config import EVALUATORS, LOCAL_EVALUATORS, SELECTED_PROMPT_KEYS
+module.get_analyses()
+module.get_evaluators()
+module.get_result_sinks()
+module.get_response_cache()
+if not LOCAL_EVALUATORS or any(key not in EVALUATORS for key in SELECTED_PROMPT_KEYS):
+    module.model.model._get_model()
+""",
+    ),
+    "populate": (
+        "main",
+        """
+from enqueuer import build_task, batch_payloads
+from source_reader import build_task_payloads
+module.tasks_client()
+module.get_source_reader()
+module.get_enqueuer()
+""",
+    ),
+    "shard": (
+        "populate_with_cloud_run",
+        """
+module.tasks_client()
+module.get_source_reader()
+module.get_enqueuer()
+module.bigquery_client()
+""",
+    ),
+    "eager": (
+        "main",
+        """
+import clients
+import populate_with_cloud_run
+for build in (
+    clients.bigquery_client,
+    clients.tasks_client,
+    clients.storage_client,
+    clients.publisher_client,
+    clients.subscriber_client,
+    module.get_analyses,
+    module.get_evaluators,
+    module.get_result_sinks,
+    module.get_response_cache,
+    module.get_source_reader,
+    module.get_enqueuer,
+    module.model.model._get_model,
+):
+    build()
+""",
+    ),
+}
+
+PROBE = """
+import importlib, json, time
+start = time.perf_counter()
+module = importlib.import_module({module!r})
+imported = time.perf_counter()
+{first_request}
+ready = time.perf_counter()
+print(json.dumps({{"import": imported - start, "first_request": ready - imported}}))
+"""
+
+
+def measure(role):
+    module, first_request = ROLES[role]
+    code = PROBE.format(module=module, first_request=first_request)
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", code],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Cold starts per role.")
+    parser.add_argument("roles", nargs="*", help=f"Roles to measure: {', '.join(ROLES)}.")
+    args = parser.parse_args()
+    unknown = set(args.roles) - set(ROLES)
+    if unknown:
+        parser.error(f"unknown roles: {', '.join(sorted(unknown))}")
+
+    print(f"{'role':<10} {'import':>9} {'init':>9} {'total':>9}   (median of {args.repeat})")
+    for role in args.roles or ROLES:
+        runs = sorted(
+            (measure(role) for _ in range(args.repeat)),
+            key=lambda run: run["import"] + run["first_request"],
+        )
+        median = runs[len(runs) // 2]
+        print(
+            f"{role:<10} {median['import']:8.2f}s {median['first_request']:8.2f}s "
+            f"{median['import'] + median['first_request']:8.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
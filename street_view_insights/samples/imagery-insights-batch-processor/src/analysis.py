@@ -0,0 +1,232 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per-asset analysis used by the `/process` endpoint.
+
+A task body is either a single asset payload or a batch of the form
+`{"assets": [payload, ...]}`. The assets of a batch are analyzed
+concurrently, and each one succeeds or fails on its own. Every asset can be
+analyzed with several prompts in the same pass.
+"""
+
+import contextlib
+import json
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from config import RAW_RESPONSE_LOG_RATE
+
+INVALID_JSON_ERROR = "Invalid JSON response from model."
+
+
+def task_assets(data):
+    """Returns the asset payloads carried by a task body."""
+    if "assets" in data:
+        return data["assets"]
+    return [data]
+
+
+def parse_model_response(text):
+    """Parses the model's JSON answer, tolerating ```json fences."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        # Answers without a response schema may be enclosed in ```json ... ```
+        cleaned_response = text.strip().replace("```json", "").replace("```", "")
+        return json.loads(cleaned_response)
+    except json.JSONDecodeError:
+        return {"error": INVALID_JSON_ERROR}
+
+
+def image_parts_for(asset):
+    """Returns the Gemini image parts of an asset's observations."""
+    # Imported here so that instances that never call Gemini skip Vertex AI.
+    from vertexai.generative_models import Part
+
+    return [
+        Part.from_uri(o["gcs_uri"], mime_type="image/jpeg")
+        for o in asset.get("observations", [])
+    ]
+
+
+def analyze_asset(
+    model,
+    asset,
+    prompt,
+    compiled_schema,
+    cache=None,
+    image_parts=None,
+    evaluator=None,
+    parse_stats=None,
+    prompt_key="",
+    call_slots=None,
+):
+    """
+    Runs the model over an asset's images and returns its result row.
+
+    The model is asked for JSON matching `compiled_schema` (see
+    `schema_compiler.py`), which also projects the answer into a row. With
+    a `cache`, a response already stored for the same prompt, images and
+    response schema is reused and the model is not called. `image_parts`
+    lets several prompts share the parts built for the same asset. An
+    `evaluator(asset)` that returns the analysis fields replaces the model
+    call; when it returns None the model is used. `parse_stats` counts
+    responses that could not be parsed. Metrics are labeled with `prompt_key`.
+    `call_slots` is a semaphore shared by the calls of a task; the model call
+    holds one of its slots.
+    """
+    asset_id = asset.get("asset_id")
+    print(f"Processing task for asset_id: {asset_id}")
+    observations = asset.get("observations", [])
+
+    if evaluator is not None:
+        analysis_data = evaluator(asset)
+        if analysis_data is not None:
+            return compiled_schema.project(asset, analysis_data)[0]
+
+    generation_config = compiled_schema.generation_config
+    key = None
+    if cache is not None:
+        key = cache.key(prompt, [o["gcs_uri"] for o in observations], generation_config)
+        cached_text = cache.get(key)
+        metrics.CACHE_REQUESTS.labels(prompt_key, "miss" if cached_text is None else "hit").inc()
+        if cached_text is not None:
+            return compiled_schema.project(asset, parse_model_response(cached_text))[0]
+
+    if image_parts is None:
+        image_parts = image_parts_for(asset)
+    with call_slots or contextlib.nullcontext(), metrics.prompt_scope(prompt_key):
+        with metrics.GEMINI_LATENCY_SECONDS.labels(prompt_key).time():
+            response = model.generate_content(
+                [*image_parts, prompt], generation_config=generation_config
+            )
+    record_token_counts(prompt_key, response)
+
+    analysis_data = parse_model_response(response.text)
+    parse_failed = analysis_data.get("error") == INVALID_JSON_ERROR
+    if parse_failed or random.random() < RAW_RESPONSE_LOG_RATE:
+        print(f"Raw Gemini response for {asset_id}: {response.text}")
+    row, coercion_failures = compiled_schema.project(asset, analysis_data)
+    if parse_stats is not None:
+        parse_stats.record(parse_failed, coercion_failures)
+    if parse_failed:
+        metrics.PARSE_FAILURES.labels(prompt_key).inc()
+    if coercion_failures:
+        metrics.COERCION_FAILURES.labels(prompt_key).inc(coercion_failures)
+    # Only cache usable answers so that a retry can recover from a bad one.
+    if key is not None and not parse_failed:
+        cache.put(key, response.text)
+    return row
+
+
+def record_token_counts(prompt_key, response):
+    """Observes the prompt and response token counts reported with a response."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, count in (
+        ("prompt", getattr(usage, "prompt_token_count", 0)),
+        ("response", getattr(usage, "candidates_token_count", 0)),
+    ):
+        if count:
+            metrics.GEMINI_TOKENS.labels(prompt_key, kind).observe(count)
+
+
+def analyze_asset_prompts(
+    model,
+    asset,
+    analyses,
+    cache=None,
+    evaluators=None,
+    parse_stats=None,
+    call_slots=None,
+):
+    """
+    Runs several prompts over an asset's images and returns their rows.
+
+    `analyses` is a list of `(prompt_key, prompt, compiled_schema)`, and `evaluators`
+    optionally maps prompt keys to local evaluators. The image parts are
+    built once and the prompts run concurrently. The result maps each
+    prompt key to its row; if any prompt fails, the asset fails as a whole
+    so that a retry writes every table once. Pass the same `call_slots`
+    semaphore for every asset of a task to bound its model calls in flight.
+    """
+    evaluators = evaluators or {}
+    image_parts = None
+    if any(key not in evaluators for key, _, _ in analyses):
+        image_parts = image_parts_for(asset)
+    if len(analyses) == 1:
+        key, prompt, schema = analyses[0]
+        return {
+            key: analyze_asset(
+                model,
+                asset,
+                prompt,
+                schema,
+                cache,
+                image_parts,
+                evaluators.get(key),
+                parse_stats,
+                key,
+                call_slots,
+            )
+        }
+    with ThreadPoolExecutor(max_workers=len(analyses)) as executor:
+        futures = {
+            key: executor.submit(
+                analyze_asset,
+                model,
+                asset,
+                prompt,
+                schema,
+                cache,
+                image_parts,
+                evaluators.get(key),
+                parse_stats,
+                key,
+                call_slots,
+            )
+            for key, prompt, schema in analyses
+        }
+        return {key: future.result() for key, future in futures.items()}
+
+
+def run_batch(assets, handler, max_concurrency):
+    """
+    Applies `handler` to every asset with at most `max_concurrency` in flight.
+
+    Returns one outcome per asset, in input order:
+    `{"asset_id": ..., "status": "ok", "result": <handler return value>}` or
+    `{"asset_id": ..., "status": "error", "error": "<message>"}`.
+    """
+
+    def run_one(asset):
+        try:
+            return {
+                "asset_id": asset.get("asset_id"),
+                "status": "ok",
+                "result": handler(asset),
+            }
+        except Exception as e:
+            print(f"Error processing {asset.get('asset_id')}: {e}")
+            return {"asset_id": asset.get("asset_id"), "status": "error", "error": str(e)}
+
+    if len(assets) <= 1 or max_concurrency <= 1:
+        return [run_one(asset) for asset in assets]
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(assets))) as executor:
+        return list(executor.map(run_one, assets))
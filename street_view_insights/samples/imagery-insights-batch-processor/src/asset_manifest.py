@@ -0,0 +1,202 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per-shard asset manifests for reference-only task payloads.
+
+With `TASK_PAYLOAD = "reference"`, the populate client writes the assets of
+every shard of a run to their own Arrow IPC file under ASSET_MANIFEST_URI,
+in compressed record batches of one task's rows. Tasks then carry only the
+manifest URI of their shard and a row range:
+
+    {"manifest": {"uri": "gs://bucket/manifests/<run_id>/<shard>.arrow", "offset": 20, "rows": 10}}
+
+so their size no longer depends on how many observations an asset has.
+The schema metadata of a manifest records its row count and batch size, so
+`/process` reads a shard's manifest once per instance and decodes only the
+record batches of each task's rows.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+
+from source_reader import build_task_payloads
+
+COMPRESSION = "zstd" if pa.Codec.is_available("zstd") else None
+
+
+def manifest_uri(prefix, run_id, shard):
+    """Returns where the manifest of a run's shard is stored under a gs:// or local prefix."""
+    return f"{prefix.rstrip('/')}/{run_id}/{shard}.arrow"
+
+
+def reference_bodies(reference, batch_size):
+    """
+    Splits a shard's manifest rows into task bodies of up to `batch_size` assets.
+
+    `reference` is the `{"uri", "offset", "rows"}` range of a shard message.
+    """
+    batch_size = max(batch_size, 1)
+    end = reference["offset"] + reference["rows"]
+    for offset in range(reference["offset"], end, batch_size):
+        yield {
+            "manifest": {
+                "uri": reference["uri"],
+                "offset": offset,
+                "rows": min(batch_size, end - offset),
+            }
+        }
+
+
+def write_manifest(batches, path, batch_rows):
+    """
+    Writes the record batches of one shard to an Arrow IPC file at `path`.
+
+    Rows are stored in record batches of `batch_rows` (the task batch size),
+    so a task decodes only its own rows. Returns the number of rows.
+    """
+    batch_rows = max(batch_rows, 1)
+    batches = [batch for batch in batches if batch.num_rows]
+    if batches:
+        table = pa.Table.from_batches(batches).combine_chunks()
+    else:
+        # A shard without assets still gets a (valid, empty) manifest.
+        table = pa.table({})
+    # The row count and batch size let a reader find a row's batch without
+    # decoding any batch.
+    table = table.replace_schema_metadata(
+        {"rows": str(table.num_rows), "batch_rows": str(batch_rows)}
+    )
+    options = pa.ipc.IpcWriteOptions(compression=COMPRESSION)
+    with pa.ipc.new_file(path, table.schema, options=options) as writer:
+        if table.num_rows:
+            writer.write_table(table, max_chunksize=batch_rows)
+    return table.num_rows
+
+
+def write_shard_manifests(reader, messages, uris, storage_client, batch_rows, max_workers=8):
+    """
+    Reads every shard message and stores its manifest at the matching URI.
+
+    Shards are read and uploaded by up to `max_workers` threads. Returns the
+    number of rows of every shard, in message order.
+    """
+
+    def write(message, uri):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "manifest.arrow")
+            rows = write_manifest(reader.read_shard(message), path, batch_rows)
+            store_manifest(path, uri, storage_client)
+        return rows
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="manifest") as executor:
+        return list(executor.map(write, messages, uris))
+
+
+def _blob(storage_client, uri):
+    bucket_name, _, blob_name = uri[len("gs://") :].partition("/")
+    return storage_client.bucket(bucket_name).blob(blob_name)
+
+
+def store_manifest(path, uri, storage_client):
+    """
+    Moves a written manifest to its gs:// or local `uri`.
+
+    `storage_client` is a function returning the Cloud Storage client; it is
+    only called for gs:// URIs.
+    """
+    if uri.startswith("gs://"):
+        _blob(storage_client(), uri).upload_from_filename(path)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(uri)), exist_ok=True)
+    shutil.move(path, uri)
+
+
+class AssetManifest:
+    """A shard manifest, from a file path or a buffer, that serves asset payloads by row range."""
+
+    def __init__(self, source):
+        if isinstance(source, str):
+            source = pa.memory_map(source)
+        self._reader = pa.ipc.open_file(source)
+        metadata = self._reader.schema.metadata or {}
+        self.num_rows = int(metadata.get(b"rows", 0))
+        self.batch_rows = int(metadata.get(b"batch_rows", 1))
+
+    def assets(self, offset, rows):
+        """Returns the task payloads of manifest rows `[offset, offset + rows)`."""
+        end = offset + rows
+        if offset < 0 or end > self.num_rows:
+            raise IndexError(
+                f"Manifest rows {offset}-{end} are out of range ({self.num_rows} rows)."
+            )
+        payloads = []
+        while offset < end:
+            index, start = divmod(offset, self.batch_rows)
+            length = min(end - offset, self.batch_rows - start)
+            batch = self._reader.get_batch(index)
+            payloads.extend(build_task_payloads(batch.slice(start, length)))
+            offset += length
+        return payloads
+
+
+class ManifestCache:
+    """
+    Opens shard manifests by URI, reading gs:// manifests into memory.
+
+    The `max_manifests` most recently used manifests stay open; local paths
+    are memory-mapped in place. Different manifests load concurrently. As in
+    `store_manifest`, `storage_client` is a function returning the client.
+    """
+
+    def __init__(self, storage_client, max_manifests=16):
+        self.storage_client = storage_client
+        self.max_manifests = max_manifests
+        self._manifests = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def manifest(self, uri):
+        with self._lock:
+            if uri in self._manifests:
+                self._manifests.move_to_end(uri)
+                return self._manifests[uri]
+            loading = self._loading.setdefault(uri, threading.Lock())
+        with loading:
+            with self._lock:
+                manifest = self._manifests.get(uri)
+            if manifest is None:
+                manifest = AssetManifest(self._open(uri))
+                with self._lock:
+                    self._manifests[uri] = manifest
+                    self._loading.pop(uri, None)
+                    while len(self._manifests) > self.max_manifests:
+                        self._manifests.popitem(last=False)
+            return manifest
+
+    def task_assets(self, data):
+        """Returns the asset payloads referenced by a task body."""
+        reference = data["manifest"]
+        return self.manifest(reference["uri"]).assets(reference["offset"], reference["rows"])
+
+    def _open(self, uri):
+        if not uri.startswith("gs://"):
+            return uri
+        return pa.py_buffer(_blob(self.storage_client(), uri).download_as_bytes())
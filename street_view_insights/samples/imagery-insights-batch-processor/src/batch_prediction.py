@@ -0,0 +1,687 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Processes a run with Gemini batch prediction instead of online calls.
+
+Every shard of the run is turned into a JSONL file with one
+`GenerateContentRequest` per asset and prompt, built from `PROMPTS`, the
+compiled response schemas and the observation URIs, plus a manifest of the
+assets behind the requests. Shard files are grouped into jobs of up to
+BATCH_PREDICTION_MAX_REQUESTS requests, the jobs are submitted and polled,
+and their output files are parsed into rows shaped by `BIGQUERY_SCHEMAS`
+and written through `main.write_results`. Output lines are matched to
+their assets by a fingerprint of the echoed request, so no custom fields
+are needed in the request. Prompts with a local evaluator are evaluated
+while the requests are built and do not go to the batch job.
+
+`VertexBatchBackend` stores the files in Cloud Storage and runs Vertex AI
+batch prediction jobs; `LocalBatchBackend` is an offline stand-in that
+answers each request file with canned responses.
+
+    python3 src/populate_with_cloud_run.py --backend batch_prediction
+    python3 src/populate_with_cloud_run.py --backend batch_prediction --resume
+"""
+
+import glob
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+
+import metrics
+from analysis import INVALID_JSON_ERROR, parse_model_response
+from checkpoint import (
+    build_shard_messages,
+    completed_shard_ids,
+    ensure_checkpoint_table,
+    load_state,
+    pending_shard_messages,
+    record_shard_complete,
+    save_state,
+    shard_id,
+)
+from config import (
+    BATCH_PREDICTION_BACKEND,
+    BATCH_PREDICTION_LOCAL_DIR,
+    BATCH_PREDICTION_MAX_REQUESTS,
+    BATCH_PREDICTION_POLL_SECONDS,
+    BATCH_PREDICTION_URI,
+    BATCH_PREDICTION_WRITE_ATTEMPTS,
+    BATCH_STATE_FILE,
+    BIGQUERY_CHECKPOINT_TABLE,
+    GEMINI_MODEL,
+    INCREMENTAL_MODE,
+)
+from source_reader import build_task_payloads
+
+# Rows are written to the results tables in chunks of this many assets.
+WRITE_CHUNK_SIZE = 500
+
+
+def build_request(asset, prompt, compiled_schema):
+    """Returns the batch prediction request line for one asset and prompt."""
+    parts = [
+        {"fileData": {"fileUri": o["gcs_uri"], "mimeType": "image/jpeg"}}
+        for o in asset.get("observations", [])
+    ]
+    parts.append({"text": prompt})
+    return {
+        "request": {
+            "contents": [{"role": "user", "parts": parts}],
+            "generationConfig": {
+                "responseMimeType": "application/json",
+                "responseSchema": compiled_schema.response_schema,
+            },
+        }
+    }
+
+
+def request_key(request):
+    """
+    Fingerprints a request by its image URIs and prompt text.
+
+    Accepts the camelCase request written by `build_request` as well as the
+    snake_case form, so the request echoed in an output line maps back to
+    the one that was submitted.
+    """
+    uris = []
+    texts = []
+    for content in request.get("contents", []):
+        for part in content.get("parts", []):
+            file_data = part.get("fileData") or part.get("file_data")
+            if file_data:
+                uris.append(file_data.get("fileUri") or file_data.get("file_uri"))
+            elif "text" in part:
+                texts.append(part["text"])
+    return hashlib.sha256(json.dumps([uris, texts]).encode("utf-8")).hexdigest()
+
+
+def response_text(response):
+    """Returns the text of the first candidate of a response, or None."""
+    candidates = response.get("candidates") or []
+    if not candidates:
+        return None
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts)
+
+
+def record_usage(prompt_key, response):
+    """Observes the token counts reported in an output line."""
+    usage = response.get("usageMetadata") or response.get("usage_metadata") or {}
+    for kind, names in (
+        ("prompt", ("promptTokenCount", "prompt_token_count")),
+        ("response", ("candidatesTokenCount", "candidates_token_count")),
+    ):
+        count = next((usage[name] for name in names if name in usage), 0)
+        if count:
+            metrics.GEMINI_TOKENS.labels(prompt_key, kind).observe(count)
+
+
+def _placeholder(schema):
+    kind = schema.get("type")
+    if kind == "OBJECT":
+        return {name: _placeholder(field) for name, field in schema.get("properties", {}).items()}
+    if kind == "ARRAY":
+        return []
+    return {"STRING": "", "INTEGER": 0, "NUMBER": 0.0, "BOOLEAN": False}.get(kind)
+
+
+def canned_response(request):
+    """Answers a request with placeholder values that match its response schema."""
+    schema = request.get("generationConfig", {}).get("responseSchema", {})
+    answer = _placeholder(schema)
+    if isinstance(answer, dict):
+        answer.pop("error", None)
+    return json.dumps(answer)
+
+
+def _read_jsonl(lines):
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+class LocalBatchBackend:
+    """
+    Offline stand-in for batch prediction, backed by a local directory.
+
+    `submit` answers every request of its input files at once with
+    `respond(request)`, which returns the response text or raises to
+    produce an error line, and writes them to `<output>/predictions.jsonl`.
+    """
+
+    def __init__(self, directory, respond=canned_response):
+        self.directory = directory
+        self.respond = respond
+
+    def location(self, name):
+        return os.path.join(self.directory, name)
+
+    def write_lines(self, name, lines):
+        path = self.location(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            for line in lines:
+                f.write(json.dumps(line) + "\n")
+        return path
+
+    def read_lines(self, path):
+        with open(path) as f:
+            yield from _read_jsonl(f)
+
+    def submit(self, input_uris, output_prefix):
+        os.makedirs(output_prefix, exist_ok=True)
+        with open(os.path.join(output_prefix, "predictions.jsonl"), "w") as out:
+            for path in input_uris:
+                for line in self.read_lines(path):
+                    request = line["request"]
+                    try:
+                        text = self.respond(request)
+                        result = {
+                            "request": request,
+                            "status": "",
+                            "response": {
+                                "candidates": [
+                                    {"content": {"role": "model", "parts": [{"text": text}]}}
+                                ]
+                            },
+                        }
+                    except Exception as e:
+                        result = {"request": request, "status": str(e)}
+                    out.write(json.dumps(result) + "\n")
+        return output_prefix
+
+    def wait(self, job):
+        return job
+
+    def output_files(self, location):
+        return sorted(glob.glob(os.path.join(location, "*.jsonl")))
+
+
+class VertexBatchBackend:
+    """Stores request files in Cloud Storage and runs Vertex AI batch prediction jobs."""
+
+    def __init__(self, storage_client, uri_prefix, model_name, poll_seconds=60, sleep=time.sleep):
+        if not uri_prefix or not uri_prefix.startswith("gs://"):
+            raise ValueError("BATCH_PREDICTION_URI must be a gs:// prefix.")
+        self.storage_client = storage_client
+        self.uri_prefix = uri_prefix.rstrip("/")
+        self.model_name = model_name
+        self.poll_seconds = poll_seconds
+        self.sleep = sleep
+
+    def location(self, name):
+        return f"{self.uri_prefix}/{name}"
+
+    def _blob(self, uri):
+        bucket_name, _, blob_name = uri[len("gs://") :].partition("/")
+        return self.storage_client.bucket(bucket_name).blob(blob_name)
+
+    def write_lines(self, name, lines):
+        uri = self.location(name)
+        self._blob(uri).upload_from_string(
+            "".join(json.dumps(line) + "\n" for line in lines),
+            content_type="application/jsonl",
+        )
+        return uri
+
+    def read_lines(self, uri):
+        yield from _read_jsonl(self._blob(uri).download_as_text().splitlines())
+
+    def submit(self, input_uris, output_prefix):
+        from clients import vertexai_initialized
+        from vertexai.batch_prediction import BatchPredictionJob
+
+        vertexai_initialized()
+        job = BatchPredictionJob.submit(
+            source_model=self.model_name,
+            input_dataset=list(input_uris),
+            output_uri_prefix=output_prefix,
+        )
+        print(f"Submitted batch prediction job {job.resource_name}.")
+        return job.resource_name
+
+    def wait(self, job_name):
+        """Polls a job until it ends and returns its output location."""
+        from clients import vertexai_initialized
+        from vertexai.batch_prediction import BatchPredictionJob
+
+        vertexai_initialized()
+        job = BatchPredictionJob(job_name)
+        while not job.has_ended:
+            self.sleep(self.poll_seconds)
+            job.refresh()
+        if not job.has_succeeded:
+            raise RuntimeError(f"Batch prediction job {job_name} failed: {job.error}")
+        return job.output_location
+
+    def output_files(self, location):
+        bucket_name, _, prefix = location[len("gs://") :].partition("/")
+        return [
+            f"gs://{bucket_name}/{blob.name}"
+            for blob in self.storage_client.list_blobs(bucket_name, prefix=prefix)
+            if blob.name.endswith(".jsonl")
+        ]
+
+
+def make_batch_backend(kind, storage_client=None):
+    """Builds the configured batch prediction backend (`vertex` or `local`)."""
+    if kind == "local":
+        return LocalBatchBackend(BATCH_PREDICTION_LOCAL_DIR)
+    if kind == "vertex":
+        return VertexBatchBackend(
+            storage_client,
+            BATCH_PREDICTION_URI,
+            GEMINI_MODEL,
+            poll_seconds=BATCH_PREDICTION_POLL_SECONDS,
+        )
+    raise ValueError(f"Unknown batch prediction backend: {kind}")
+
+
+class BatchStats:
+    """Counters for a batch prediction run."""
+
+    def __init__(self):
+        self.jobs = 0
+        self.requests = 0
+        self.evaluated = 0
+        self.assets = 0
+        self.failed_assets = 0
+        self.completed_shards = 0
+
+    def __str__(self):
+        return (
+            f"Batch prediction: {self.jobs} jobs, {self.requests} requests, "
+            f"{self.evaluated} rows evaluated locally, {self.assets} assets written, "
+            f"{self.failed_assets} failed, {self.completed_shards} shards complete"
+        )
+
+
+class BatchPredictionRunner:
+    """
+    Builds, submits and collects the batch prediction jobs of a run.
+
+    `analyses` are the `(prompt_key, prompt, compiled_schema)` tuples of
+    `main.get_analyses`, `write(results)` writes `{prompt_key: row}` dicts
+    like `main.write_results`, `dead_letter(job, failures)` records
+    `(asset, error)` pairs, and `on_shard_complete(message, requests)` is
+    called for every shard of a collected job. A `select_observations(asset)`
+    callable (see `observation_selector.py`) chooses each asset's images.
+    Rejected rows are written up to `write_attempts` times before their
+    assets are dead-lettered.
+    """
+
+    def __init__(
+        self,
+        backend,
+        reader,
+        analyses,
+        write,
+        evaluators=None,
+        dead_letter=None,
+        on_shard_complete=None,
+        max_requests=BATCH_PREDICTION_MAX_REQUESTS,
+        select_observations=None,
+        write_attempts=BATCH_PREDICTION_WRITE_ATTEMPTS,
+        initial_backoff=1.0,
+        max_backoff=30.0,
+        sleep=time.sleep,
+    ):
+        self.backend = backend
+        self.reader = reader
+        self.analyses = analyses
+        self.write = write
+        self.evaluators = evaluators or {}
+        self.dead_letter = dead_letter
+        self.on_shard_complete = on_shard_complete
+        self.max_requests = max_requests
+        self.select_observations = select_observations
+        self.write_attempts = write_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.stats = BatchStats()
+
+    def build_shard(self, run_id, message):
+        """Writes a shard's request file and manifest; returns their locations and size."""
+        requests = []
+        manifest = []
+        batches = metrics.timed_batches(
+            self.reader.read_shard(message),
+            metrics.BIGQUERY_QUERY_SECONDS.labels("shard_read"),
+        )
+        for batch in batches:
+            for asset in build_task_payloads(batch):
+                if self.select_observations is not None:
+                    asset = self.select_observations(asset)
+                for key, prompt, schema in self.analyses:
+                    evaluator = self.evaluators.get(key)
+                    analysis_data = evaluator(asset) if evaluator is not None else None
+                    if analysis_data is not None:
+                        row = schema.project(asset, analysis_data)[0]
+                        manifest.append({"prompt_key": key, "asset": asset, "row": row})
+                        continue
+                    line = build_request(asset, prompt, schema)
+                    requests.append(line)
+                    manifest.append(
+                        {"prompt_key": key, "asset": asset, "key": request_key(line["request"])}
+                    )
+        name = f"{run_id}/{shard_id(message)}"
+        return {
+            "shard": message,
+            "requests": self.backend.write_lines(f"{name}/requests.jsonl", requests)
+            if requests
+            else None,
+            "manifest": self.backend.write_lines(f"{name}/manifest.jsonl", manifest),
+            "request_count": len(requests),
+        }
+
+    def submit(self, run_id, messages, on_submitted=None):
+        """
+        Builds every shard and submits them in jobs of up to `max_requests`.
+
+        Returns the job records, which are JSON-serializable so that a
+        resumed run can collect jobs that were already submitted.
+        `on_submitted(job)` receives each record as soon as its job is
+        submitted, before the next shard is built.
+        """
+        jobs = []
+        group = []
+
+        def flush():
+            if not group:
+                return
+            inputs = [shard["requests"] for shard in group if shard["requests"]]
+            job = None
+            if inputs:
+                # Named after the first shard, so a resumed run's jobs never
+                # share an output prefix with the jobs submitted before.
+                output_prefix = self.backend.location(
+                    f"{run_id}/output-{shard_id(group[0]['shard'])}"
+                )
+                job = self.backend.submit(inputs, output_prefix)
+                self.stats.jobs += 1
+            jobs.append(
+                {
+                    "job": job,
+                    "shards": [shard["shard"] for shard in group],
+                    "manifests": [shard["manifest"] for shard in group],
+                    "requests": sum(shard["request_count"] for shard in group),
+                }
+            )
+            group.clear()
+            if on_submitted is not None:
+                on_submitted(jobs[-1])
+
+        for message in messages:
+            shard = self.build_shard(run_id, message)
+            self.stats.requests += shard["request_count"]
+            grouped = sum(s["request_count"] for s in group)
+            if group and grouped + shard["request_count"] > self.max_requests:
+                flush()
+            group.append(shard)
+        flush()
+        return jobs
+
+    def collect(self, job, on_progress=None):
+        """
+        Waits for a job, writes its rows and checkpoints its shards.
+
+        The output files are read one at a time, and each asset's rows are
+        written in the next chunk once all of its prompts are answered, so
+        only the manifest entries and the unwritten rows are held in memory.
+        The job record keeps the collection's progress: `written`, the number
+        of succeeded assets whose row chunk is written, and `dead_lettered`
+        once the failed predictions are dead-lettered. `on_progress(job)` is
+        called after each step, so a collection resumed from a saved record
+        skips what was already done instead of writing it twice.
+        """
+        # Every prompt of an asset must succeed, as in analyze_asset_prompts.
+        assets = {}
+        requests = {}
+        for manifest in job["manifests"]:
+            for entry in self.backend.read_lines(manifest):
+                asset = entry["asset"]
+                result = assets.setdefault(
+                    asset["asset_id"], {"asset": asset, "rows": {}, "pending": 0, "error": None}
+                )
+                if "row" in entry:
+                    self.stats.evaluated += 1
+                    result["rows"][entry["prompt_key"]] = entry["row"]
+                else:
+                    requests[entry["key"]] = (result, entry["prompt_key"])
+                    result["pending"] += 1
+
+        chunk = []
+        position = 0
+        for result in self._succeeded(job, assets, requests):
+            del assets[result["asset"]["asset_id"]]
+            position += 1
+            if position <= job.get("written", 0):
+                continue
+            chunk.append(result)
+            if len(chunk) == WRITE_CHUNK_SIZE:
+                self._write_chunk(job, chunk, position, on_progress)
+                chunk = []
+        if chunk:
+            self._write_chunk(job, chunk, position, on_progress)
+
+        # Only the assets that failed are left.
+        if not job.get("dead_lettered"):
+            self._fail(
+                job, [(result["asset"], result["error"]) for result in assets.values()]
+            )
+            job["dead_lettered"] = True
+            if on_progress is not None:
+                on_progress(job)
+        for message in job["shards"]:
+            if self.on_shard_complete is not None:
+                self.on_shard_complete(message, job["requests"])
+            self.stats.completed_shards += 1
+
+    def _succeeded(self, job, assets, requests):
+        """
+        Yields the results of `assets` whose every prompt succeeded.
+
+        Assets with only evaluated prompts come first, then the others as
+        their last answer is read from the job's output files. The output
+        files do not change once a job has ended, so the order is the same
+        when a collection is resumed. Each failed asset's `error` is set.
+        """
+        for result in list(assets.values()):
+            if not result["pending"]:
+                yield result
+        if job["job"] is not None:
+            schemas = {key: schema for key, _, schema in self.analyses}
+            location = self.backend.wait(job["job"])
+            for path in self.backend.output_files(location):
+                for line in self.backend.read_lines(path):
+                    key = request_key(line.get("request", {}))
+                    if key not in requests:
+                        continue
+                    result, prompt_key = requests.pop(key)
+                    result["pending"] -= 1
+                    response = line.get("response") or {}
+                    text = response_text(response)
+                    if line.get("status") or text is None:
+                        result["error"] = line.get("status") or "Empty batch prediction response."
+                        continue
+                    record_usage(prompt_key, response)
+                    analysis_data = parse_model_response(text)
+                    if analysis_data.get("error") == INVALID_JSON_ERROR:
+                        metrics.PARSE_FAILURES.labels(prompt_key).inc()
+                    row, coercion_failures = schemas[prompt_key].project(
+                        result["asset"], analysis_data
+                    )
+                    if coercion_failures:
+                        metrics.COERCION_FAILURES.labels(prompt_key).inc(coercion_failures)
+                    result["rows"][prompt_key] = row
+                    if not result["pending"] and result["error"] is None:
+                        yield result
+        for result, _ in requests.values():
+            result["error"] = result["error"] or "No batch prediction output."
+
+    def _write_chunk(self, job, chunk, written, on_progress):
+        """
+        Writes a chunk of results, then records `written` in the job.
+
+        Rows a results table rejects are written again, with exponential
+        backoff, up to `write_attempts` times; only the assets whose rows
+        are still rejected after that are dead-lettered.
+        """
+        pending = {index: result["rows"] for index, result in enumerate(chunk)}
+        backoff = self.initial_backoff
+        for attempt in range(1, self.write_attempts + 1):
+            indices = list(pending)
+            rejected = {}
+            for key, write_errors in self.write([pending[i] for i in indices]).items():
+                for error in write_errors:
+                    index = indices[error["index"]]
+                    rejected.setdefault(index, {})[key] = f"{key}: {error['errors']}"
+            if not rejected or attempt == self.write_attempts:
+                break
+            metrics.record_retry("batch_write")
+            self.sleep(random.uniform(0, backoff))
+            backoff = min(backoff * 2, self.max_backoff)
+            # Only the rejected prompts are written again.
+            pending = {i: {key: pending[i][key] for key in keys} for i, keys in rejected.items()}
+        self._fail(
+            job,
+            [
+                (chunk[index]["asset"], error)
+                for index, errors in rejected.items()
+                for error in errors.values()
+            ],
+        )
+        succeeded = len(chunk) - len(rejected)
+        self.stats.assets += succeeded
+        if succeeded:
+            metrics.ASSETS.labels("ok").inc(succeeded)
+        job["written"] = written
+        if on_progress is not None:
+            on_progress(job)
+
+    def _fail(self, job, failures):
+        """Counts and dead-letters `(asset, error)` failures of a job."""
+        failed_ids = {asset["asset_id"] for asset, _ in failures}
+        if not failed_ids:
+            return
+        self.stats.failed_assets += len(failed_ids)
+        print(f"{len(failed_ids)} assets of job {job['job']} failed.")
+        if self.dead_letter is None:
+            metrics.ASSETS.labels("failed").inc(len(failed_ids))
+            return
+        self.dead_letter(job["job"], failures)
+        metrics.ASSETS.labels("dead_letter").inc(len(failed_ids))
+
+    def run(self, run_id, messages, jobs=(), save_job=None):
+        """
+        Submits the shards in `messages`, then collects them and the
+        already submitted `jobs`. `save_job(job)` receives each job record
+        when it is submitted and whenever its collection progresses. Returns
+        the run's stats.
+        """
+        start = time.perf_counter()
+        jobs = list(jobs) + self.submit(run_id, messages, on_submitted=save_job)
+        for job in jobs:
+            self.collect(job, on_progress=save_job)
+        print(f"{self.stats} in {time.perf_counter() - start:.2f}s.")
+        return self.stats
+
+
+def run_batch_prediction(
+    resume=False, incremental=INCREMENTAL_MODE, state_file=BATCH_STATE_FILE, backend=None
+):
+    """
+    Starts a batch prediction run, or resumes the one saved in `state_file`.
+
+    A resumed run collects the saved jobs whose shards have no checkpoint,
+    skipping the row chunks they already wrote, and builds new jobs for the
+    shards that were never submitted. Returns
+    the run state and its `BatchStats`.
+    """
+    import main
+    from clients import bigquery_client, storage_client
+    from populate_with_cloud_run import CHECKPOINT_TABLE_ID, get_source_reader, plan_run
+    from stage_store import dead_letter
+
+    if resume:
+        state = load_state(state_file)
+        if not state:
+            raise ValueError(f"No run state found in {state_file}; start a new run instead.")
+        completed = completed_shard_ids(bigquery_client(), CHECKPOINT_TABLE_ID, state["run_id"])
+        jobs = [
+            job
+            for job in state.get("batch_jobs", [])
+            if any(shard_id(message) not in completed for message in job["shards"])
+        ]
+        submitted = {
+            shard_id(message) for job in state.get("batch_jobs", []) for message in job["shards"]
+        }
+        messages = [
+            message
+            for message in pending_shard_messages(state, completed)
+            if shard_id(message) not in submitted
+        ]
+        print(
+            f"Resuming batch run {state['run_id']}: {len(completed)} shards complete, "
+            f"{len(jobs)} jobs to collect, {len(messages)} shards to submit."
+        )
+    else:
+        table_messages, errors = main.create_tables()
+        for line in table_messages:
+            print(line)
+        if errors:
+            raise RuntimeError(f"Error creating tables: {errors}")
+        state = plan_run(uuid.uuid4().hex[:12], incremental=incremental)
+        ensure_checkpoint_table(bigquery_client(), CHECKPOINT_TABLE_ID)
+        save_state(state_file, state)
+        jobs = []
+        messages = build_shard_messages(state)
+
+    if backend is None:
+        backend = make_batch_backend(
+            BATCH_PREDICTION_BACKEND,
+            storage_client() if BATCH_PREDICTION_BACKEND == "vertex" else None,
+        )
+
+    saved_jobs = state.setdefault("batch_jobs", [])
+
+    def save_job(job):
+        # Resumed jobs are the records in `saved_jobs`, updated in place.
+        if not any(saved is job for saved in saved_jobs):
+            saved_jobs.append(job)
+        save_state(state_file, state)
+
+    def checkpoint(message, requests):
+        with metrics.BIGQUERY_INSERT_SECONDS.labels(BIGQUERY_CHECKPOINT_TABLE).time():
+            record_shard_complete(bigquery_client(), CHECKPOINT_TABLE_ID, message, requests)
+
+    runner = BatchPredictionRunner(
+        backend,
+        get_source_reader(),
+        main.get_analyses(),
+        main.write_results,
+        evaluators=main.get_evaluators(),
+        dead_letter=lambda job, failures: dead_letter(
+            bigquery_client(), main.DEAD_LETTER_TABLE_ID, job, 0, failures
+        ),
+        on_shard_complete=checkpoint,
+        select_observations=main.get_observation_selector(),
+    )
+    return state, runner.run(state["run_id"], messages, jobs, save_job)
@@ -0,0 +1,184 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Run state and checkpoints for resumable, incremental populate runs.
+
+The local `STATE_FILE` records how a run was sharded, so the shard messages
+can be rebuilt without re-querying the source. Every shard that the populate
+service finishes is recorded in a checkpoint table; a resumed run republishes
+only the shards that have no checkpoint yet. Incremental runs build their
+snapshot from the source anti-joined against the results tables, so assets
+whose latest detection has already been analyzed by every prompt are skipped.
+"""
+
+import json
+import os
+import time
+
+from google.api_core import exceptions
+from google.cloud import bigquery
+
+from sharding import plan_shard_ranges, shard_message
+
+CHECKPOINT_SCHEMA = [
+    bigquery.SchemaField("run_id", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("shard_id", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("tasks_created", "INTEGER", mode="NULLABLE"),
+    bigquery.SchemaField("completed_at", "TIMESTAMP", mode="NULLABLE"),
+]
+
+COMPLETED_SHARDS_QUERY = """
+SELECT DISTINCT shard_id
+FROM `{checkpoint_table}`
+WHERE run_id = @run_id
+"""
+
+INCREMENTAL_SOURCE_QUERY = """
+SELECT
+  source.*
+FROM (
+{source_query}
+) AS source
+WHERE NOT ({analyzed_conditions})
+"""
+
+ANALYZED_CONDITION = """EXISTS (
+  SELECT 1
+  FROM `{results_table}` AS results
+  WHERE results.asset_id = source.asset_id
+    AND results.detection_time >= source.detection_time
+)"""
+
+
+def load_state(path):
+    """Returns the saved run state, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    """Writes the run state atomically."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def shard_id(data):
+    """Returns a stable identifier for a shard message."""
+    if "snapshot_table" in data:
+        return f"{data['shard_start']}-{data['shard_end']}"
+    return f"offset-{data['offset']}"
+
+
+def build_shard_messages(state):
+    """Rebuilds every shard message of a run from its saved state."""
+    if state["sharding_mode"] == "snapshot":
+        # Runs planned by observation count save their key ranges; older
+        # states and row-sized runs split the key range evenly.
+        ranges = state.get("shard_ranges") or plan_shard_ranges(
+            state["total_rows"], state["shard_size"]
+        )
+        messages = [
+            shard_message(state["task_queue_id"], state["snapshot_table"], start, end)
+            for start, end in ranges
+        ]
+    else:
+        messages = [
+            {
+                "limit": state["shard_size"],
+                "offset": offset,
+                "task_queue_id": state["task_queue_id"],
+            }
+            for offset in range(0, state["total_rows"], state["shard_size"])
+        ]
+    for message in messages:
+        message["run_id"] = state["run_id"]
+    manifest = state.get("manifest")
+    if manifest:
+        # Reference-only runs: each shard has its own manifest.
+        for message, (uri, rows) in zip(messages, manifest["shards"]):
+            message["manifest"] = {"uri": uri, "offset": 0, "rows": rows}
+    return messages
+
+
+def pending_shard_messages(state, completed_shard_ids):
+    """Returns the shard messages of a run that have not been checkpointed."""
+    return [
+        message
+        for message in build_shard_messages(state)
+        if shard_id(message) not in completed_shard_ids
+    ]
+
+
+def ensure_checkpoint_table(bq_client, table_id):
+    """Creates the checkpoint table, clustered by run, if it does not exist."""
+    table = bigquery.Table(table_id, schema=CHECKPOINT_SCHEMA)
+    table.clustering_fields = ["run_id"]
+    bq_client.create_table(table, exists_ok=True)
+
+
+def record_shard_complete(bq_client, table_id, data, tasks_created):
+    """Checkpoints a finished shard. Messages without a run_id are skipped."""
+    if "run_id" not in data:
+        return
+    errors = bq_client.insert_rows_json(
+        table_id,
+        [
+            {
+                "run_id": data["run_id"],
+                "shard_id": shard_id(data),
+                "tasks_created": tasks_created,
+                "completed_at": time.time(),
+            }
+        ],
+    )
+    if errors:
+        print(f"Error recording checkpoint for shard {shard_id(data)}: {errors}")
+
+
+def completed_shard_ids(bq_client, table_id, run_id):
+    """Returns the ids of the shards checkpointed for a run."""
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("run_id", "STRING", run_id)]
+    )
+    rows = bq_client.query(
+        COMPLETED_SHARDS_QUERY.format(checkpoint_table=table_id), job_config=job_config
+    ).result()
+    return {row["shard_id"] for row in rows}
+
+
+def incremental_source_query(bq_client, source_query, results_tables):
+    """
+    Restricts the source query to new or changed assets.
+
+    An asset is skipped when every results table already holds a row for it
+    whose `detection_time` is at least the asset's latest detection. If a
+    results table does not exist yet, every asset is new.
+    """
+    for results_table in results_tables:
+        try:
+            bq_client.get_table(results_table)
+        except exceptions.NotFound:
+            return source_query
+    conditions = "\n  AND ".join(
+        ANALYZED_CONDITION.format(results_table=results_table)
+        for results_table in results_tables
+    )
+    return INCREMENTAL_SOURCE_QUERY.format(
+        source_query=source_query, analyzed_conditions=conditions
+    )
@@ -0,0 +1,129 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Lazily created Google Cloud clients.
+
+Importing the client libraries and building the clients is a large part of
+a Cloud Run cold start, and each service role only needs some of them. Every
+getter here imports its library and builds its client on first use, then
+returns the same instance, so an instance only pays for the clients its role
+touches.
+"""
+
+import functools
+import threading
+
+from config import (
+    GCP_PROJECT,
+    LOCATION,
+    PUBLISH_BATCH_MAX_LATENCY_SECONDS,
+    PUBLISH_BATCH_MAX_MESSAGES,
+)
+
+
+def lazy(factory):
+    """
+    Wraps a zero-argument factory so that it runs once, on first call.
+
+    The getter's `override(value)` replaces the instance (the emulator uses it
+    to install fake clients) and `reset()` makes the next call build a new one.
+    """
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    def override(value):
+        with lock:
+            instance[:] = [value]
+
+    def reset():
+        with lock:
+            del instance[:]
+
+    get.override = override
+    get.reset = reset
+    return get
+
+
+@lazy
+def bigquery_client():
+    from google.cloud import bigquery
+
+    return bigquery.Client(project=GCP_PROJECT)
+
+
+@lazy
+def tasks_client():
+    from google.cloud import tasks_v2
+
+    return tasks_v2.CloudTasksClient()
+
+
+@lazy
+def storage_client():
+    from google.cloud import storage
+
+    return storage.Client(project=GCP_PROJECT)
+
+
+@lazy
+def publisher_client():
+    from google.cloud import pubsub_v1
+
+    return pubsub_v1.PublisherClient(
+        batch_settings=pubsub_v1.types.BatchSettings(
+            max_messages=PUBLISH_BATCH_MAX_MESSAGES,
+            max_latency=PUBLISH_BATCH_MAX_LATENCY_SECONDS,
+        )
+    )
+
+
+@lazy
+def subscriber_client():
+    from google.cloud import pubsub_v1
+
+    return pubsub_v1.SubscriberClient()
+
+
+@lazy
+def vertexai_initialized():
+    import vertexai
+
+    vertexai.init(project=GCP_PROJECT, location=LOCATION)
+    return True
+
+
+class LazyGenerativeModel:
+    """A `GenerativeModel` that imports and initializes Vertex AI on its first call."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._get_model = lazy(self._build)
+
+    def _build(self):
+        vertexai_initialized()
+        from vertexai.generative_models import GenerativeModel
+
+        return GenerativeModel(self.model_name)
+
+    def generate_content(self, *args, **kwargs):
+        return self._get_model().generate_content(*args, **kwargs)
@@ -4,7 +4,8 @@ LOCATION = "us-central1"
 
 import os
 import importlib.util
-from google.cloud import bigquery
+import threading
+from collections.abc import Mapping
 
 # BigQuery Configuration
 BIGQUERY_RESULTS_DATASET = "imagery_insights_analysis"
@@ -18,7 +19,9 @@ SELECT
   t1.location,
   MAX(t1.detection_time) as detection_time,
   ARRAY_AGG(STRUCT(t1.observation_id,
-      t1.gcs_uri)) AS observations
+      t1.gcs_uri,
+      t1.capture_time,
+      t1.camera_pose)) AS observations
 FROM
   `{source_table}` AS t1
 WHERE
@@ -27,52 +30,257 @@ GROUP BY
   t1.asset_id,
   t1.location
 """
-BIGQUERY_COUNT_QUERY = """
-SELECT
-  COUNT(*) as total_rows
-FROM
-  `{source_table}` AS t1
-WHERE
-  t1.asset_type = 'ASSET_CLASS_ROAD_SIGN'
-"""
+
+# Observation Selection
+# Images sent to Gemini per asset. Repeated gcs_uris are always dropped;
+# OBSERVATION_SELECTOR then keeps "all" images, the OBSERVATION_MAX_IMAGES
+# "most_recent" ones by capture_time, or OBSERVATION_MAX_IMAGES spread over
+# camera headings ("heading_diverse", from camera_pose). Fewer images make
+# smaller, faster and cheaper calls, possibly at some cost in accuracy.
+OBSERVATION_SELECTOR = "all"
+OBSERVATION_MAX_IMAGES = None
+
+# Result Sink Configuration
+# "storage_write" buffers result rows per instance and appends them through
+# the BigQuery Storage Write API; "insert_all" streams each task's rows with
+# insert_rows_json. RESULT_SINK_MODE is "committed" or "pending" (every
+# flush is committed atomically before the requests waiting on it return).
+RESULT_SINK = "storage_write"
+RESULT_SINK_MODE = "committed"
+RESULT_SINK_MAX_ROWS = 500
+RESULT_SINK_FLUSH_SECONDS = 1.0
+
+# Gemini Response Cache Configuration
+# "sqlite" keeps a local LRU cache at RESPONSE_CACHE_PATH capped at
+# RESPONSE_CACHE_MAX_BYTES, "bigquery" shares responses through the
+# BIGQUERY_RESPONSE_CACHE_TABLE table, and "none" disables caching. On Cloud
+# Run, /tmp is in memory, so a "sqlite" cache takes up to
+# RESPONSE_CACHE_MAX_BYTES of the container's memory limit and is lost with
+# the instance; the deployed service therefore caches nothing by default.
+# Local runs use LOCAL_RESPONSE_CACHE instead.
+RESPONSE_CACHE = "none"
+LOCAL_RESPONSE_CACHE = "sqlite"
+RESPONSE_CACHE_PATH = "/tmp/gemini_response_cache.sqlite"
+RESPONSE_CACHE_MAX_BYTES = 128 * 1024 * 1024
+BIGQUERY_RESPONSE_CACHE_TABLE = "gemini_response_cache"
+
+# Stage Store Configuration
+# /process saves each task's result rows before writing them, so a retried
+# task skips the Gemini calls and inserts that already succeeded. "sqlite"
+# spools them on the instance's disk at STAGE_STORE_PATH (in memory on Cloud
+# Run; retries that reach another instance start over), "bigquery" shares
+# them through the BIGQUERY_STAGE_TABLE table at the cost of an extra insert
+# per task, and "none" disables staging. Local runs, whose retries all stay
+# on one machine, use LOCAL_STAGE_STORE instead.
+STAGE_STORE = "bigquery"
+LOCAL_STAGE_STORE = "sqlite"
+STAGE_STORE_PATH = "/tmp/task_stages.sqlite"
+BIGQUERY_STAGE_TABLE = "task_stages"
+# Assets that still fail on this retry of their task are written, with their
+# payload and error, to BIGQUERY_DEAD_LETTER_TABLE and are not retried again.
+DEAD_LETTER_AFTER_RETRIES = 5
+BIGQUERY_DEAD_LETTER_TABLE = "process_dead_letters"
 
 # Cloud Tasks Configuration
 TASK_QUEUE_PREFIX = "image-analysis-queue-"
+# Time /setup waits for a new queue to accept tasks.
+TASK_QUEUE_READY_SECONDS = 5
+# Assets per shard when shards are sized by row count (offset sharding, or
+# SHARD_TARGET_OBSERVATIONS = None).
 SHARD_SIZE = 50
+# Snapshot shards are cut so that each holds about this many observations
+# (images), so shards carry similar amounts of model work.
+SHARD_TARGET_OBSERVATIONS = 100
+# Shard messages are published in batches of up to this many messages, or
+# after this many seconds.
+PUBLISH_BATCH_MAX_MESSAGES = 100
+PUBLISH_BATCH_MAX_LATENCY_SECONDS = 0.05
 POPULATE_TOPIC_ID_PREFIX = "populate-tasks-topic-"
 SUBSCRIPTION_ID_PREFIX = "populate-tasks-sub-"
+# Tasks created concurrently per populate instance, and attempts per task
+# before a transient Cloud Tasks error is reported as a failure.
+ENQUEUE_MAX_WORKERS = 32
+ENQUEUE_MAX_ATTEMPTS = 5
+
+# Sharding Configuration
+# "snapshot" materializes the grouped source once per run and shards it by key
+# range; "offset" re-runs the source query with LIMIT/OFFSET for every shard.
+SHARDING_MODE = "snapshot"
+BIGQUERY_SNAPSHOT_TABLE_PREFIX = "source_snapshot_"
+SNAPSHOT_EXPIRATION_DAYS = 7
+
+# Source Reader Configuration
+# "storage" streams snapshot shards as Arrow through the BigQuery Storage Read
+# API, "query" pages the shard query result, and "arrow_file" serves shards
+# from the local file named by SOURCE_ARROW_FILE (useful for offline runs).
+SOURCE_READER = "storage"
+SOURCE_READ_STREAMS = 4
+SOURCE_ARROW_FILE = os.getenv("SOURCE_ARROW_FILE")
+
+# Task Payload Configuration
+# "full" embeds every asset's location, detection time and observations in
+# its Cloud Task. "reference" writes the assets of every shard once to an
+# Arrow manifest under ASSET_MANIFEST_URI (a gs:// prefix), with
+# ASSET_MANIFEST_WRITERS shards written at a time, and each task carries only
+# its shard's manifest URI and a range of its rows. /process keeps the
+# ASSET_MANIFEST_CACHE_SIZE most recently used shard manifests in memory.
+# Reference payloads require SHARDING_MODE = "snapshot".
+TASK_PAYLOAD = "full"
+ASSET_MANIFEST_URI = os.getenv("ASSET_MANIFEST_URI")
+ASSET_MANIFEST_WRITERS = 8
+ASSET_MANIFEST_CACHE_SIZE = 16
 
 # Cloud Run Configuration
 BATCH_SIZE = 100
+# Assets carried by each Cloud Task (1 keeps the single-asset task format),
+# and the number of Gemini calls /process runs concurrently for one task.
+TASK_BATCH_SIZE = 10
+PROCESS_MAX_CONCURRENCY = 10
+# Local record of the current run, used by `populate_with_cloud_run.py --resume`.
 STATE_FILE = "populate_state.json"
+# Shards finished by the populate service are checkpointed in this table.
+BIGQUERY_CHECKPOINT_TABLE = "populate_checkpoints"
+# Only snapshot assets that are new or have newer detections than the results
+# table (also enabled per run with `--incremental`).
+INCREMENTAL_MODE = False
+# Local runs (`python3 src/local_runner.py`) skip Pub/Sub and Cloud Tasks:
+# LOCAL_WORKERS threads or processes ("thread" / "process" executor) take
+# task batches from a shared queue, with at most LOCAL_MAX_IN_FLIGHT batches
+# read ahead of them. Process workers split the GEMINI_*_QPS rates evenly.
+# Workers mostly wait on Gemini and on result sink flushes, so each thread
+# runs one batch (up to PROCESS_MAX_CONCURRENCY calls) at a time.
+LOCAL_EXECUTOR = "thread"
+LOCAL_WORKERS = 32
+LOCAL_MAX_IN_FLIGHT = 64
+LOCAL_STATE_FILE = "local_run_state.json"
+# Delay before a failed local batch is retried, doubled on every attempt.
+LOCAL_RETRY_DELAY_SECONDS = 1.0
+# Batch Prediction Configuration
+# `--backend batch_prediction` processes a run with Gemini batch prediction
+# jobs (batch_prediction.py) instead of Cloud Tasks. "vertex" stores request
+# and output files under BATCH_PREDICTION_URI (a gs:// prefix); "local" is an
+# offline stand-in that answers requests with canned responses in
+# BATCH_PREDICTION_LOCAL_DIR. Each job holds up to
+# BATCH_PREDICTION_MAX_REQUESTS requests (one per asset and prompt). Rows a
+# results table rejects are written again, with backoff, up to
+# BATCH_PREDICTION_WRITE_ATTEMPTS times before their assets are dead-lettered.
+PROCESSING_BACKEND = "cloud_tasks"
+BATCH_PREDICTION_BACKEND = "vertex"
+BATCH_PREDICTION_URI = os.getenv("BATCH_PREDICTION_URI")
+BATCH_PREDICTION_LOCAL_DIR = "/tmp/batch_prediction"
+BATCH_PREDICTION_MAX_REQUESTS = 100000
+BATCH_PREDICTION_POLL_SECONDS = 60
+BATCH_PREDICTION_WRITE_ATTEMPTS = 5
+BATCH_STATE_FILE = "batch_run_state.json"
 SERVICE_URL = "https://analyze-volume-images-635092392839.us-central1.run.app"
 POPULATE_SERVICE_URL = "https://populate-tasks-635092392839.us-central1.run.app"
 SERVICE_ACCOUNT_EMAIL = "635092392839-compute@developer.gserviceaccount.com"
 
 # Gemini Model Configuration
 GEMINI_MODEL = "gemini-2.5-flash"
+# Fraction of raw Gemini responses printed for debugging (1.0 prints every
+# response). Printing each one slows log ingestion under load; responses that
+# fail to parse are always printed.
+RAW_RESPONSE_LOG_RATE = float(os.getenv("RAW_RESPONSE_LOG_RATE", "0"))
+# Client-side rate control per instance: calls per second start at the
+# initial rate, grow additively on success and are multiplied by the decrease
+# factor on throttling (429 / resource exhausted) or calls slower than the
+# latency target. Throttled calls are retried up to GEMINI_MAX_ATTEMPTS times.
+GEMINI_INITIAL_QPS = 5.0
+GEMINI_MIN_QPS = 0.5
+GEMINI_MAX_QPS = 50.0
+GEMINI_QPS_INCREASE = 0.5
+GEMINI_QPS_DECREASE_FACTOR = 0.5
+GEMINI_LATENCY_TARGET_SECONDS = 60.0
+GEMINI_MAX_ATTEMPTS = 5
+
+class PromptRegistry:
+    """
+    Discovers prompt modules by filename and executes each one on first use.
+
+    Only the modules of the prompts a service actually touches are loaded.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.keys = sorted(
+            filename[:-3].upper()
+            for filename in os.listdir(directory)
+            if filename.endswith(".py")
+        )
+        self._modules = {}
+        self._lock = threading.Lock()
+
+    def module(self, key):
+        if key not in self.keys:
+            raise KeyError(key)
+        with self._lock:
+            if key not in self._modules:
+                module_name = key.lower()
+                module_path = os.path.join(self.directory, f"{module_name}.py")
+                spec = importlib.util.spec_from_file_location(module_name, module_path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self._modules[key] = module
+            return self._modules[key]
+
+
+class PromptAttributes(Mapping):
+    """A read-only mapping of prompt keys to one attribute of their modules."""
+
+    def __init__(self, registry, attribute):
+        self.registry = registry
+        self.attribute = attribute
+
+    def __getitem__(self, key):
+        module = self.registry.module(key)
+        if not hasattr(module, self.attribute):
+            raise KeyError(key)
+        return getattr(module, self.attribute)
+
+    def __iter__(self):
+        return (key for key in self.registry.keys if key in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
 
 def load_prompts_from_directory(directory):
-    prompts = {}
-    schemas = {}
-    for filename in os.listdir(directory):
-        if filename.endswith(".py"):
-            module_name = filename[:-3]
-            module_path = os.path.join(directory, filename)
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-            if hasattr(module, "PROMPT"):
-                prompts[module_name.upper()] = module.PROMPT
-            if hasattr(module, "SCHEMA"):
-                schemas[module_name.upper()] = module.SCHEMA
-    return prompts, schemas
+    """Returns lazy PROMPT, SCHEMA and EVALUATOR mappings for a prompts directory."""
+    registry = PromptRegistry(directory)
+    return (
+        PromptAttributes(registry, "PROMPT"),
+        PromptAttributes(registry, "SCHEMA"),
+        PromptAttributes(registry, "EVALUATOR"),
+    )
 
 PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "prompts")
-PROMPTS, BIGQUERY_SCHEMAS = load_prompts_from_directory(PROMPTS_DIR)
+PROMPTS, BIGQUERY_SCHEMAS, EVALUATORS = load_prompts_from_directory(PROMPTS_DIR)
+
+# Use a prompt module's EVALUATOR, when it has one, to compute its fields
+# locally instead of calling Gemini (e.g. RESOLUTION reads JPEG headers).
+LOCAL_EVALUATORS = True
 
 # Change this value to 'ROAD_SIGNS' to use the road signs prompt
 SELECTED_PROMPT_KEY = "RESOLUTION"
 
-# The GEMINI_PROMPT used in the application is now selected dynamically
-GEMINI_PROMPT = PROMPTS[SELECTED_PROMPT_KEY]
\ No newline at end of file
+# Prompts evaluated for every asset in a single pass over the source. With more
+# than one key (e.g. ["RESOLUTION", "ROAD_SIGNS", "UTILITY_POLE"]), each task
+# runs its prompts concurrently over the same images and every prompt writes
+# to its own results table (see results_table_name).
+SELECTED_PROMPT_KEYS = [SELECTED_PROMPT_KEY]
+
+
+def results_table_name(prompt_key):
+    """Returns the name of the results table that a prompt writes to."""
+    if len(SELECTED_PROMPT_KEYS) == 1:
+        return BIGQUERY_RESULTS_TABLE
+    return f"{BIGQUERY_RESULTS_TABLE}_{prompt_key.lower()}"
+
+
+def __getattr__(name):
+    # The GEMINI_PROMPT used in the application is now selected dynamically,
+    # and only loaded when it is first read.
+    if name == "GEMINI_PROMPT":
+        return PROMPTS[SELECTED_PROMPT_KEY]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
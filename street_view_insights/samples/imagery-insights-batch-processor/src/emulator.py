@@ -0,0 +1,811 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+In-process emulator for the whole pipeline.
+
+`Emulator` installs fake clients behind the getters in `clients.py` and runs
+`start_run` -> Pub/Sub push -> `process_shard` -> Cloud Tasks -> `/process`
+without any cloud service:
+
+*   `FakeBigQueryClient` serves a synthetic source table, materializes the
+    snapshot and keeps checkpoint and results rows in memory.
+*   `FakePublisher` pushes every message to the populate app, retrying
+    messages that are not acknowledged.
+*   `FakeTasksClient` dispatches every task to the `/process` endpoint with
+    the Cloud Tasks headers, retrying tasks that fail.
+*   `FakeGeminiModel` answers with JSON matching the response schema after a
+    log-normal latency, and fails or throttles at configurable rates.
+*   `FakeWriteTransport` stands in for the Storage Write API behind the real
+    `BufferedResultWriter`.
+
+The run reports assets per second, task latency percentiles and the time
+spent in each stage (see `benchmarks/pipeline_benchmark.py`).
+"""
+
+import base64
+import collections
+import datetime
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pyarrow as pa
+from google.api_core import exceptions
+from google.cloud.bigquery.table import Row
+
+import clients
+from analysis import task_assets
+from asset_manifest import ManifestCache
+from result_sink import BufferedResultWriter, RowSerializer
+from sharding import SHARD_KEY_COLUMN, is_snapshot_shard
+from source_reader import ArrowFileSourceReader, SourceReader
+from stage_store import SQLiteStageStore
+
+SNAPSHOT_TABLE_PATTERN = re.compile(r"CREATE OR REPLACE TABLE `([^`]+)`")
+
+
+def synthetic_source(num_assets, observations_per_asset=2, seed=0):
+    """Returns a grouped source table like the output of BIGQUERY_SOURCE_QUERY."""
+    rng = random.Random(seed)
+    start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    asset_ids = [f"asset-{i:07d}" for i in range(num_assets)]
+    return pa.table(
+        {
+            "asset_id": asset_ids,
+            "location": [
+                {"latitude": rng.uniform(37.7, 37.8), "longitude": rng.uniform(-122.5, -122.3)}
+                for _ in asset_ids
+            ],
+            "detection_time": pa.array(
+                [start + datetime.timedelta(minutes=rng.randrange(525600)) for _ in asset_ids],
+                type=pa.timestamp("us", tz="UTC"),
+            ),
+            "observations": [
+                [
+                    {
+                        "observation_id": f"{asset_id}-{j}",
+                        "gcs_uri": f"gs://emulated-imagery/{asset_id}/{j}.jpg",
+                        "capture_time": start + datetime.timedelta(days=j),
+                        "camera_pose": {"heading": rng.uniform(0.0, 360.0)},
+                    }
+                    for j in range(observations_per_asset)
+                ]
+                for asset_id in asset_ids
+            ],
+        }
+    )
+
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of `values`, or 0.0 if empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+class StageTimer:
+    """Accumulates the time spent in each pipeline stage across threads."""
+
+    def __init__(self):
+        self.seconds = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.seconds[stage] += seconds
+            self.calls[stage] += 1
+
+    def time(self, stage, function, *args, **kwargs):
+        """Calls `function` and records its duration under `stage`."""
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def stats(self):
+        with self._lock:
+            return {
+                stage: {
+                    "calls": self.calls[stage],
+                    "seconds": round(self.seconds[stage], 3),
+                    "mean_ms": round(1000 * self.seconds[stage] / self.calls[stage], 2),
+                }
+                for stage in self.seconds
+            }
+
+
+class Outstanding:
+    """Counts messages and tasks that have not been delivered yet."""
+
+    def __init__(self):
+        self._count = 0
+        self._condition = threading.Condition()
+
+    def add(self):
+        with self._condition:
+            self._count += 1
+
+    def done(self):
+        with self._condition:
+            self._count -= 1
+            if not self._count:
+                self._condition.notify_all()
+
+    def wait(self, timeout=None):
+        """Waits until everything has been delivered; returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._count, timeout)
+
+
+class FakeQueryJob:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def result(self):
+        return iter(self._rows)
+
+
+class FakeBigQueryClient:
+    """
+    Keeps tables in memory and answers the queries the pipeline runs.
+
+    The source table is a `pyarrow.Table`; the snapshot query numbers its
+    rows by `asset_id` into a new table, and inserted rows are appended to
+    per-table lists.
+    """
+
+    def __init__(self, source, timer=None):
+        self.source = source
+        self.timer = timer or StageTimer()
+        self.tables = {}
+        self.rows = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def create_table(self, table, exists_ok=False):
+        table_id = f"{table.project}.{table.dataset_id}.{table.table_id}"
+        with self._lock:
+            if table_id in self.tables:
+                if exists_ok:
+                    return self.tables[table_id]
+                raise exceptions.Conflict(f"Already Exists: Table {table_id}")
+            self.tables[table_id] = table
+        return table
+
+    def get_table(self, table_id):
+        with self._lock:
+            if table_id not in self.tables:
+                raise exceptions.NotFound(f"Not found: Table {table_id}")
+            table = self.tables[table_id]
+            num_rows = table.num_rows if isinstance(table, pa.Table) else len(self.rows[table_id])
+        return _TableInfo(table_id, num_rows)
+
+    def delete_table(self, table_id, not_found_ok=False):
+        with self._lock:
+            if self.tables.pop(table_id, None) is None and not not_found_ok:
+                raise exceptions.NotFound(f"Not found: Table {table_id}")
+            self.rows.pop(table_id, None)
+
+    def insert_rows_json(self, table_id, rows):
+        with self._lock:
+            self.rows[table_id].extend(rows)
+        return []
+
+    def query(self, query, job_config=None):
+        return self.timer.time("bigquery", self._query, query, job_config)
+
+    def _query(self, query, job_config):
+        snapshot = SNAPSHOT_TABLE_PATTERN.search(query)
+        if snapshot:
+            table = self.source.sort_by("asset_id")
+            table = table.add_column(
+                0, SHARD_KEY_COLUMN, pa.array(range(1, table.num_rows + 1), type=pa.int64())
+            )
+            with self._lock:
+                self.tables[snapshot.group(1)] = table
+            return FakeQueryJob([])
+        if "COUNT(*) AS total_rows" in query:
+            # The synthetic source is already grouped by asset.
+            return FakeQueryJob([Row((self.source.num_rows,), {"total_rows": 0})])
+        if "running_observations" in query:
+            table_id = re.search(r"FROM\s+`([^`]+)`", query).group(1)
+            return FakeQueryJob(self._plan_shards(table_id, job_config.query_parameters[0].value))
+        if "SELECT DISTINCT shard_id" in query:
+            table_id = re.search(r"FROM `([^`]+)`", query).group(1)
+            run_id = job_config.query_parameters[0].value
+            with self._lock:
+                shard_ids = {
+                    row["shard_id"] for row in self.rows[table_id] if row["run_id"] == run_id
+                }
+            return FakeQueryJob([Row((shard_id,), {"shard_id": 0}) for shard_id in shard_ids])
+        raise NotImplementedError(f"The emulator does not support this query:\n{query}")
+
+    def _plan_shards(self, table_id, target_observations):
+        """Computes SHARD_PLAN_QUERY over an in-memory snapshot."""
+        with self._lock:
+            table = self.tables[table_id]
+        keys = table.column(SHARD_KEY_COLUMN).to_pylist()
+        counts = [len(value or []) for value in table.column("observations").to_pylist()]
+        shards = {}
+        running = 0
+        for key, count in sorted(zip(keys, counts)):
+            running += count
+            shard = shards.setdefault(max(running - 1, 0) // target_observations, [key, key, 0, 0])
+            shard[1] = key
+            shard[2] += 1
+            shard[3] += count
+        fields = {"shard_start": 0, "shard_end": 1, "assets": 2, "observations": 3}
+        return [Row(tuple(shard), fields) for _, shard in sorted(shards.items())]
+
+
+class _TableInfo:
+    def __init__(self, table_id, num_rows):
+        self.table_id = table_id
+        self.num_rows = num_rows
+
+
+class FakeSourceReader(SourceReader):
+    """Reads shards from the tables held by a `FakeBigQueryClient`."""
+
+    def __init__(self, bq_client, batch_size=1024):
+        self.bq_client = bq_client
+        self.batch_size = batch_size
+
+    def read_shard(self, data):
+        if is_snapshot_shard(data):
+            table = self.bq_client.tables[data["snapshot_table"]]
+        else:
+            table = self.bq_client.source
+        reader = ArrowFileSourceReader(batch_size=self.batch_size, table=table)
+        yield from reader.read_shard(data)
+
+
+def _post(app, path, body, headers):
+    """POSTs a raw body to a Flask app and returns the status code."""
+    response = app.test_client().post(
+        path, data=body, headers=headers, content_type="application/json"
+    )
+    return response.status_code
+
+
+class FakePublisher:
+    """A Pub/Sub publisher whose topics push every message to a Flask app."""
+
+    def __init__(self, app, outstanding, timer, workers=8, max_attempts=5, retry_delay=0.01):
+        self.app = app
+        self.outstanding = outstanding
+        self.timer = timer
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.topics = set()
+        self.published = 0
+        self.undelivered = 0
+        self._ids = iter(range(1, 2**63))
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pubsub")
+
+    @staticmethod
+    def topic_path(project, topic):
+        return f"projects/{project}/topics/{topic}"
+
+    def create_topic(self, request):
+        self.topics.add(request["name"])
+
+    def publish(self, topic, data):
+        if topic not in self.topics:
+            raise exceptions.NotFound(f"Topic not found: {topic}")
+        with self._lock:
+            self.published += 1
+            message_id = str(next(self._ids))
+        envelope = json.dumps(
+            {
+                "message": {
+                    "data": base64.b64encode(data).decode("utf-8"),
+                    "messageId": message_id,
+                },
+                "subscription": topic.replace("/topics/", "/subscriptions/"),
+            }
+        )
+        self.outstanding.add()
+        self._executor.submit(self._push, envelope)
+        future = Future()
+        future.set_result(message_id)
+        return future
+
+    def _push(self, envelope):
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                status = self.timer.time("populate", _post, self.app, "/", envelope, {})
+                if status < 300:
+                    return
+                time.sleep(self.retry_delay * attempt)
+            with self._lock:
+                self.undelivered += 1
+        finally:
+            self.outstanding.done()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class FakeSubscriber:
+    """Records push subscriptions; delivery is done by `FakePublisher`."""
+
+    def __init__(self):
+        self.subscriptions = {}
+
+    @staticmethod
+    def subscription_path(project, subscription):
+        return f"projects/{project}/subscriptions/{subscription}"
+
+    def create_subscription(self, request):
+        self.subscriptions[request["name"]] = request
+
+
+class FakeTasksClient:
+    """
+    A Cloud Tasks client whose queues dispatch tasks to a Flask app.
+
+    Up to `max_dispatches` tasks run at once. A second task with the name of
+    an existing one is rejected with AlreadyExists. A task that does not return
+    2xx is retried, with `X-CloudTasks-TaskRetryCount` incremented, until
+    `max_attempts` is reached.
+    """
+
+    def __init__(
+        self,
+        app,
+        outstanding,
+        timer,
+        max_dispatches=50,
+        max_attempts=5,
+        retry_delay=0.01,
+        clock=time.perf_counter,
+    ):
+        self.app = app
+        self.outstanding = outstanding
+        self.timer = timer
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self.queues = set()
+        self.created = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+        self.assets = 0
+        self.body_bytes = []
+        self.latencies = []
+        self._names = set()
+        self._ids = iter(range(1, 2**63))
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_dispatches, thread_name_prefix="cloudtasks"
+        )
+
+    @staticmethod
+    def queue_path(project, location, queue):
+        return f"projects/{project}/locations/{location}/queues/{queue}"
+
+    def create_queue(self, parent, queue):
+        self.queues.add(queue["name"])
+
+    def delete_queue(self, name):
+        self.queues.discard(name)
+
+    def create_task(self, parent, task):
+        if parent not in self.queues:
+            raise exceptions.NotFound(f"Queue not found: {parent}")
+        with self._lock:
+            if task.get("name"):
+                if task["name"] in self._names:
+                    raise exceptions.AlreadyExists(f"Task already exists: {task['name']}")
+                self._names.add(task["name"])
+                task_name = task["name"].rsplit("/", 1)[-1]
+            else:
+                task_name = f"{next(self._ids):016d}"
+            self.created += 1
+            self.body_bytes.append(len(task["http_request"]["body"]))
+        self.outstanding.add()
+        self._executor.submit(self._dispatch, parent, task_name, task, self.clock())
+        return {"name": f"{parent}/tasks/{task_name}"}
+
+    def _dispatch(self, parent, task_name, task, created_at):
+        try:
+            http_request = task["http_request"]
+            body = http_request["body"]
+            # Only the endpoint matters; SERVICE_URL is usually unset offline.
+            path = "/" + http_request["url"].rsplit("/", 1)[-1]
+            for attempt in range(self.max_attempts):
+                if attempt:
+                    time.sleep(self.retry_delay * attempt)
+                    with self._lock:
+                        self.retries += 1
+                headers = {
+                    "X-CloudTasks-QueueName": parent.rsplit("/", 1)[-1],
+                    "X-CloudTasks-TaskName": task_name,
+                    "X-CloudTasks-TaskRetryCount": str(attempt),
+                    "X-CloudTasks-TaskExecutionCount": str(attempt),
+                }
+                status = self.timer.time("process", _post, self.app, path, body, headers)
+                if status < 300:
+                    with self._lock:
+                        self.succeeded += 1
+                        data = json.loads(body)
+                        if "manifest" in data:
+                            self.assets += data["manifest"]["rows"]
+                        else:
+                            self.assets += len(task_assets(data))
+                        self.latencies.append(self.clock() - created_at)
+                    return
+            with self._lock:
+                self.failed += 1
+        finally:
+            self.outstanding.done()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeGeminiModel:
+    """
+    Answers `generate_content` with JSON that matches the response schema.
+
+    Call latency is log-normal around `median_latency`; `error_rate` of the
+    calls fail with a server error and `throttle_rate` with a 429.
+    """
+
+    def __init__(
+        self,
+        median_latency=0.5,
+        latency_sigma=0.5,
+        error_rate=0.0,
+        throttle_rate=0.0,
+        seed=0,
+        sleep=time.sleep,
+    ):
+        self.median_latency = median_latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.sleep = sleep
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, generation_config=None):
+        with self._lock:
+            self.calls += 1
+            latency = (
+                self.median_latency * math.exp(self._rng.gauss(0, self.latency_sigma))
+                if self.median_latency
+                else 0.0
+            )
+            outcome = self._rng.random()
+            answer = self._value((generation_config or {}).get("response_schema", {}))
+        self.sleep(latency)
+        if outcome < self.throttle_rate:
+            raise exceptions.ResourceExhausted("Emulated quota exhausted.")
+        if outcome < self.throttle_rate + self.error_rate:
+            raise exceptions.InternalServerError("Emulated model error.")
+        text = json.dumps(answer)
+        # Gemini counts 258 tokens per image and about 4 characters per text token.
+        prompt_tokens = sum(258 if not isinstance(c, str) else len(c) // 4 for c in contents)
+        return FakeResponse(text, FakeUsage(prompt_tokens, len(text) // 4))
+
+    def _value(self, schema):
+        kind = schema.get("type", "OBJECT")
+        if kind == "OBJECT":
+            return {
+                name: self._value(field)
+                for name, field in schema.get("properties", {}).items()
+                if name != "error"
+            }
+        if kind == "ARRAY":
+            return [self._value(schema.get("items", {}))]
+        if kind == "INTEGER":
+            return self._rng.randrange(1, 5000)
+        if kind == "NUMBER":
+            return round(self._rng.random(), 3)
+        if kind == "BOOLEAN":
+            return self._rng.random() < 0.5
+        return "emulated"
+
+
+class FakeWriteTransport:
+    """A Storage Write API stream that keeps appended rows in memory."""
+
+    def __init__(self, schema, timer, append_latency=0.0):
+        self.serializer = RowSerializer(schema)
+        self.timer = timer
+        self.append_latency = append_latency
+        self.appends = 0
+        self.rows = 0
+
+    def append(self, serialized_rows, offset):
+        start = time.perf_counter()
+        if self.append_latency:
+            time.sleep(self.append_latency)
+        self.appends += 1
+        self.rows += len(serialized_rows)
+        self.timer.record("write", time.perf_counter() - start)
+        return {}
+
+    def commit(self):
+        return False
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Emulator:
+    """
+    Runs the pipeline end to end against fake services.
+
+    `source` is a grouped source table (see `synthetic_source`) and `gemini`
+    a `FakeGeminiModel`. The module-level state of `main` and
+    `populate_with_cloud_run` is patched for the duration of `run` (or
+    `run_local`), which can be called once per emulator. With `warm`, the libraries `/process`
+    imports lazily are loaded before the clock starts. `task_payload` is
+    "full" or "reference" (tasks resolved from a manifest in a temporary
+    directory), as TASK_PAYLOAD.
+    """
+
+    def __init__(
+        self,
+        source,
+        gemini=None,
+        rate_limiter=None,
+        max_dispatches=50,
+        max_attempts=5,
+        sink_flush_seconds=None,
+        append_latency=0.0,
+        response_cache=None,
+        warm=True,
+        task_payload="full",
+    ):
+        import main
+        import populate_with_cloud_run
+
+        self.main = main
+        self.populate = populate_with_cloud_run
+        self.timer = StageTimer()
+        self.outstanding = Outstanding()
+        self.gemini = gemini or FakeGeminiModel()
+        self.rate_limiter = rate_limiter or main.make_rate_limiter()
+        self.bq_client = FakeBigQueryClient(source, self.timer)
+        self.tasks_client = FakeTasksClient(
+            main.app,
+            self.outstanding,
+            self.timer,
+            max_dispatches=max_dispatches,
+            max_attempts=max_attempts,
+        )
+        self.publisher = FakePublisher(populate_with_cloud_run.app, self.outstanding, self.timer)
+        self.subscriber = FakeSubscriber()
+        self.sink_flush_seconds = (
+            main.RESULT_SINK_FLUSH_SECONDS if sink_flush_seconds is None else sink_flush_seconds
+        )
+        self.append_latency = append_latency
+        self.response_cache = response_cache
+        self.warm = warm
+        self.task_payload = task_payload
+        self.transports = {}
+
+    def _result_sinks(self):
+        sinks = {}
+        for key in self.main.SELECTED_PROMPT_KEYS:
+            transport = FakeWriteTransport(
+                self.main.BIGQUERY_SCHEMAS[key], self.timer, self.append_latency
+            )
+            self.transports[key] = transport
+            sinks[key] = BufferedResultWriter(
+                transport,
+                max_rows=self.main.RESULT_SINK_MAX_ROWS,
+                flush_interval=self.sink_flush_seconds,
+            )
+        return sinks
+
+    def _install(self):
+        main, populate = self.main, self.populate
+        self._saved = {
+            "model": main.model,
+            "rate_limiter": main.rate_limiter,
+            "TASK_QUEUE_READY_SECONDS": main.TASK_QUEUE_READY_SECONDS,
+        }
+        self._saved_populate = {
+            "TASK_PAYLOAD": populate.TASK_PAYLOAD,
+            "ASSET_MANIFEST_URI": populate.ASSET_MANIFEST_URI,
+        }
+        populate.TASK_PAYLOAD = self.task_payload
+        timed_gemini = _TimedModel(self.gemini, self.timer)
+        main.rate_limiter = self.rate_limiter
+        main.model = main.RateLimitedModel(
+            timed_gemini, self.rate_limiter, max_attempts=main.GEMINI_MAX_ATTEMPTS
+        )
+        main.TASK_QUEUE_READY_SECONDS = 0
+        self._overridden = {
+            clients.bigquery_client: self.bq_client,
+            clients.tasks_client: self.tasks_client,
+            clients.publisher_client: self.publisher,
+            clients.subscriber_client: self.subscriber,
+            populate.get_source_reader: FakeSourceReader(self.bq_client),
+            populate.get_enqueuer: populate.TaskEnqueuer(
+                self.tasks_client, max_workers=populate.ENQUEUE_MAX_WORKERS
+            ),
+            main.get_result_sinks: self._result_sinks(),
+            main.get_response_cache: self.response_cache,
+            main.get_stage_store: SQLiteStageStore(":memory:"),
+            # Every prompt goes to the emulated model, including local evaluators.
+            main.get_evaluators: {},
+            # Manifests are local files, opened in place.
+            main.get_manifests: ManifestCache(clients.storage_client),
+        }
+        for getter, value in self._overridden.items():
+            getter.override(value)
+
+    def _restore(self):
+        for getter in self._overridden:
+            getter.reset()
+        for name, value in self._saved.items():
+            setattr(self.main, name, value)
+        for name, value in self._saved_populate.items():
+            setattr(self.populate, name, value)
+
+    def run(self, timeout=None):
+        """Runs one populate run to completion and returns its report."""
+        self._install()
+        try:
+            self._warm()
+            start = time.perf_counter()
+            response = self.timer.time("setup", self.main.app.test_client().post, "/setup")
+            if response.status_code != 200:
+                raise RuntimeError(f"/setup failed: {response.get_json()}")
+            task_queue_id = response.get_json()["task_queue_id"]
+            with tempfile.TemporaryDirectory() as directory:
+                # Reference tasks read the manifest until the run is over.
+                self.populate.ASSET_MANIFEST_URI = os.path.join(directory, "manifests")
+                state = self.timer.time(
+                    "shard",
+                    self.populate.start_run,
+                    task_queue_id,
+                    incremental=False,
+                    state_file=os.path.join(directory, "state.json"),
+                )
+                if not self.outstanding.wait(timeout):
+                    raise TimeoutError(f"The emulated run did not finish within {timeout}s.")
+            elapsed = time.perf_counter() - start
+            for sink in self.main.get_result_sinks().values():
+                sink.close()
+            return self.report(state, elapsed)
+        finally:
+            self.publisher.shutdown()
+            self.tasks_client.shutdown()
+            self._restore()
+
+    def run_local(self, workers=32, max_in_flight=64):
+        """
+        Runs the same source through `local_runner` instead of Pub/Sub and
+        Cloud Tasks, with thread workers, and returns a comparable report.
+        """
+        import local_runner
+
+        self._install()
+        retry_delay = local_runner.LOCAL_RETRY_DELAY_SECONDS
+        # Retry right away, like the emulated task queue.
+        local_runner.LOCAL_RETRY_DELAY_SECONDS = 0.0
+        try:
+            self._warm()
+            start = time.perf_counter()
+            with tempfile.TemporaryDirectory() as directory:
+                state, stats = self.timer.time(
+                    "local",
+                    local_runner.run_local,
+                    state_file=os.path.join(directory, "state.json"),
+                    workers=workers,
+                    max_in_flight=max_in_flight,
+                    executor="thread",
+                )
+            elapsed = time.perf_counter() - start
+            for sink in self.main.get_result_sinks().values():
+                sink.close()
+            assets = sum(stats.assets.values())
+            return {
+                "assets": assets,
+                "source_rows": state["total_rows"],
+                "shards": stats.shards,
+                "completed_shards": stats.completed_shards,
+                "tasks": stats.tasks,
+                "failed_tasks": stats.failed_tasks,
+                "task_retries": stats.retries,
+                "rows_written": {key: t.rows for key, t in self.transports.items()},
+                "gemini_calls": self.gemini.calls,
+                "elapsed_seconds": round(elapsed, 3),
+                "assets_per_second": round(assets / elapsed, 2) if elapsed else 0.0,
+                "task_latency_p50_ms": round(1000 * percentile(stats.latencies, 0.5), 1),
+                "task_latency_p99_ms": round(1000 * percentile(stats.latencies, 0.99), 1),
+                "stages": self.timer.stats(),
+                "rate_limiter": self.rate_limiter.stats(),
+            }
+        finally:
+            local_runner.LOCAL_RETRY_DELAY_SECONDS = retry_delay
+            self.publisher.shutdown()
+            self.tasks_client.shutdown()
+            self._restore()
+
+    def _warm(self):
+        if self.warm:
+            # Load what /process imports on first use, so the run measures
+            # steady-state throughput (see startup_benchmark.py for cold starts).
+            from vertexai.generative_models import Part  # noqa: F401
+
+            self.main.get_analyses()
+
+    def report(self, state, elapsed):
+        tasks = self.tasks_client
+        latencies = tasks.latencies
+        return {
+            "assets": tasks.assets,
+            "source_rows": state["total_rows"],
+            "shards": self.publisher.published,
+            "undelivered_shards": self.publisher.undelivered,
+            "tasks": tasks.created,
+            "failed_tasks": tasks.failed,
+            "task_retries": tasks.retries,
+            "rows_written": {key: t.rows for key, t in self.transports.items()},
+            "gemini_calls": self.gemini.calls,
+            "elapsed_seconds": round(elapsed, 3),
+            "assets_per_second": round(tasks.assets / elapsed, 2) if elapsed else 0.0,
+            "task_latency_p50_ms": round(1000 * percentile(latencies, 0.5), 1),
+            "task_latency_p99_ms": round(1000 * percentile(latencies, 0.99), 1),
+            "task_body_bytes_p50": percentile(tasks.body_bytes, 0.5),
+            "task_body_bytes_max": max(tasks.body_bytes, default=0),
+            "stages": self.timer.stats(),
+            "rate_limiter": self.rate_limiter.stats(),
+        }
+
+
+class _TimedModel:
+    """Records the duration of every model call under the `gemini` stage."""
+
+    def __init__(self, model, timer):
+        self.model = model
+        self.timer = timer
+
+    def generate_content(self, *args, **kwargs):
+        return self.timer.time("gemini", self.model.generate_content, *args, **kwargs)
@@ -0,0 +1,209 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Concurrent Cloud Tasks enqueuer for the populate path.
+
+A single `CloudTasksClient` (and therefore a single gRPC channel) is shared
+by a bounded thread pool. Transient errors are retried with exponential
+backoff and jitter, and every call reports its enqueue throughput. Tasks are
+named after their batch, so a create that is retried after an ambiguous
+failure, or a shard that is enqueued again, does not create a second task.
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.api_core import exceptions
+from google.cloud import tasks_v2
+
+import metrics
+
+TRANSIENT_ERRORS = (
+    exceptions.Aborted,
+    exceptions.DeadlineExceeded,
+    exceptions.InternalServerError,
+    exceptions.ResourceExhausted,
+    exceptions.ServiceUnavailable,
+    exceptions.TooManyRequests,
+)
+
+
+def task_id(payload):
+    """
+    Returns the Cloud Tasks task id of a task body.
+
+    Asset batches are identified by their sorted asset ids and manifest
+    references by their URI and row range. Shards are sorted by asset_id
+    before they are batched (see `source_reader.sort_shard`), so a shard that
+    is read again yields the same batches and therefore the same names. The id is a hash, which spreads task names over the queue's
+    key space as Cloud Tasks recommends.
+    """
+    if "manifest" in payload:
+        key = json.dumps(payload["manifest"], sort_keys=True)
+    else:
+        assets = payload.get("assets", [payload])
+        key = "\n".join(sorted(str(asset.get("asset_id")) for asset in assets))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def build_task(payload, service_url, service_account_email, parent=None):
+    """
+    Builds the Cloud Task that POSTs a payload to the `/process` endpoint.
+
+    With the queue path `parent`, the task is named `task_id(payload)` so that
+    Cloud Tasks rejects a second task for the same batch. Queues are created
+    per run, so the names of different runs never collide.
+    """
+    task = {
+        "http_request": {
+            "http_method": tasks_v2.HttpMethod.POST,
+            "url": f"{service_url}/process",
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps(payload).encode(),
+            "oidc_token": {"service_account_email": service_account_email},
+        }
+    }
+    if parent:
+        task["name"] = f"{parent}/tasks/{task_id(payload)}"
+    return task
+
+
+def batch_payloads(payloads, batch_size):
+    """
+    Groups asset payloads into task bodies of up to `batch_size` assets.
+
+    Batches use the `{"assets": [...]}` format; a `batch_size` of 1 keeps
+    the single-asset task body.
+    """
+    if batch_size <= 1:
+        yield from payloads
+        return
+    batch = []
+    for payload in payloads:
+        batch.append(payload)
+        if len(batch) == batch_size:
+            yield {"assets": batch}
+            batch = []
+    if batch:
+        yield {"assets": batch}
+
+
+class EnqueueStats:
+    """Counters for a single `TaskEnqueuer.enqueue` call."""
+
+    def __init__(self):
+        self.created = 0
+        self.existing = 0
+        self.failed = 0
+        self.retries = 0
+        self.elapsed = 0.0
+        self.errors = []
+
+    @property
+    def tasks_per_second(self):
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"Enqueued {self.created} tasks in {self.elapsed:.2f}s "
+            f"({self.tasks_per_second:.1f} tasks/s, {self.retries} retries, "
+            f"{self.existing} already existed, {self.failed} failed)"
+        )
+
+
+class TaskEnqueuer:
+    """Creates Cloud Tasks concurrently through a shared client and thread pool."""
+
+    def __init__(
+        self,
+        tasks_client,
+        max_workers=32,
+        max_attempts=5,
+        initial_backoff=0.25,
+        max_backoff=8.0,
+        sleep=time.sleep,
+    ):
+        self.tasks_client = tasks_client
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="enqueue"
+        )
+
+    def enqueue(self, parent, tasks):
+        """
+        Creates every task in `tasks` under the queue `parent`.
+
+        `tasks` may be any iterable; at most twice the pool size is in flight
+        at once, so large shards are never fully materialized. A named task
+        that already exists counts as created (and in `existing`): it was
+        created by an earlier attempt. Tasks that still fail after
+        `max_attempts` are counted in the returned stats.
+        """
+        stats = EnqueueStats()
+        lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(2 * self.max_workers)
+        futures = []
+        start = time.perf_counter()
+
+        def create(task):
+            try:
+                retries, existed, error = self._create_with_retry(parent, task)
+                with lock:
+                    stats.retries += retries
+                    if error is None:
+                        stats.created += 1
+                        stats.existing += existed
+                    else:
+                        stats.failed += 1
+                        stats.errors.append(str(error))
+            finally:
+                in_flight.release()
+
+        for task in tasks:
+            in_flight.acquire()
+            futures.append(self._executor.submit(create, task))
+        for future in futures:
+            future.result()
+
+        stats.elapsed = time.perf_counter() - start
+        print(stats)
+        return stats
+
+    def _create_with_retry(self, parent, task):
+        """Returns (retries, existed, error) where error is None on success."""
+        backoff = self.initial_backoff
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with metrics.TASK_ENQUEUE_SECONDS.time():
+                    self.tasks_client.create_task(parent=parent, task=task)
+                return attempt - 1, False, None
+            except exceptions.AlreadyExists:
+                return attempt - 1, True, None
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_attempts:
+                    return attempt - 1, False, e
+                metrics.record_retry("enqueue")
+                self.sleep(random.uniform(0, backoff))
+                backoff = min(backoff * 2, self.max_backoff)
+            except Exception as e:
+                return attempt - 1, False, e
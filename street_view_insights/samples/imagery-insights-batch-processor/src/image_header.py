@@ -0,0 +1,117 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+JPEG header parsing with ranged object reads.
+
+The pixel dimensions of a JPEG are stored in its start-of-frame (SOF)
+segment, which follows the APPn/DQT/DHT segments near the start of the
+file. `HeaderReader` fetches only the first few KB of an object and grows
+the range until the SOF segment is found, so the image data itself is
+never downloaded.
+"""
+
+import struct
+
+from google.api_core import exceptions
+
+# SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC) which share the range.
+SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers that stand alone without a length field.
+STANDALONE_MARKERS = frozenset(range(0xD0, 0xD8)) | {0x01}
+SOS_MARKER = 0xDA
+
+
+class IncompleteHeader(ValueError):
+    """Raised when the SOF segment lies beyond the bytes that were read."""
+
+    def __init__(self, needed):
+        super().__init__(f"JPEG header continues past byte {needed}.")
+        self.needed = needed
+
+
+def jpeg_dimensions(data):
+    """
+    Returns `(width, height)` from the SOF segment of a JPEG prefix.
+
+    Raises IncompleteHeader with the number of bytes required when `data`
+    ends before the SOF segment, and ValueError when it is not a JPEG.
+    """
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("Not a JPEG file.")
+    position = 2
+    while True:
+        # Skip fill bytes between segments.
+        while position < len(data) and data[position] == 0xFF:
+            position += 1
+        if position >= len(data):
+            raise IncompleteHeader(position + 4)
+        if data[position - 1] != 0xFF:
+            raise ValueError(f"Invalid JPEG marker at byte {position}.")
+        marker = data[position]
+        position += 1
+        if marker in STANDALONE_MARKERS:
+            continue
+        if marker == SOS_MARKER:
+            raise ValueError("JPEG has no frame header before its scan data.")
+        if position + 2 > len(data):
+            raise IncompleteHeader(position + 2)
+        (length,) = struct.unpack(">H", data[position : position + 2])
+        if marker in SOF_MARKERS:
+            # Length, sample precision, height, width.
+            if position + 7 > len(data):
+                raise IncompleteHeader(position + 7)
+            height, width = struct.unpack(">HH", data[position + 3 : position + 7])
+            return width, height
+        position += length
+
+
+class HeaderReader:
+    """Reads image headers from GCS with ranged downloads."""
+
+    def __init__(self, storage_client, initial_bytes=4096, max_bytes=1024 * 1024):
+        self.storage_client = storage_client
+        self.initial_bytes = initial_bytes
+        self.max_bytes = max_bytes
+
+    def read_range(self, gcs_uri, start, end):
+        """Returns bytes `start` to `end` (exclusive) of a `gs://` object."""
+        bucket_name, _, blob_name = gcs_uri[len("gs://") :].partition("/")
+        blob = self.storage_client.bucket(bucket_name).blob(blob_name)
+        try:
+            # `end` is inclusive for download_as_bytes.
+            return blob.download_as_bytes(start=start, end=end - 1)
+        except exceptions.RequestRangeNotSatisfiable:
+            # `start` is past the end of the object.
+            return b""
+
+    def jpeg_dimensions(self, gcs_uri):
+        """Returns `(width, height)` of a JPEG object, reading only its header."""
+        data = self.read_range(gcs_uri, 0, self.initial_bytes)
+        while True:
+            try:
+                return jpeg_dimensions(data)
+            except IncompleteHeader as e:
+                requested = len(data)
+                if requested >= self.max_bytes:
+                    raise ValueError(
+                        f"No JPEG frame header in the first {self.max_bytes} bytes of {gcs_uri}."
+                    ) from e
+                # Fetch the missing segment plus another block, so that the
+                # small segments that usually follow it do not cost a read each.
+                end = min(e.needed + self.initial_bytes, self.max_bytes)
+                more = self.read_range(gcs_uri, requested, end)
+                if not more:
+                    raise ValueError(f"Truncated JPEG header in {gcs_uri}.") from e
+                data += more
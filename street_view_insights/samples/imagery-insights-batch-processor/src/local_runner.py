@@ -0,0 +1,400 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Runs the pipeline on a single machine, without Pub/Sub or Cloud Tasks.
+
+The run is planned like a Cloud Tasks run (`plan_run`). Every shard is then
+read with the configured source reader and cut into task batches, which a
+pool of workers takes from one shared queue: a worker that finishes early
+takes the next batch, so a slow batch never holds up the others. At most
+LOCAL_MAX_IN_FLIGHT batches are queued ahead of the workers, so the source
+is streamed rather than loaded. Each batch goes through
+`main.process_assets`, the body of `/process`, with the same prompts,
+schemas, result sinks and dead-lettering; the response cache and stage store
+are the LOCAL_RESPONSE_CACHE and LOCAL_STAGE_STORE backends on this machine. Failed assets are
+retried with the attempt as their retry count, as Cloud Tasks would.
+
+Finished shards are checkpointed in BIGQUERY_CHECKPOINT_TABLE and the run
+state is saved to LOCAL_STATE_FILE, so `--resume` only processes the
+shards that did not finish.
+
+    python3 src/local_runner.py --workers 16
+    python3 src/local_runner.py --executor process --workers 4
+    python3 src/local_runner.py --resume
+"""
+
+import argparse
+import collections
+import functools
+import hashlib
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import metrics
+from analysis import task_assets
+from checkpoint import (
+    build_shard_messages,
+    completed_shard_ids,
+    ensure_checkpoint_table,
+    load_state,
+    pending_shard_messages,
+    record_shard_complete,
+    save_state,
+    shard_id,
+)
+from config import (
+    BIGQUERY_CHECKPOINT_TABLE,
+    DEAD_LETTER_AFTER_RETRIES,
+    INCREMENTAL_MODE,
+    LOCAL_EXECUTOR,
+    LOCAL_MAX_IN_FLIGHT,
+    LOCAL_RESPONSE_CACHE,
+    LOCAL_RETRY_DELAY_SECONDS,
+    LOCAL_STAGE_STORE,
+    LOCAL_STATE_FILE,
+    LOCAL_WORKERS,
+    TASK_BATCH_SIZE,
+)
+from enqueuer import batch_payloads
+from source_reader import build_task_payloads, sort_shard
+
+
+def task_name(run_id, message, body):
+    """
+    Names a task batch for the stage store.
+
+    The name depends on the batch's assets rather than on its position in
+    the shard, since shard reads do not return rows in a fixed order.
+    """
+    asset_ids = sorted(str(asset.get("asset_id")) for asset in task_assets(body))
+    digest = hashlib.sha1("\n".join(asset_ids).encode("utf-8")).hexdigest()[:16]
+    return f"local-{run_id}/{shard_id(message)}/{digest}"
+
+
+def process_task(name, body, resumed=False):
+    """
+    Runs a task batch through `main.process_assets`, retrying failed assets.
+
+    Assets that still fail after DEAD_LETTER_AFTER_RETRIES retries are
+    dead-lettered by `process_assets`. With `resumed`, stages saved by an
+    earlier run are loaded on the first attempt. Returns a summary with the
+    count of every outcome status, the retries and the elapsed seconds.
+    """
+    import main
+
+    start = time.perf_counter()
+    assets = task_assets(body)
+    statuses = collections.Counter()
+    delay = LOCAL_RETRY_DELAY_SECONDS
+    retry_count = 0
+    while True:
+        outcomes = main.process_assets(
+            assets, name, retry_count, load_stages=resumed or retry_count > 0
+        )
+        failed = [asset for asset, outcome in zip(assets, outcomes) if outcome["status"] == "error"]
+        for outcome in outcomes:
+            if outcome["status"] != "error" or retry_count >= DEAD_LETTER_AFTER_RETRIES:
+                statuses[outcome["status"]] += 1
+        if not failed or retry_count >= DEAD_LETTER_AFTER_RETRIES:
+            break
+        assets = failed
+        retry_count += 1
+        metrics.record_retry("task")
+        time.sleep(delay)
+        delay *= 2
+    return {
+        "statuses": dict(statuses),
+        "retries": retry_count,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def use_local_stores():
+    """Keeps the response cache and stage records on this machine (LOCAL_* settings)."""
+    import main
+
+    main.get_response_cache.override(main.open_response_cache(LOCAL_RESPONSE_CACHE))
+    main.get_stage_store.override(main.open_stage_store(LOCAL_STAGE_STORE))
+
+
+def _init_process(workers):
+    """Gives every worker process an equal share of the Gemini rate."""
+    import main
+
+    use_local_stores()
+    main.rate_limiter = main.make_rate_limiter(share=1.0 / workers)
+    main.model = main.make_model(main.rate_limiter)
+
+
+class RunStats:
+    """Counters for a `LocalRunner.run` call."""
+
+    def __init__(self):
+        self.shards = 0
+        self.completed_shards = 0
+        self.tasks = 0
+        self.failed_tasks = 0
+        self.retries = 0
+        self.assets = collections.Counter()
+        self.latencies = []
+        self.elapsed = 0.0
+
+    @property
+    def assets_per_second(self):
+        return sum(self.assets.values()) / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"Processed {sum(self.assets.values())} assets {dict(self.assets)} in "
+            f"{self.elapsed:.2f}s ({self.assets_per_second:.1f} assets/s): "
+            f"{self.completed_shards} of {self.shards} shards complete, "
+            f"{self.tasks} tasks ({self.failed_tasks} failed, {self.retries} retries)"
+        )
+
+
+class _Shard:
+    def __init__(self, message):
+        self.message = message
+        self.pending = 0
+        self.tasks = 0
+        self.failed = 0
+        self.read = False
+        self.finished = False
+
+
+class LocalRunner:
+    """
+    Streams shards into a bounded pool of `process_task` workers.
+
+    `on_shard_complete(message, tasks)` is called once every batch of a
+    shard has finished without failed assets; shards with failures are
+    left for a resumed run. `task` runs one batch and must be picklable
+    with the `process` executor.
+    """
+
+    def __init__(
+        self,
+        reader,
+        run_id,
+        workers=LOCAL_WORKERS,
+        max_in_flight=LOCAL_MAX_IN_FLIGHT,
+        executor=LOCAL_EXECUTOR,
+        batch_size=TASK_BATCH_SIZE,
+        on_shard_complete=None,
+        resumed=False,
+        task=process_task,
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor: {executor}")
+        self.reader = reader
+        self.run_id = run_id
+        self.workers = workers
+        self.max_in_flight = max(max_in_flight, workers)
+        self.executor = executor
+        self.batch_size = batch_size
+        self.on_shard_complete = on_shard_complete
+        self.resumed = resumed
+        self.task = task
+        self._lock = threading.Lock()
+
+    def _make_pool(self):
+        if self.executor == "process":
+            # Worker processes build their own clients; spawn them rather than
+            # fork a process whose client threads are already running.
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process,
+                initargs=(self.workers,),
+            )
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="local")
+
+    def run(self, messages):
+        """Processes every shard message and returns the run's stats."""
+        stats = RunStats()
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        start = time.perf_counter()
+        pool = self._make_pool()
+        try:
+            for message in messages:
+                stats.shards += 1
+                shard = _Shard(message)
+                try:
+                    batches = sort_shard(
+                        metrics.timed_batches(
+                            self.reader.read_shard(message),
+                            metrics.BIGQUERY_QUERY_SECONDS.labels("shard_read"),
+                        )
+                    )
+                    payloads = (
+                        payload for batch in batches for payload in build_task_payloads(batch)
+                    )
+                    for body in batch_payloads(payloads, self.batch_size):
+                        in_flight.acquire()
+                        with self._lock:
+                            shard.pending += 1
+                            shard.tasks += 1
+                        future = pool.submit(
+                            self.task, task_name(self.run_id, message, body), body, self.resumed
+                        )
+                        future.add_done_callback(
+                            functools.partial(self._task_done, stats, shard, in_flight)
+                        )
+                except Exception as e:
+                    print(f"Error reading shard {shard_id(message)}: {e}")
+                    with self._lock:
+                        shard.failed += 1
+                with self._lock:
+                    shard.read = True
+                    finished = self._finish(shard)
+                if finished:
+                    self._shard_done(stats, shard)
+        finally:
+            pool.shutdown(wait=True)
+        stats.elapsed = time.perf_counter() - start
+        print(stats)
+        return stats
+
+    def _task_done(self, stats, shard, in_flight, future):
+        in_flight.release()
+        try:
+            summary = future.result()
+            error = None
+        except Exception as e:
+            summary = None
+            error = e
+        with self._lock:
+            stats.tasks += 1
+            shard.pending -= 1
+            if summary is None:
+                stats.failed_tasks += 1
+                shard.failed += 1
+            else:
+                stats.retries += summary["retries"]
+                stats.latencies.append(summary["seconds"])
+                stats.assets.update(summary["statuses"])
+                if summary["statuses"].get("error"):
+                    stats.failed_tasks += 1
+                    shard.failed += 1
+            finished = self._finish(shard)
+        if error is not None:
+            print(f"Error processing a batch of shard {shard_id(shard.message)}: {error}")
+        if finished:
+            self._shard_done(stats, shard)
+
+    @staticmethod
+    def _finish(shard):
+        """Marks a fully read shard with no pending batches as finished, once."""
+        if shard.read and not shard.pending and not shard.finished:
+            shard.finished = True
+            return True
+        return False
+
+    def _shard_done(self, stats, shard):
+        if shard.failed:
+            print(f"Shard {shard_id(shard.message)} had {shard.failed} failed batches.")
+            return
+        if self.on_shard_complete is not None:
+            try:
+                self.on_shard_complete(shard.message, shard.tasks)
+            except Exception as e:
+                print(f"Error checkpointing shard {shard_id(shard.message)}: {e}")
+                return
+        with self._lock:
+            stats.completed_shards += 1
+
+
+def run_local(
+    resume=False,
+    incremental=INCREMENTAL_MODE,
+    state_file=LOCAL_STATE_FILE,
+    workers=LOCAL_WORKERS,
+    max_in_flight=LOCAL_MAX_IN_FLIGHT,
+    executor=LOCAL_EXECUTOR,
+):
+    """
+    Starts a local run, or resumes the one saved in `state_file`.
+
+    Returns the run state and its `RunStats`.
+    """
+    import main
+    from clients import bigquery_client
+    from populate_with_cloud_run import CHECKPOINT_TABLE_ID, get_source_reader, plan_run
+
+    if resume:
+        state = load_state(state_file)
+        if not state:
+            raise ValueError(f"No run state found in {state_file}; start a new run instead.")
+        completed = completed_shard_ids(bigquery_client(), CHECKPOINT_TABLE_ID, state["run_id"])
+        messages = pending_shard_messages(state, completed)
+        print(
+            f"Resuming local run {state['run_id']}: {len(completed)} shards complete, "
+            f"{len(messages)} remaining."
+        )
+    else:
+        table_messages, errors = main.create_tables()
+        for line in table_messages:
+            print(line)
+        if errors:
+            raise RuntimeError(f"Error creating tables: {errors}")
+        state = plan_run(uuid.uuid4().hex[:12], incremental=incremental)
+        ensure_checkpoint_table(bigquery_client(), CHECKPOINT_TABLE_ID)
+        save_state(state_file, state)
+        messages = build_shard_messages(state)
+
+    def checkpoint(message, tasks):
+        with metrics.BIGQUERY_INSERT_SECONDS.labels(BIGQUERY_CHECKPOINT_TABLE).time():
+            record_shard_complete(bigquery_client(), CHECKPOINT_TABLE_ID, message, tasks)
+
+    runner = LocalRunner(
+        get_source_reader(),
+        state["run_id"],
+        workers=workers,
+        max_in_flight=max_in_flight,
+        executor=executor,
+        on_shard_complete=checkpoint,
+        resumed=resume,
+    )
+    return state, runner.run(messages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline on this machine.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=f"Process the unfinished shards of the run saved in {LOCAL_STATE_FILE}.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=INCREMENTAL_MODE,
+        help="Only process assets that are new or changed since the last run.",
+    )
+    parser.add_argument("--workers", type=int, default=LOCAL_WORKERS)
+    parser.add_argument("--max-in-flight", type=int, default=LOCAL_MAX_IN_FLIGHT)
+    parser.add_argument("--executor", choices=["thread", "process"], default=LOCAL_EXECUTOR)
+    args = parser.parse_args()
+    use_local_stores()
+    run_local(
+        resume=args.resume,
+        incremental=args.incremental,
+        workers=args.workers,
+        max_in_flight=args.max_in_flight,
+        executor=args.executor,
+    )
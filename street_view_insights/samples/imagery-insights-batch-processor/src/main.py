@@ -13,68 +13,268 @@
 # limitations under the License.
 
 
-import json
+import atexit
+import functools
+import threading
 import time
 import uuid
-from flask import Flask, request, jsonify
-from google.cloud import bigquery, tasks_v2
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify
 from google.api_core import exceptions
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part
 from config import (
     GCP_PROJECT,
     LOCATION,
     BIGQUERY_RESULTS_DATASET,
-    BIGQUERY_RESULTS_TABLE,
     BIGQUERY_SOURCE_DATASET,
     BIGQUERY_SOURCE_TABLE,
     TASK_QUEUE_PREFIX,
+    TASK_QUEUE_READY_SECONDS,
     GEMINI_MODEL,
     BIGQUERY_SCHEMAS,
+    EVALUATORS,
+    LOCAL_EVALUATORS,
     PROMPTS,
-    SELECTED_PROMPT_KEY,
+    SELECTED_PROMPT_KEYS,
+    results_table_name,
     SERVICE_URL,
     SERVICE_ACCOUNT_EMAIL,
     BIGQUERY_SOURCE_QUERY,
     BATCH_SIZE,
+    SOURCE_READER,
+    SOURCE_READ_STREAMS,
+    SOURCE_ARROW_FILE,
+    ENQUEUE_MAX_WORKERS,
+    ENQUEUE_MAX_ATTEMPTS,
+    TASK_BATCH_SIZE,
+    PROCESS_MAX_CONCURRENCY,
+    OBSERVATION_SELECTOR,
+    OBSERVATION_MAX_IMAGES,
+    ASSET_MANIFEST_CACHE_SIZE,
+    RESULT_SINK,
+    RESULT_SINK_MODE,
+    RESULT_SINK_MAX_ROWS,
+    RESULT_SINK_FLUSH_SECONDS,
+    RESPONSE_CACHE,
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_MAX_BYTES,
+    BIGQUERY_RESPONSE_CACHE_TABLE,
+    STAGE_STORE,
+    STAGE_STORE_PATH,
+    BIGQUERY_STAGE_TABLE,
+    BIGQUERY_DEAD_LETTER_TABLE,
+    DEAD_LETTER_AFTER_RETRIES,
+    GEMINI_INITIAL_QPS,
+    GEMINI_MIN_QPS,
+    GEMINI_MAX_QPS,
+    GEMINI_QPS_INCREASE,
+    GEMINI_QPS_DECREASE_FACTOR,
+    GEMINI_LATENCY_TARGET_SECONDS,
+    GEMINI_MAX_ATTEMPTS,
 )
+import metrics
+from analysis import task_assets, analyze_asset_prompts, run_batch
+from clients import lazy, LazyGenerativeModel, bigquery_client, storage_client, tasks_client
+from rate_limiter import AdaptiveRateLimiter, RateLimitedModel
+from schema_compiler import ParseStats, compile_schema
 
 app = Flask(__name__)
 
-# Initialize clients
-bq_client = bigquery.Client(project=GCP_PROJECT)
-tasks_client = tasks_v2.CloudTasksClient()
-vertexai.init(project=GCP_PROJECT, location=LOCATION)
-model = GenerativeModel(GEMINI_MODEL)
+# Clients and helpers are built on first use by the endpoints that need them
+# (see clients.py), so a cold start only pays for what the instance's role
+# uses: /process never creates the Cloud Tasks client or the source reader,
+# and /populate never imports Vertex AI.
+def make_rate_limiter(share=1.0):
+    """
+    Builds the Gemini rate limiter from the configured rates.
+
+    `share` scales the rates for processes that split one quota between
+    them (see local_runner.py).
+    """
+    return AdaptiveRateLimiter(
+        initial_rate=GEMINI_INITIAL_QPS * share,
+        min_rate=GEMINI_MIN_QPS * share,
+        max_rate=GEMINI_MAX_QPS * share,
+        additive_increase=GEMINI_QPS_INCREASE * share,
+        decrease_factor=GEMINI_QPS_DECREASE_FACTOR,
+        latency_target=GEMINI_LATENCY_TARGET_SECONDS,
+    )
+
+
+def make_model(limiter):
+    """Wraps the Gemini model so that its calls go through `limiter`."""
+    return RateLimitedModel(
+        LazyGenerativeModel(GEMINI_MODEL), limiter, max_attempts=GEMINI_MAX_ATTEMPTS
+    )
+
+
+rate_limiter = make_rate_limiter()
+# All Gemini calls on this instance share one rate limiter.
+model = make_model(rate_limiter)
+parse_stats = ParseStats()
+metrics.Gauge(
+    "imagery_gemini_rate_limit",
+    "Gemini calls per second currently allowed by the rate limiter.",
+    lambda: rate_limiter.current_rate,
+)
+metrics.Gauge(
+    "imagery_gemini_queue_depth",
+    "Gemini calls waiting for the rate limiter.",
+    lambda: rate_limiter.queue_depth,
+)
+
+
+def results_table_id(prompt_key):
+    return f"{GCP_PROJECT}.{BIGQUERY_RESULTS_DATASET}.{results_table_name(prompt_key)}"
+
+
+DEAD_LETTER_TABLE_ID = f"{GCP_PROJECT}.{BIGQUERY_RESULTS_DATASET}.{BIGQUERY_DEAD_LETTER_TABLE}"
+
+
+@lazy
+def get_source_reader():
+    from source_reader import make_source_reader
+
+    return make_source_reader(
+        SOURCE_READER,
+        bigquery_client(),
+        BIGQUERY_SOURCE_QUERY.format(
+            source_table=f"{GCP_PROJECT}.{BIGQUERY_SOURCE_DATASET}.{BIGQUERY_SOURCE_TABLE}"
+        ),
+        GCP_PROJECT,
+        max_streams=SOURCE_READ_STREAMS,
+        path=SOURCE_ARROW_FILE,
+    )
+
+
+@lazy
+def get_enqueuer():
+    from enqueuer import TaskEnqueuer
+
+    return TaskEnqueuer(
+        tasks_client(), max_workers=ENQUEUE_MAX_WORKERS, max_attempts=ENQUEUE_MAX_ATTEMPTS
+    )
+
+
+@lazy
+def get_analyses():
+    """The (prompt key, prompt, compiled schema) analyses run for every asset."""
+    return [
+        (key, PROMPTS[key], compile_schema(BIGQUERY_SCHEMAS[key]))
+        for key in SELECTED_PROMPT_KEYS
+    ]
+
+
+@lazy
+def get_evaluators():
+    """Prompts whose fields are computed locally, with ranged reads of the images."""
+    keys = [key for key in SELECTED_PROMPT_KEYS if LOCAL_EVALUATORS and key in EVALUATORS]
+    if not keys:
+        return {}
+    from image_header import HeaderReader
+
+    header_reader = HeaderReader(storage_client())
+    return {
+        key: functools.partial(EVALUATORS[key], header_reader=header_reader)
+        for key in keys
+    }
+
+
+@lazy
+def get_manifests():
+    """Run manifests that reference-only tasks are resolved from."""
+    from asset_manifest import ManifestCache
+
+    return ManifestCache(storage_client, ASSET_MANIFEST_CACHE_SIZE)
+
+
+def resolve_task_assets(data):
+    """Returns the assets of a task body, reading them from the run's manifest if needed."""
+    if "manifest" in data:
+        return get_manifests().task_assets(data)
+    return task_assets(data)
+
+
+@lazy
+def get_observation_selector():
+    """Chooses the images of each asset that are sent to Gemini."""
+    from observation_selector import ObservationSelector
+
+    return ObservationSelector(OBSERVATION_SELECTOR, OBSERVATION_MAX_IMAGES)
+
+
+@lazy
+def get_result_sinks():
+    from result_sink import make_result_sink
+
+    result_sinks = {
+        key: make_result_sink(
+            RESULT_SINK,
+            bigquery_client() if RESULT_SINK == "insert_all" else None,
+            results_table_id(key),
+            BIGQUERY_SCHEMAS[key],
+            mode=RESULT_SINK_MODE,
+            max_rows=RESULT_SINK_MAX_ROWS,
+            flush_interval=RESULT_SINK_FLUSH_SECONDS,
+        )
+        for key in SELECTED_PROMPT_KEYS
+    }
+    # Flush buffered rows when the instance shuts down.
+    for result_sink in result_sinks.values():
+        atexit.register(result_sink.close)
+    return result_sinks
+
+
+def open_response_cache(kind):
+    """Builds a response cache of the given kind with the configured settings."""
+    from response_cache import make_response_cache
+
+    return make_response_cache(
+        kind,
+        GEMINI_MODEL,
+        path=RESPONSE_CACHE_PATH,
+        max_bytes=RESPONSE_CACHE_MAX_BYTES,
+        bq_client=bigquery_client() if kind == "bigquery" else None,
+        table_id=f"{GCP_PROJECT}.{BIGQUERY_RESULTS_DATASET}.{BIGQUERY_RESPONSE_CACHE_TABLE}",
+    )
+
+
+def open_stage_store(kind):
+    """Builds a stage store of the given kind with the configured settings."""
+    from stage_store import make_stage_store
+
+    return make_stage_store(
+        kind,
+        path=STAGE_STORE_PATH,
+        bq_client=bigquery_client() if kind == "bigquery" else None,
+        table_id=f"{GCP_PROJECT}.{BIGQUERY_RESULTS_DATASET}.{BIGQUERY_STAGE_TABLE}",
+    )
+
+
+@lazy
+def get_response_cache():
+    return open_response_cache(RESPONSE_CACHE)
+
+
+@lazy
+def get_stage_store():
+    return open_stage_store(STAGE_STORE)
 
 
 @app.route("/setup", methods=["POST"])
 def setup():
     """Creates the BigQuery results table and a new Cloud Tasks queue."""
-    messages = []
-    errors = []
-    task_queue_id = f"{TASK_QUEUE_PREFIX}{uuid.uuid4()}"
+    from google.cloud import tasks_v2
 
-    # Create BigQuery table
-    try:
-        schema = BIGQUERY_SCHEMAS[SELECTED_PROMPT_KEY]
-        table_id = f"{GCP_PROJECT}.{BIGQUERY_RESULTS_DATASET}.{BIGQUERY_RESULTS_TABLE}"
-        table = bigquery.Table(table_id, schema=schema)
-        bq_client.create_table(table)
-        messages.append("BigQuery table created.")
-    except exceptions.Conflict:
-        messages.append("BigQuery table already exists.")
-    except Exception as e:
-        print(f"Error creating BigQuery table: {e}")
-        errors.append(f"Error creating BigQuery table: {e}")
+    task_queue_id = f"{TASK_QUEUE_PREFIX}{uuid.uuid4()}"
+    messages, errors = create_tables()
 
     # Create Cloud Tasks queue
     try:
         parent = tasks_v2.CloudTasksClient.common_location_path(GCP_PROJECT, LOCATION)
-        queue = {"name": tasks_client.queue_path(GCP_PROJECT, LOCATION, task_queue_id)}
-        tasks_client.create_queue(parent=parent, queue=queue)
+        queue = {"name": tasks_client().queue_path(GCP_PROJECT, LOCATION, task_queue_id)}
+        tasks_client().create_queue(parent=parent, queue=queue)
         messages.append(f"Cloud Tasks queue '{task_queue_id}' created.")
-        time.sleep(5)
+        time.sleep(TASK_QUEUE_READY_SECONDS)
     except exceptions.Conflict:
         messages.append(f"Cloud Tasks queue '{task_queue_id}' already exists.")
     except Exception as e:
@@ -87,51 +287,100 @@ def setup():
         return jsonify({"messages": messages, "task_queue_id": task_queue_id}), 200
 
 
+def create_tables():
+    """
+    Creates the results, response cache, dead-letter and stage tables.
+
+    Returns `(messages, errors)`.
+    """
+    from google.cloud import bigquery
+    from stage_store import ensure_dead_letter_table
+
+    messages = []
+    errors = []
+
+    # Create a BigQuery table for each prompt
+    for key in SELECTED_PROMPT_KEYS:
+        table_name = results_table_name(key)
+        try:
+            table = bigquery.Table(results_table_id(key), schema=BIGQUERY_SCHEMAS[key])
+            bigquery_client().create_table(table)
+            messages.append(f"BigQuery table '{table_name}' created.")
+        except exceptions.Conflict:
+            messages.append(f"BigQuery table '{table_name}' already exists.")
+        except Exception as e:
+            print(f"Error creating BigQuery table {table_name}: {e}")
+            errors.append(f"Error creating BigQuery table {table_name}: {e}")
+
+    # Create the shared response cache table (local runs may use another backend)
+    if hasattr(get_response_cache(), "create_table"):
+        try:
+            get_response_cache().create_table()
+            messages.append("Response cache table ready.")
+        except Exception as e:
+            print(f"Error creating response cache table: {e}")
+            errors.append(f"Error creating response cache table: {e}")
+
+    # Create the dead-letter table and the shared stage table
+    try:
+        ensure_dead_letter_table(bigquery_client(), DEAD_LETTER_TABLE_ID)
+        if hasattr(get_stage_store(), "create_table"):
+            get_stage_store().create_table()
+        messages.append("Dead-letter and stage tables ready.")
+    except Exception as e:
+        print(f"Error creating dead-letter or stage table: {e}")
+        errors.append(f"Error creating dead-letter or stage table: {e}")
+    return messages, errors
+
+
 @app.route("/populate", methods=["POST"])
 def populate_tasks():
     """Reads a source BigQuery table and creates a task for each row."""
+    from enqueuer import build_task, batch_payloads
+    from source_reader import build_task_payloads, sort_shard
+
     data = request.get_json()
     task_queue_id = data.get("task_queue_id")
     if not task_queue_id:
         return jsonify({"error": "task_queue_id not provided."}), 400
 
     try:
-        source_table_id = f"{GCP_PROJECT}.{BIGQUERY_SOURCE_DATASET}.{BIGQUERY_SOURCE_TABLE}"
         offset = data.get("offset", 0)
-        query = BIGQUERY_SOURCE_QUERY.format(source_table=source_table_id) + f" LIMIT {BATCH_SIZE} OFFSET {offset}"
-        rows = bq_client.query(query).result()
-        tasks_created = 0
-
-        for row in rows:
-            payload = {
-                "asset_id": row["asset_id"],
-                "location": str(row["location"]),
-                "observations": [
-                    {"observation_id": o["observation_id"], "gcs_uri": o["gcs_uri"]}
-                    for o in row["observations"]
-                ],
+        if data.get("snapshot_table"):
+            shard = {
+                "snapshot_table": data["snapshot_table"],
+                "shard_start": offset + 1,
+                "shard_end": offset + BATCH_SIZE,
             }
-            task = {
-                "http_request": {
-                    "http_method": tasks_v2.HttpMethod.POST,
-                    "url": f"{SERVICE_URL}/process",
-                    "headers": {"Content-Type": "application/json"},
-                    "body": json.dumps(payload).encode(),
-                    "oidc_token": {
-                        "service_account_email": SERVICE_ACCOUNT_EMAIL
-                    },
-                }
-            }
-            parent = tasks_client.queue_path(
-                GCP_PROJECT, LOCATION, task_queue_id
+        else:
+            shard = {"limit": BATCH_SIZE, "offset": offset}
+        parent = tasks_client().queue_path(GCP_PROJECT, LOCATION, task_queue_id)
+        batches = sort_shard(
+            metrics.timed_batches(
+                get_source_reader().read_shard(shard),
+                metrics.BIGQUERY_QUERY_SECONDS.labels("shard_read"),
             )
-            tasks_client.create_task(parent=parent, task=task)
-            tasks_created += 1
+        )
+        payloads = (payload for batch in batches for payload in build_task_payloads(batch))
+        tasks = (
+            build_task(body, SERVICE_URL, SERVICE_ACCOUNT_EMAIL, parent)
+            for body in batch_payloads(payloads, TASK_BATCH_SIZE)
+        )
+        stats = get_enqueuer().enqueue(parent, tasks)
+        if stats.failed:
+            return jsonify(
+                {
+                    "error": f"Failed to create {stats.failed} tasks.",
+                    "tasks_created": stats.created,
+                    "errors": stats.errors[:10],
+                }
+            ), 500
 
         return jsonify(
             {
-                "message": f"Successfully created {tasks_created} tasks.",
-                "tasks_created": tasks_created,
+                "message": f"Successfully created {stats.created} tasks.",
+                "tasks_created": stats.created,
+                "tasks_per_second": round(stats.tasks_per_second, 1),
             }
         ), 202
     except Exception as e:
@@ -140,57 +389,217 @@ def populate_tasks():
 
 @app.route("/process", methods=["POST"])
 def process_image():
-    """Processes a single image analysis task."""
+    """
+    Processes an image analysis task for one asset or a batch of assets.
+
+    Result rows are saved to the stage store before they are written, so a
+    retry of the task (same `X-CloudTasks-TaskName`) only re-analyzes the
+    prompts that failed and only writes the rows that were not written.
+    Assets that still fail after DEAD_LETTER_AFTER_RETRIES retries are
+    written to the dead-letter table and the task is acknowledged.
+    """
     data = request.get_json()
     if not data:
         print("Error: Received empty request body.")
         return "Error: Empty request body.", 400
+    retry_count = int(request.headers.get("X-CloudTasks-TaskRetryCount", 0))
+    if retry_count:
+        metrics.record_retry("task")
 
+    task_name = None
+    if request.headers.get("X-CloudTasks-TaskName"):
+        task_name = "/".join(
+            (
+                request.headers.get("X-CloudTasks-QueueName", ""),
+                request.headers["X-CloudTasks-TaskName"],
+            )
+        )
     try:
-        asset_id = data.get("asset_id")
-        location = data.get("location")
-        detection_time = data.get("detection_time")
-        observations = data.get("observations", [])
-        print(f"Processing task for asset_id: {asset_id}")
-
-        image_parts = [
-            Part.from_uri(o["gcs_uri"], mime_type="image/jpeg") for o in observations
+        assets = resolve_task_assets(data)
+    except Exception as e:
+        print(f"Error resolving task assets: {e}")
+        return "Error resolving task assets.", 500
+    outcomes = process_assets(assets, task_name, retry_count)
+    failed = any(outcome["status"] == "error" for outcome in outcomes)
+    if "assets" not in data and "manifest" not in data:
+        if failed:
+            return "Error processing image.", 500
+        return "Processing complete.", 200
+
+    # A failed batch is retried by Cloud Tasks; the body reports each asset.
+    return jsonify({"results": outcomes}), 500 if failed else 200
+
+
+def process_assets(assets, task_name=None, retry_count=0, load_stages=None):
+    """
+    Analyzes assets and writes their rows; the body of `/process`.
+
+    `task_name` identifies the task across retries for the stage store
+    (without one, nothing is staged). Stages are loaded on retries, or
+    whenever `load_stages` is set. Returns one outcome per asset (see
+    `run_batch`), with status `ok`, `error` or `dead_letter`.
+    """
+    from stage_store import ANALYZED, dead_letter
+
+    stage_store = get_stage_store() if task_name else None
+    if load_stages is None:
+        load_stages = bool(retry_count)
+    staged = {}
+    if stage_store is not None and load_stages:
+        try:
+            staged = stage_store.load(task_name)
+        except Exception as e:
+            print(f"Error loading stages of task {task_name}: {e}")
+
+    analyses = get_analyses()
+    response_cache = get_response_cache()
+    evaluators = get_evaluators()
+    select_observations = get_observation_selector()
+    # The assets of a task run concurrently and so do the prompts of each
+    # asset; one semaphore keeps the task's Gemini calls within the limit.
+    call_slots = threading.BoundedSemaphore(PROCESS_MAX_CONCURRENCY)
+
+    def handle(asset):
+        """Returns the asset's rows that still have to be written."""
+        stages = staged.get(asset.get("asset_id"), {})
+        rows = {key: row for key, (stage, row) in stages.items() if stage == ANALYZED}
+        pending = [analysis for analysis in analyses if analysis[0] not in stages]
+        if pending:
+            rows.update(
+                analyze_asset_prompts(
+                    model,
+                    select_observations(asset),
+                    pending,
+                    cache=response_cache,
+                    evaluators=evaluators,
+                    parse_stats=parse_stats,
+                    call_slots=call_slots,
+                )
+            )
+        return rows
+
+    outcomes = run_batch(assets, handle, PROCESS_MAX_CONCURRENCY)
+
+    analyzed = [outcome for outcome in outcomes if outcome["status"] == "ok"]
+    written = []
+    if analyzed:
+        results = [outcome.pop("result") for outcome in analyzed]
+        if stage_store is not None:
+            new_rows = [
+                (outcome["asset_id"], key, row)
+                for outcome, result in zip(analyzed, results)
+                for key, row in result.items()
+                if key not in staged.get(outcome["asset_id"], {})
+            ]
+            try:
+                stage_store.save_analyzed(task_name, new_rows)
+            except Exception as e:
+                print(f"Error saving stages of task {task_name}: {e}")
+        failed_keys = set()
+        for key, errors in write_results(results).items():
+            for error in errors:
+                outcome = analyzed[error["index"]]
+                outcome["status"] = "error"
+                outcome["error"] = f"BigQuery insert errors: {error['errors']}"
+                failed_keys.add((error["index"], key))
+                print(f"Error processing {outcome['asset_id']} ({key}): {outcome['error']}")
+        written = [
+            (outcome["asset_id"], key)
+            for index, (outcome, result) in enumerate(zip(analyzed, results))
+            for key in result
+            if (index, key) not in failed_keys
         ]
-        gemini_prompt = PROMPTS[SELECTED_PROMPT_KEY]
-        response = model.generate_content([*image_parts, gemini_prompt])
 
-        print(f"Raw Gemini response for {asset_id}: {response.text}")
+    failures = [
+        (asset, outcome)
+        for asset, outcome in zip(assets, outcomes)
+        if outcome["status"] == "error"
+    ]
+    if failures and retry_count >= DEAD_LETTER_AFTER_RETRIES:
         try:
-            # The response text may be enclosed in ```json ... ```, so we clean it up
-            cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-            analysis_data = json.loads(cleaned_response)
-        except json.JSONDecodeError:
-            analysis_data = {"error": "Invalid JSON response from model."}
-
-        # Dynamically build the result dictionary based on the selected schema
-        result = {
-            "asset_id": asset_id,
-            "location": location,
-            "detection_time": detection_time,
-            "observation_ids": [o["observation_id"] for o in observations],
-            "gcs_uris": [o["gcs_uri"] for o in observations],
-        }
-        # Get the schema fields, skipping the base fields that are already added
-        schema_fields = [field.name for field in BIGQUERY_SCHEMAS[SELECTED_PROMPT_KEY]]
-        dynamic_fields = [field for field in schema_fields if field not in result]
-
-        for field in dynamic_fields:
-            result[field] = analysis_data.get(field)
-        table_id = f"{GCP_PROJECT}.{BIGQUERY_RESULTS_DATASET}.{BIGQUERY_RESULTS_TABLE}"
-        errors = bq_client.insert_rows_json(table_id, [result])
-        if errors:
-            raise Exception(f"BigQuery insert errors: {errors}")
+            dead_letter(
+                bigquery_client(),
+                DEAD_LETTER_TABLE_ID,
+                task_name,
+                retry_count,
+                [(asset, outcome["error"]) for asset, outcome in failures],
+            )
+            for asset, outcome in failures:
+                outcome["status"] = "dead_letter"
+                print(f"Dead-lettered {outcome['asset_id']} after {retry_count} retries.")
+        except Exception as e:
+            print(f"Error dead-lettering task {task_name}: {e}")
 
-        return "Processing complete.", 200
-    except Exception as e:
-        asset_id = data.get("asset_id") if data else "unknown"
-        print(f"Error processing {asset_id}: {e}")
-        return "Error processing image.", 500
+    for outcome in outcomes:
+        metrics.ASSETS.labels(outcome["status"]).inc()
+    failed = any(outcome["status"] == "error" for outcome in outcomes)
+    if stage_store is not None:
+        try:
+            if failed:
+                # The task will be retried: remember which rows are written.
+                stage_store.mark_written(task_name, written)
+            else:
+                stage_store.clear(task_name)
+        except Exception as e:
+            print(f"Error saving stages of task {task_name}: {e}")
+    return outcomes
+
+
+def write_results(results):
+    """
+    Writes each prompt's rows to its results table.
+
+    `results` holds one `{prompt_key: row}` dict per asset, which may lack
+    the prompts whose rows are already written. Returns the insert errors of
+    every prompt, indexed like `results`.
+    """
+
+    result_sinks = get_result_sinks()
+
+    def write(key):
+        indices = [i for i, result in enumerate(results) if key in result]
+        if not indices:
+            return []
+        rows = [results[i][key] for i in indices]
+        try:
+            with metrics.BIGQUERY_INSERT_SECONDS.labels(results_table_name(key)).time():
+                errors = result_sinks[key].write(rows)
+        except Exception as e:
+            errors = [{"index": i, "errors": [str(e)]} for i in range(len(rows))]
+        return [{**error, "index": indices[error["index"]]} for error in errors]
+
+    if len(result_sinks) == 1:
+        return {key: write(key) for key in result_sinks}
+    # Buffered sinks block until their rows are flushed, so wait on all at once.
+    with ThreadPoolExecutor(max_workers=len(result_sinks)) as executor:
+        return dict(zip(result_sinks, executor.map(write, result_sinks)))
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Returns this instance's metrics in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/cache", methods=["GET"])
+def cache_stats():
+    """Returns the response cache hit and miss counters for this instance."""
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **response_cache.stats()}), 200
+
+
+@app.route("/parsing", methods=["GET"])
+def parsing_stats():
+    """Returns how many Gemini responses on this instance failed to parse."""
+    return jsonify(parse_stats.stats()), 200
+
+
+@app.route("/ratelimit", methods=["GET"])
+def rate_limit_stats():
+    """Returns the current Gemini call rate and queue depth for this instance."""
+    return jsonify(rate_limiter.stats()), 200
 
 
 @app.route("/teardown", methods=["GET"])
@@ -202,13 +611,13 @@ def teardown():
         if not task_queue_id:
             return jsonify({"error": "task_queue_id not provided."}), 400
         
-        # Delete BigQuery table
-        table_id = f"{GCP_PROJECT}.{BIGQUERY_RESULTS_DATASET}.{BIGQUERY_RESULTS_TABLE}"
-        bq_client.delete_table(table_id, not_found_ok=True)
+        # Delete the BigQuery table of each prompt
+        for key in SELECTED_PROMPT_KEYS:
+            bigquery_client().delete_table(results_table_id(key), not_found_ok=True)
 
         # Delete Cloud Tasks queue
-        name = tasks_client.queue_path(GCP_PROJECT, LOCATION, task_queue_id)
-        tasks_client.delete_queue(name=name)
+        name = tasks_client().queue_path(GCP_PROJECT, LOCATION, task_queue_id)
+        tasks_client().delete_queue(name=name)
 
         return jsonify({"message": "Teardown complete."}), 200
     except exceptions.NotFound:
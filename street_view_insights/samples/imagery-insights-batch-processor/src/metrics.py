@@ -0,0 +1,324 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+In-process metrics served in the Prometheus text format.
+
+Both services run a single gunicorn worker, so one registry per process
+holds everything an instance has measured; `/metrics` renders it. Counters
+and histograms are plain locked arrays, cheap enough to update on every
+asset. The pipeline's metrics are defined at the bottom of this module.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import math
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+
+def _escape_help(text):
+    return str(text).replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape(value):
+    return _escape_help(value).replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _LabeledMetric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        """Returns the child for a set of label values, in `labelnames` order."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}.")
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_LabeledMetric):
+    """A monotonically increasing count."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in self._items()
+        ]
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Returns a context manager that observes the duration of its block."""
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Histogram(_LabeledMetric):
+    """Counts observations in cumulative buckets, with their sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self):
+        lines = []
+        for values, child in self._items():
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """A value read from a function each time the metrics are rendered."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, function, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        if registry is not None:
+            registry.register(self)
+
+    def samples(self):
+        return [f"{self.name} {_format_value(self.function())}"]
+
+
+def timed_batches(batches, histogram):
+    """
+    Yields from `batches`, observing the total time spent waiting on it.
+
+    Used for source reads that are interleaved with enqueueing, so that only
+    the reader's share of a shard is measured.
+    """
+    iterator = iter(batches)
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield batch
+    finally:
+        histogram.observe(elapsed)
+
+
+# Pipeline metrics.
+BIGQUERY_QUERY_SECONDS = Histogram(
+    "imagery_bigquery_query_seconds",
+    "Time spent reading source shards and running BigQuery queries.",
+    ["query"],
+)
+BIGQUERY_INSERT_SECONDS = Histogram(
+    "imagery_bigquery_insert_seconds",
+    "Time to write rows to a BigQuery table, per request.",
+    ["table"],
+)
+TASK_ENQUEUE_SECONDS = Histogram(
+    "imagery_task_enqueue_seconds",
+    "Latency of each Cloud Tasks create_task call.",
+)
+GEMINI_LATENCY_SECONDS = Histogram(
+    "imagery_gemini_latency_seconds",
+    "Gemini call latency per prompt, including rate limiter waits and throttle retries.",
+    ["prompt_key"],
+)
+GEMINI_TOKENS = Histogram(
+    "imagery_gemini_tokens",
+    "Tokens per Gemini call, by prompt and kind (prompt or response).",
+    ["prompt_key", "kind"],
+    buckets=TOKEN_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "imagery_response_cache_requests_total",
+    "Response cache lookups by prompt and result (hit or miss).",
+    ["prompt_key", "result"],
+)
+PARSE_FAILURES = Counter(
+    "imagery_parse_failures_total",
+    "Gemini responses that were not valid JSON, by prompt.",
+    ["prompt_key"],
+)
+COERCION_FAILURES = Counter(
+    "imagery_coercion_failures_total",
+    "Response values that did not fit their column type, by prompt.",
+    ["prompt_key"],
+)
+RETRIES = Counter(
+    "imagery_retries_total",
+    "Retries by stage: gemini (throttled calls, per prompt key), enqueue (create_task), task (Cloud Tasks redeliveries) and batch_write (rejected batch prediction rows).",
+    ["stage", "prompt_key"],
+)
+ASSETS = Counter(
+    "imagery_assets_total",
+    "Assets handled by /process, by outcome.",
+    ["status"],
+)
+OBSERVATIONS = Counter(
+    "imagery_observations_total",
+    "Observations of analyzed assets, by selection result (selected, duplicate or dropped).",
+    ["result"],
+)
+
+_PROMPT_KEY = contextvars.ContextVar("prompt_key", default="")
+
+
+@contextlib.contextmanager
+def prompt_scope(prompt_key):
+    """Attributes the retries recorded in its block to `prompt_key`."""
+    token = _PROMPT_KEY.set(prompt_key)
+    try:
+        yield
+    finally:
+        _PROMPT_KEY.reset(token)
+
+
+def record_retry(stage):
+    """Counts a retry of `stage`, for the prompt key of the enclosing `prompt_scope`."""
+    RETRIES.labels(stage, _PROMPT_KEY.get()).inc()
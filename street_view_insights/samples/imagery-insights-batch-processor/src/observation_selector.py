@@ -0,0 +1,146 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Chooses which of an asset's observations are sent to Gemini.
+
+Every observation is one image part of the request, so assets seen dozens of
+times make large, slow and token-heavy calls. A selector drops repeated
+`gcs_uri`s and then keeps at most `max_images` observations:
+
+- "all" keeps every distinct image.
+- "most_recent" keeps the most recently captured ones.
+- "heading_diverse" spreads the kept images over the camera headings, so the
+  asset is seen from as many sides as possible. Observations without a
+  heading fill any remaining slots by recency.
+
+Observations may carry `capture_time` (an ISO 8601 string) and `heading`
+(degrees, from `camera_pose`); see `source_reader.build_task_payloads`.
+Observations without a capture time sort after those with one, in their
+original order.
+"""
+
+import threading
+
+import metrics
+
+STRATEGIES = ("all", "most_recent", "heading_diverse")
+
+
+def _by_recency(observations):
+    """Returns the observations, most recently captured first."""
+    with_time = [o for o in observations if o.get("capture_time")]
+    without_time = [o for o in observations if not o.get("capture_time")]
+    with_time.sort(key=lambda o: o["capture_time"], reverse=True)
+    return with_time + without_time
+
+
+def _angle_between(a, b):
+    difference = abs(a - b) % 360.0
+    return min(difference, 360.0 - difference)
+
+
+def _heading_diverse(observations, count):
+    """
+    Picks `count` observations, most recent first, whose headings are spread out.
+
+    Each pick is the observation whose heading is farthest from every heading
+    picked so far; recency breaks ties.
+    """
+    headed = [o for o in observations if o.get("heading") is not None]
+    unheaded = [o for o in observations if o.get("heading") is None]
+    chosen = []
+    if headed:
+        chosen.append(headed.pop(0))
+    while headed and len(chosen) < count:
+        best = max(
+            range(len(headed)),
+            key=lambda i: (
+                min(_angle_between(headed[i]["heading"], o["heading"]) for o in chosen),
+                -i,
+            ),
+        )
+        chosen.append(headed.pop(best))
+    chosen.extend(unheaded[: count - len(chosen)])
+    order = {id(o): i for i, o in enumerate(observations)}
+    return sorted(chosen, key=lambda o: order[id(o)])
+
+
+class ObservationSelector:
+    """
+    Selects the observations of an asset before it is analyzed.
+
+    Calling the selector returns the asset with only the selected
+    observations; the asset is returned unchanged when nothing is dropped.
+    Dropped images are counted per reason, on the selector and in the
+    `imagery_observations_total` metric; nothing is logged per asset.
+    """
+
+    def __init__(self, strategy="all", max_images=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown observation selector: {strategy}")
+        if max_images is not None and max_images <= 0:
+            raise ValueError("max_images must be positive.")
+        self.strategy = strategy
+        self.max_images = max_images
+        self.selected = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def select(self, observations):
+        """Returns `(selected, duplicates)` for a list of observations."""
+        distinct = []
+        seen = set()
+        for observation in observations:
+            if observation["gcs_uri"] in seen:
+                continue
+            seen.add(observation["gcs_uri"])
+            distinct.append(observation)
+        duplicates = len(observations) - len(distinct)
+
+        count = self.max_images
+        if self.strategy == "all" or count is None or len(distinct) <= count:
+            return distinct, duplicates
+        ordered = _by_recency(distinct)
+        if self.strategy == "most_recent":
+            return ordered[:count], duplicates
+        return _heading_diverse(ordered, count), duplicates
+
+    def __call__(self, asset):
+        observations = asset.get("observations", [])
+        selected, duplicates = self.select(observations)
+        dropped = len(observations) - len(selected) - duplicates
+        with self._lock:
+            self.selected += len(selected)
+            self.duplicates += duplicates
+            self.dropped += dropped
+        metrics.OBSERVATIONS.labels("selected").inc(len(selected))
+        if duplicates:
+            metrics.OBSERVATIONS.labels("duplicate").inc(duplicates)
+        if dropped:
+            metrics.OBSERVATIONS.labels("dropped").inc(dropped)
+        if not duplicates and not dropped:
+            return asset
+        return {**asset, "observations": selected}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "max_images": self.max_images,
+                "selected": self.selected,
+                "duplicates": self.duplicates,
+                "dropped": self.dropped,
+            }
@@ -1,9 +1,10 @@
 import os
 import json
+import time
 import base64
+import argparse
 import requests
-from flask import Flask, request
-from google.cloud import bigquery, pubsub_v1, tasks_v2
+from flask import Flask, Response, request
 from dotenv import load_dotenv
 from config import (
     GCP_PROJECT,
@@ -11,13 +12,61 @@ from config import (
     BIGQUERY_SOURCE_DATASET,
     BIGQUERY_SOURCE_TABLE,
     BIGQUERY_SOURCE_QUERY,
-    BIGQUERY_COUNT_QUERY,
     TASK_QUEUE_PREFIX,
     SERVICE_ACCOUNT_EMAIL,
     SHARD_SIZE,
+    SHARD_TARGET_OBSERVATIONS,
     POPULATE_TOPIC_ID_PREFIX,
     SUBSCRIPTION_ID_PREFIX,
+    BIGQUERY_RESULTS_DATASET,
+    SHARDING_MODE,
+    BIGQUERY_SNAPSHOT_TABLE_PREFIX,
+    SNAPSHOT_EXPIRATION_DAYS,
+    SOURCE_READER,
+    SOURCE_READ_STREAMS,
+    SOURCE_ARROW_FILE,
+    ENQUEUE_MAX_WORKERS,
+    ENQUEUE_MAX_ATTEMPTS,
+    TASK_BATCH_SIZE,
+    BIGQUERY_CHECKPOINT_TABLE,
+    SELECTED_PROMPT_KEYS,
+    results_table_name,
+    STATE_FILE,
+    INCREMENTAL_MODE,
+    PROCESSING_BACKEND,
+    TASK_PAYLOAD,
+    ASSET_MANIFEST_URI,
+    ASSET_MANIFEST_WRITERS,
 )
+from checkpoint import (
+    load_state,
+    save_state,
+    build_shard_messages,
+    pending_shard_messages,
+    ensure_checkpoint_table,
+    record_shard_complete,
+    completed_shard_ids,
+    incremental_source_query,
+    shard_id,
+)
+import metrics
+from asset_manifest import manifest_uri, reference_bodies, write_shard_manifests
+from clients import (
+    lazy,
+    bigquery_client,
+    publisher_client,
+    storage_client,
+    subscriber_client,
+    tasks_client,
+)
+from enqueuer import TaskEnqueuer, build_task, batch_payloads
+from sharding import (
+    snapshot_table_id,
+    create_source_snapshot,
+    count_source_rows,
+    plan_observation_shards,
+)
+from source_reader import make_source_reader, build_task_payloads, sort_shard
 
 load_dotenv()
 
@@ -25,25 +74,52 @@ SERVICE_URL = os.getenv("SERVICE_URL")
 POPULATE_SERVICE_URL = os.getenv("POPULATE_SERVICE_URL")
 
 # Configuration
+CHECKPOINT_TABLE_ID = f"{GCP_PROJECT}.{BIGQUERY_RESULTS_DATASET}.{BIGQUERY_CHECKPOINT_TABLE}"
+RESULTS_TABLE_IDS = [
+    f"{GCP_PROJECT}.{BIGQUERY_RESULTS_DATASET}.{results_table_name(key)}"
+    for key in SELECTED_PROMPT_KEYS
+]
+
+# Clients are created on first use (see clients.py): the shard worker never
+# needs Pub/Sub, and the local client never needs the enqueuer.
+@lazy
+def get_source_reader():
+    return make_source_reader(
+        SOURCE_READER,
+        bigquery_client(),
+        BIGQUERY_SOURCE_QUERY.format(
+            source_table=f"{GCP_PROJECT}.{BIGQUERY_SOURCE_DATASET}.{BIGQUERY_SOURCE_TABLE}"
+        ),
+        GCP_PROJECT,
+        max_streams=SOURCE_READ_STREAMS,
+        path=SOURCE_ARROW_FILE,
+    )
 
 
-# Initialize clients
-bq_client = bigquery.Client(project=GCP_PROJECT)
-publisher = pubsub_v1.PublisherClient()
-subscriber = pubsub_v1.SubscriberClient()
-tasks_client = tasks_v2.CloudTasksClient()
+@lazy
+def get_enqueuer():
+    return TaskEnqueuer(
+        tasks_client(), max_workers=ENQUEUE_MAX_WORKERS, max_attempts=ENQUEUE_MAX_ATTEMPTS
+    )
+
 
 app = Flask(__name__)
 
-def setup_and_shard():
+def setup_and_shard(incremental=INCREMENTAL_MODE):
     """
     Calls the /setup endpoint, cleans up and creates Pub/Sub
     resources, and publishes shard messages.
+
+    With `incremental`, only assets that are new or have newer detections
+    than the results tables are snapshotted. The run state is saved to
+    STATE_FILE so that an interrupted run can be resumed.
     """
     # Call the /setup endpoint
     print("Calling /setup endpoint...")
     if not SERVICE_URL:
         raise ValueError("SERVICE_URL environment variable not set.")
+    if incremental and SHARDING_MODE != "snapshot":
+        raise ValueError("Incremental runs require SHARDING_MODE = 'snapshot'.")
     print(f"Using SERVICE_URL: {SERVICE_URL}")
     response = requests.post(f"{SERVICE_URL}/setup")
     response.raise_for_status()
@@ -53,18 +129,37 @@ def setup_and_shard():
         f.write(f"\nTASK_QUEUE_ID={task_queue_id}")
         f.write(f"\nRUN_ID={run_id}")
     print(f"Setup complete. Using task queue: {task_queue_id}")
+    start_run(task_queue_id, incremental)
+
+
+def start_run(task_queue_id, incremental=INCREMENTAL_MODE, state_file=STATE_FILE):
+    """
+    Shards the source for a run whose queue has been set up, creates the
+    run's Pub/Sub topic and push subscription, and publishes the shards.
+
+    Returns the saved run state.
+    """
+    from google.cloud import pubsub_v1
+
+    bq_client = bigquery_client()
+    publisher = publisher_client()
+    subscriber = subscriber_client()
+
+    run_id = task_queue_id.split("-")[-1]
+    if TASK_PAYLOAD == "reference" and (SHARDING_MODE != "snapshot" or not ASSET_MANIFEST_URI):
+        raise ValueError(
+            "Reference task payloads require SHARDING_MODE = 'snapshot' and ASSET_MANIFEST_URI."
+        )
+    state = plan_run(run_id, task_queue_id, incremental)
+    if TASK_PAYLOAD == "reference":
+        state["manifest"] = write_run_manifest(state)
 
-    source_table_id = f"{GCP_PROJECT}.{BIGQUERY_SOURCE_DATASET}.{BIGQUERY_SOURCE_TABLE}"
-    
-    # Get the total number of rows
-    query = BIGQUERY_COUNT_QUERY.format(source_table=source_table_id)
-    total_rows = next(bq_client.query(query).result()).total_rows
-    
     # Create unique Pub/Sub resources for this run
     topic_id = f"{POPULATE_TOPIC_ID_PREFIX}{run_id}"
     subscription_id = f"{SUBSCRIPTION_ID_PREFIX}{run_id}"
     topic_path = publisher.topic_path(GCP_PROJECT, topic_id)
     subscription_path = subscriber.subscription_path(GCP_PROJECT, subscription_id)
+    state["topic_path"] = topic_path
 
     # Create the Pub/Sub topic
     publisher.create_topic(request={"name": topic_path})
@@ -86,16 +181,165 @@ def setup_and_shard():
     )
     print(f"Created push subscription: {subscription_path}")
 
+    ensure_checkpoint_table(bq_client, CHECKPOINT_TABLE_ID)
+    save_state(state_file, state)
+    publish_shards(topic_path, build_shard_messages(state))
+    return state
 
-    # Publish a message for each shard
-    for offset in range(0, total_rows, SHARD_SIZE):
-        message = {
-            "limit": SHARD_SIZE,
-            "offset": offset,
-            "task_queue_id": task_queue_id,
-        }
+
+def plan_run(run_id, task_queue_id=None, incremental=INCREMENTAL_MODE):
+    """
+    Snapshots (or counts) the source and plans the shards of a run.
+
+    Returns the run state from which `build_shard_messages` rebuilds the
+    shard messages. Shared by Cloud Tasks runs and local runs.
+    """
+    bq_client = bigquery_client()
+    source_table_id = f"{GCP_PROJECT}.{BIGQUERY_SOURCE_DATASET}.{BIGQUERY_SOURCE_TABLE}"
+    state = {
+        "run_id": run_id,
+        "task_queue_id": task_queue_id,
+        "sharding_mode": SHARDING_MODE,
+        "shard_size": SHARD_SIZE,
+        "incremental": incremental,
+    }
+
+    if SHARDING_MODE == "snapshot":
+        # Materialize the grouped source once; shards then read key ranges.
+        source_query = BIGQUERY_SOURCE_QUERY.format(source_table=source_table_id)
+        if incremental:
+            source_query = incremental_source_query(bq_client, source_query, RESULTS_TABLE_IDS)
+        snapshot_table = snapshot_table_id(
+            GCP_PROJECT, BIGQUERY_RESULTS_DATASET, BIGQUERY_SNAPSHOT_TABLE_PREFIX, run_id
+        )
+        total_rows = create_source_snapshot(
+            bq_client, source_query, snapshot_table, SNAPSHOT_EXPIRATION_DAYS
+        )
+        print(f"Created source snapshot {snapshot_table} with {total_rows} rows.")
+        state["snapshot_table"] = snapshot_table
+        if SHARD_TARGET_OBSERVATIONS:
+            state["shard_ranges"] = plan_shards(bq_client, snapshot_table)
+    else:
+        # Offsets page through the grouped query, so count its rows (assets),
+        # not the observation rows of the source table.
+        total_rows = count_source_rows(
+            bq_client, BIGQUERY_SOURCE_QUERY.format(source_table=source_table_id)
+        )
+    state["total_rows"] = total_rows
+    return state
+
+
+def plan_shards(bq_client, snapshot_table):
+    """
+    Cuts a snapshot into shards of about SHARD_TARGET_OBSERVATIONS images.
+
+    Returns `[start, end]` key ranges and prints a summary of the plan.
+    """
+    start_time = time.perf_counter()
+    plan = plan_observation_shards(bq_client, snapshot_table, SHARD_TARGET_OBSERVATIONS)
+    elapsed = time.perf_counter() - start_time
+    if plan:
+        observations = [shard[3] for shard in plan]
+        print(
+            f"Planned {len(plan)} shards over {sum(shard[2] for shard in plan)} assets and "
+            f"{sum(observations)} observations in {elapsed:.2f}s "
+            f"({min(observations)}-{max(observations)} observations per shard)."
+        )
+    return [[start, end] for start, end, _, _ in plan]
+
+
+def write_run_manifest(state):
+    """
+    Writes the assets of every shard of a run to its own manifest (see
+    asset_manifest.py) and returns the manifest URI and row count of every shard.
+    """
+    messages = build_shard_messages(state)
+    uris = [
+        manifest_uri(ASSET_MANIFEST_URI, state["run_id"], shard_id(message))
+        for message in messages
+    ]
+    start_time = time.perf_counter()
+    rows = write_shard_manifests(
+        get_source_reader(),
+        messages,
+        uris,
+        storage_client,
+        TASK_BATCH_SIZE,
+        ASSET_MANIFEST_WRITERS,
+    )
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"Wrote {len(uris)} shard manifests under {ASSET_MANIFEST_URI} with "
+        f"{sum(rows)} assets in {elapsed:.2f}s."
+    )
+    return {"shards": [[uri, count] for uri, count in zip(uris, rows)]}
+
+
+def resume_run():
+    """Republishes the shards of the saved run that have no checkpoint yet."""
+    state = load_state(STATE_FILE)
+    if not state:
+        raise ValueError(f"No run state found in {STATE_FILE}; start a new run instead.")
+    completed = completed_shard_ids(bigquery_client(), CHECKPOINT_TABLE_ID, state["run_id"])
+    messages = pending_shard_messages(state, completed)
+    print(
+        f"Resuming run {state['run_id']}: {len(completed)} shards complete, "
+        f"{len(messages)} remaining."
+    )
+    publish_shards(state["topic_path"], messages)
+
+
+def publish_shards(topic_path, messages):
+    """
+    Publishes a message for each shard.
+
+    The publisher batches messages (see clients.py); every publish returns a
+    future, and all of them are awaited before reporting, so a failed
+    publish is not lost silently.
+    """
+    publisher = publisher_client()
+    start_time = time.perf_counter()
+    futures = [
         publisher.publish(topic_path, json.dumps(message).encode("utf-8"))
-        print(f"Published message: {message}")
+        for message in messages
+    ]
+    failed = []
+    for message, future in zip(messages, futures):
+        try:
+            future.result()
+        except Exception as e:
+            failed.append(message)
+            print(f"Error publishing shard {message}: {e}")
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"Published {len(messages) - len(failed)} of {len(messages)} shard messages "
+        f"to {topic_path} in {elapsed:.2f}s."
+    )
+    if failed:
+        raise RuntimeError(
+            f"{len(failed)} shard messages were not published; run with --resume to retry."
+        )
+
+
+def shard_task_bodies(data, reader=None):
+    """
+    Yields the `/process` task bodies of a shard message.
+
+    Shards of runs with reference payloads are not read; their tasks refer
+    to manifest rows. `reader` defaults to the configured source reader.
+    """
+    if "manifest" in data:
+        yield from reference_bodies(data["manifest"], TASK_BATCH_SIZE)
+        return
+    batches = sort_shard(
+        metrics.timed_batches(
+            (reader or get_source_reader()).read_shard(data),
+            metrics.BIGQUERY_QUERY_SECONDS.labels("shard_read"),
+        )
+    )
+    payloads = (payload for batch in batches for payload in build_task_payloads(batch))
+    yield from batch_payloads(payloads, TASK_BATCH_SIZE)
+
 
 @app.route("/", methods=["POST"])
 def process_shard():
@@ -109,45 +353,28 @@ def process_shard():
 
     pubsub_message = envelope["message"]
     data = json.loads(base64.b64decode(pubsub_message["data"]).decode("utf-8"))
-    
-    limit = data["limit"]
-    offset = data["offset"]
     task_queue_id = data["task_queue_id"]
 
-    source_table_id = f"{GCP_PROJECT}.{BIGQUERY_SOURCE_DATASET}.{BIGQUERY_SOURCE_TABLE}"
-    query = BIGQUERY_SOURCE_QUERY.format(source_table=source_table_id) + f" LIMIT {limit} OFFSET {offset}"
-    rows = bq_client.query(query).result()
-
-    parent = tasks_client.queue_path(GCP_PROJECT, LOCATION, task_queue_id)
-
-    for row in rows:
-        payload = {
-            "asset_id": row["asset_id"],
-            "location": {
-                "latitude": row["location"]["latitude"],
-                "longitude": row["location"]["longitude"],
-            },
-            "detection_time": row["detection_time"].isoformat(),
-            "observations": [
-                {"observation_id": o["observation_id"], "gcs_uri": o["gcs_uri"]}
-                for o in row["observations"]
-            ],
-        }
-        task = {
-            "http_request": {
-                "http_method": tasks_v2.HttpMethod.POST,
-                "url": f"{SERVICE_URL}/process",
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps(payload).encode(),
-                "oidc_token": {
-                    "service_account_email": SERVICE_ACCOUNT_EMAIL
-                },
-            }
-        }
-        tasks_client.create_task(parent=parent, task=task)
+    parent = tasks_client().queue_path(GCP_PROJECT, LOCATION, task_queue_id)
+    tasks = (
+        build_task(body, SERVICE_URL, SERVICE_ACCOUNT_EMAIL, parent)
+        for body in shard_task_bodies(data)
+    )
+    stats = get_enqueuer().enqueue(parent, tasks)
+    if stats.failed:
+        # Let Pub/Sub redeliver the shard.
+        return f"Failed to create {stats.failed} tasks.", 500
 
+    with metrics.BIGQUERY_INSERT_SECONDS.labels(BIGQUERY_CHECKPOINT_TABLE).time():
+        record_shard_complete(bigquery_client(), CHECKPOINT_TABLE_ID, data, stats.created)
     return "Processing complete.", 204
 
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Returns this instance's metrics in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
 # The script can be run in two modes:
 # 1. Local execution to initiate the process: `python3 src/populate_with_cloud_run.py`
 # 2. As a Flask app on Cloud Run to serve requests.
@@ -155,7 +382,38 @@ def process_shard():
 # while the Cloud Run entrypoint in the `deploy.sh` script will point to the `app` object.
 
 if __name__ == "__main__":
-    setup_and_shard()
+    parser = argparse.ArgumentParser(description="Start or resume a populate run.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=f"Republish the unfinished shards of the run saved in {STATE_FILE}.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=INCREMENTAL_MODE,
+        help="Only process assets that are new or changed since the last run.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["cloud_tasks", "local", "batch_prediction"],
+        default=PROCESSING_BACKEND,
+        help="Process the run through Cloud Tasks, on this machine (local_runner.py) "
+        "or with Gemini batch prediction jobs (batch_prediction.py).",
+    )
+    args = parser.parse_args()
+    if args.backend == "local":
+        from local_runner import run_local
+
+        run_local(resume=args.resume, incremental=args.incremental)
+    elif args.backend == "batch_prediction":
+        from batch_prediction import run_batch_prediction
+
+        run_batch_prediction(resume=args.resume, incremental=args.incremental)
+    elif args.resume:
+        resume_run()
+    else:
+        setup_and_shard(incremental=args.incremental)
 else:
     # This is the entrypoint for the Cloud Run service
     gunicorn_app = app
\ No newline at end of file
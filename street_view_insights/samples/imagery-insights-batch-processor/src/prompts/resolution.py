@@ -26,4 +26,20 @@ SCHEMA = [
     bigquery.SchemaField("detection_time", "TIMESTAMP", mode="NULLABLE"),
     bigquery.SchemaField("width", "INTEGER", mode="NULLABLE"),
     bigquery.SchemaField("height", "INTEGER", mode="NULLABLE"),
-]
\ No newline at end of file
+]
+
+
+def evaluate(asset, header_reader):
+    """Reads the resolution from the JPEG frame header instead of asking Gemini."""
+    observations = asset.get("observations", [])
+    if not observations:
+        return None
+    try:
+        width, height = header_reader.jpeg_dimensions(observations[0]["gcs_uri"])
+    except ValueError as e:
+        print(f"Falling back to Gemini for {asset.get('asset_id')}: {e}")
+        return None
+    return {"width": width, "height": height}
+
+
+EVALUATOR = evaluate
@@ -0,0 +1,203 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Client-side rate control for Gemini calls.
+
+`AdaptiveRateLimiter` is a token bucket whose rate adapts by additive
+increase and multiplicative decrease (AIMD): every successful call raises
+the rate a little, while a throttling error or a call slower than the
+latency target cuts it by a constant factor. Retry hints sent with a
+throttling error pause the bucket for the requested delay.
+`RateLimitedModel` wraps the shared `GenerativeModel` so that calls wait
+for a token and throttled calls are retried in-process instead of failing
+the whole task back to Cloud Tasks.
+"""
+
+import threading
+import time
+
+from google.api_core import exceptions
+
+import metrics
+
+THROTTLE_ERRORS = (exceptions.ResourceExhausted, exceptions.TooManyRequests)
+
+
+def retry_delay(error):
+    """
+    Returns the retry delay in seconds suggested by a throttling error, or None.
+
+    Both the `google.rpc.RetryInfo` error detail and an HTTP `Retry-After`
+    header are honored.
+    """
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and (delay.seconds or delay.nanos):
+            return delay.seconds + delay.nanos / 1e9
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            return None
+    return None
+
+
+class AdaptiveRateLimiter:
+    """A token bucket whose rate follows an AIMD controller."""
+
+    def __init__(
+        self,
+        initial_rate=5.0,
+        min_rate=0.5,
+        max_rate=50.0,
+        additive_increase=0.5,
+        decrease_factor=0.5,
+        latency_target=None,
+        burst=1.0,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.additive_increase = additive_increase
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.burst = max(burst, 1.0)
+        self.clock = clock
+        self.sleep = sleep
+        self.throttled = 0
+        self.decreases = 0
+        self._rate = min(max(initial_rate, min_rate), max_rate)
+        self._tokens = 1.0
+        self._last_refill = clock()
+        self._paused_until = 0.0
+        self._last_decrease = None
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    @property
+    def current_rate(self):
+        """The allowed calls per second."""
+        return self._rate
+
+    @property
+    def queue_depth(self):
+        """The number of callers waiting for a token."""
+        return self._waiting
+
+    def acquire(self):
+        """Blocks until the bucket allows another call."""
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                with self._lock:
+                    now = self.clock()
+                    self._refill(now)
+                    wait = self._paused_until - now
+                    if wait <= 0:
+                        # Allow for rounding in the refill arithmetic.
+                        if self._tokens >= 1 - 1e-9:
+                            self._tokens = max(self._tokens - 1, 0.0)
+                            return
+                        wait = (1 - self._tokens) / self._rate
+                self.sleep(wait)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def on_success(self, latency=None):
+        """Raises the rate, unless the call was slower than the latency target."""
+        if self.latency_target and latency is not None and latency > self.latency_target:
+            self._decrease()
+            return
+        with self._lock:
+            # Spread the increase so that the rate grows by `additive_increase`
+            # per second of calls at the current rate.
+            self._rate = min(self._rate + self.additive_increase / self._rate, self.max_rate)
+
+    def on_throttle(self, retry_after=None):
+        """Cuts the rate and honors the server's retry hint."""
+        with self._lock:
+            self.throttled += 1
+            if retry_after:
+                now = self.clock()
+                self._paused_until = max(self._paused_until, now + retry_after)
+                self._tokens = 0.0
+        self._decrease()
+
+    def stats(self):
+        return {
+            "rate": round(self._rate, 3),
+            "queue_depth": self._waiting,
+            "throttled": self.throttled,
+            "decreases": self.decreases,
+        }
+
+    def _refill(self, now):
+        if now > self._last_refill:
+            self._tokens = min(
+                self._tokens + (now - self._last_refill) * self._rate, self.burst
+            )
+            self._last_refill = now
+
+    def _decrease(self):
+        with self._lock:
+            now = self.clock()
+            # Concurrent calls see the same congestion; react to it once per
+            # interval at the current rate rather than once per failed call.
+            if self._last_decrease is not None and now - self._last_decrease < 1 / self._rate:
+                return
+            self._refill(now)
+            self._rate = max(self._rate * self.decrease_factor, self.min_rate)
+            self._last_decrease = now
+            self.decreases += 1
+
+
+class RateLimitedModel:
+    """Wraps a `GenerativeModel` with an `AdaptiveRateLimiter` and throttle retries."""
+
+    def __init__(self, model, limiter, max_attempts=5, initial_backoff=1.0, max_backoff=30.0):
+        self.model = model
+        self.limiter = limiter
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+    def generate_content(self, *args, **kwargs):
+        for attempt in range(1, self.max_attempts + 1):
+            self.limiter.acquire()
+            start = self.limiter.clock()
+            try:
+                response = self.model.generate_content(*args, **kwargs)
+            except THROTTLE_ERRORS as e:
+                if attempt == self.max_attempts:
+                    raise
+                delay = retry_delay(e)
+                if delay is None:
+                    # Without a hint, back off exponentially before the next token.
+                    delay = min(self.initial_backoff * 2 ** (attempt - 1), self.max_backoff)
+                print(f"Gemini throttled (attempt {attempt}), retrying in {delay:.1f}s: {e}")
+                metrics.record_retry("gemini")
+                self.limiter.on_throttle(delay)
+                continue
+            self.limiter.on_success(self.limiter.clock() - start)
+            return response
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
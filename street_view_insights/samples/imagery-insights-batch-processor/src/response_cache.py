@@ -0,0 +1,238 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Content-addressed cache for Gemini responses.
+
+Responses are keyed by a hash of the model name, the prompt text, the
+ordered image URIs and the generation config, so repeating a run, or
+re-processing an asset whose observations have not changed, does not call
+the model again. `SQLiteResponseCache` keeps an LRU-evicted cache on local
+disk; `BigQueryResponseCache` shares entries between instances and runs
+through a BigQuery table.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from google.cloud import bigquery
+
+
+def cache_key(model_name, prompt, gcs_uris, generation_config=None):
+    """Returns the hex SHA-256 key for a model request."""
+    material = json.dumps(
+        {
+            "model": model_name,
+            "prompt": prompt,
+            "gcs_uris": list(gcs_uris),
+            "generation_config": generation_config,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Base class that counts hits and misses around a storage backend."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def key(self, prompt, gcs_uris, generation_config=None):
+        return cache_key(self.model_name, prompt, gcs_uris, generation_config)
+
+    def get(self, key):
+        """Returns the cached response text for `key`, or None."""
+        response = self._get(key)
+        with self._counter_lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def put(self, key, response):
+        """Stores the response text for `key`."""
+        self._put(key, response)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _put(self, key, response):
+        raise NotImplementedError
+
+
+class SQLiteResponseCache(ResponseCache):
+    """A local SQLite cache evicting least-recently-used entries past `max_bytes`."""
+
+    def __init__(self, model_name, path, max_bytes=128 * 1024 * 1024):
+        super().__init__(model_name)
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._db.commit()
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def _get(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._db.commit()
+            return row[0]
+
+    def _put(self, key, response):
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._db.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time()),
+            )
+            self._size += size - (previous[0] if previous else 0)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        while self._size > self.max_bytes:
+            oldest = self._db.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                if self._size <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._size -= size
+
+    @property
+    def size_bytes(self):
+        return self._size
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class BigQueryResponseCache(ResponseCache):
+    """A cache shared through a BigQuery table."""
+
+    SCHEMA = [
+        bigquery.SchemaField("key", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("model", "STRING", mode="NULLABLE"),
+        bigquery.SchemaField("response", "STRING", mode="NULLABLE"),
+        bigquery.SchemaField("created_at", "TIMESTAMP", mode="NULLABLE"),
+    ]
+
+    LOOKUP_QUERY = """
+    SELECT response
+    FROM `{table_id}`
+    WHERE key = @key
+    LIMIT 1
+    """
+
+    def __init__(self, model_name, bq_client, table_id):
+        super().__init__(model_name)
+        self.bq_client = bq_client
+        self.table_id = table_id
+
+    def create_table(self):
+        """Creates the cache table, clustered by key, if it does not exist."""
+        table = bigquery.Table(self.table_id, schema=self.SCHEMA)
+        table.clustering_fields = ["key"]
+        self.bq_client.create_table(table, exists_ok=True)
+
+    def _get(self, key):
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("key", "STRING", key)]
+        )
+        rows = self.bq_client.query(
+            self.LOOKUP_QUERY.format(table_id=self.table_id), job_config=job_config
+        ).result()
+        for row in rows:
+            return row["response"]
+        return None
+
+    def _put(self, key, response):
+        errors = self.bq_client.insert_rows_json(
+            self.table_id,
+            [
+                {
+                    "key": key,
+                    "model": self.model_name,
+                    "response": response,
+                    "created_at": time.time(),
+                }
+            ],
+        )
+        if errors:
+            print(f"Error caching response {key}: {errors}")
+
+
+def make_response_cache(kind, model_name, path=None, max_bytes=None, bq_client=None, table_id=None):
+    """Builds the configured response cache (`sqlite`, `bigquery` or `none`)."""
+    if kind == "none":
+        return None
+    if kind == "sqlite":
+        return SQLiteResponseCache(model_name, path, max_bytes=max_bytes)
+    if kind == "bigquery":
+        return BigQueryResponseCache(model_name, bq_client, table_id)
+    raise ValueError(f"Unknown response cache: {kind}")
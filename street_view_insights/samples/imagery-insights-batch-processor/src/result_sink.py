@@ -0,0 +1,471 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Result sinks for the `/process` endpoint.
+
+`BufferedResultWriter` buffers rows from every request handled by an instance
+and appends them to BigQuery through the Storage Write API once a row-count,
+byte-size or time threshold is reached. Each append carries an explicit
+stream offset, so an append that the transport retries on the same stream is
+acknowledged by BigQuery as already written instead of being duplicated. A
+request only returns after its rows have been appended, so Cloud Tasks never
+acknowledges a task whose rows are still sitting in memory.
+
+Offsets only deduplicate within one stream, so delivery is at least once: a
+task retried after its rows landed but before it was acknowledged (an append
+whose outcome was lost and exhausted its retries, a crash, or a retry on
+another instance) appends them again on a new stream. In "pending" mode a
+stream abandoned after such an append is never committed, which leaves only
+a commit or crash between the commit and the task's acknowledgement.
+
+`InsertAllResultSink` keeps the previous `insert_rows_json` behavior.
+
+Both sinks expose `write(rows)`, which blocks until the rows are written and
+returns per-row errors in the same shape as `insert_rows_json`.
+"""
+
+import datetime
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from google.api_core import exceptions
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+TRANSIENT_ERRORS = (
+    exceptions.Aborted,
+    exceptions.DeadlineExceeded,
+    exceptions.InternalServerError,
+    exceptions.ServiceUnavailable,
+    exceptions.TooManyRequests,
+)
+
+_FieldDescriptor = descriptor_pb2.FieldDescriptorProto
+
+_PROTO_TYPES = {
+    "STRING": _FieldDescriptor.TYPE_STRING,
+    "INTEGER": _FieldDescriptor.TYPE_INT64,
+    "INT64": _FieldDescriptor.TYPE_INT64,
+    "FLOAT": _FieldDescriptor.TYPE_DOUBLE,
+    "FLOAT64": _FieldDescriptor.TYPE_DOUBLE,
+    "BOOLEAN": _FieldDescriptor.TYPE_BOOL,
+    "BOOL": _FieldDescriptor.TYPE_BOOL,
+    # TIMESTAMP columns accept microseconds since the epoch.
+    "TIMESTAMP": _FieldDescriptor.TYPE_INT64,
+}
+
+
+def _schema_descriptor(schema, name):
+    """Builds a self-contained proto2 DescriptorProto for a BigQuery schema."""
+    proto = descriptor_pb2.DescriptorProto(name=name)
+    for number, field in enumerate(schema, start=1):
+        proto_field = proto.field.add(name=field.name, number=number)
+        proto_field.label = (
+            _FieldDescriptor.LABEL_REPEATED
+            if field.mode == "REPEATED"
+            else _FieldDescriptor.LABEL_OPTIONAL
+        )
+        if field.field_type in ("RECORD", "STRUCT"):
+            nested = _schema_descriptor(field.fields, f"{name}_{field.name}")
+            proto.nested_type.append(nested)
+            proto_field.type = _FieldDescriptor.TYPE_MESSAGE
+            proto_field.type_name = f".{name}.{nested.name}"
+        else:
+            # Other types (NUMERIC, DATETIME, GEOGRAPHY, JSON, ...) accept strings.
+            proto_field.type = _PROTO_TYPES.get(field.field_type, _FieldDescriptor.TYPE_STRING)
+    return proto
+
+
+def _timestamp_micros(value):
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        text = value.strip().replace("Z", "+00:00")
+        if len(text) > 10 and text[10] == " ":
+            text = f"{text[:10]}T{text[11:]}"
+        value = datetime.datetime.fromisoformat(text)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    delta = value - datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    return delta // datetime.timedelta(microseconds=1)
+
+
+def _convert_value(field, value):
+    if field.field_type == "TIMESTAMP":
+        return _timestamp_micros(value)
+    if field.field_type in ("INTEGER", "INT64"):
+        return int(value)
+    if field.field_type in ("FLOAT", "FLOAT64"):
+        return float(value)
+    if field.field_type in ("BOOLEAN", "BOOL"):
+        return value if isinstance(value, bool) else str(value).lower() == "true"
+    return value if isinstance(value, str) else str(value)
+
+
+def _fill_message(message, schema, row):
+    for field in schema:
+        value = row.get(field.name)
+        if value is None:
+            continue
+        values = value if field.mode == "REPEATED" else [value]
+        if field.field_type in ("RECORD", "STRUCT"):
+            for item in values:
+                target = (
+                    getattr(message, field.name).add()
+                    if field.mode == "REPEATED"
+                    else getattr(message, field.name)
+                )
+                _fill_message(target, field.fields, item)
+        elif field.mode == "REPEATED":
+            getattr(message, field.name).extend(
+                _convert_value(field, item) for item in values if item is not None
+            )
+        else:
+            setattr(message, field.name, _convert_value(field, value))
+
+
+class RowSerializer:
+    """Serializes JSON-style result rows into proto rows for a BigQuery schema."""
+
+    def __init__(self, schema, name="ResultRow"):
+        self.schema = schema
+        self.descriptor = _schema_descriptor(schema, name)
+        file_proto = descriptor_pb2.FileDescriptorProto(
+            name=f"{name}.proto", syntax="proto2", message_type=[self.descriptor]
+        )
+        pool = descriptor_pool.DescriptorPool()
+        pool.Add(file_proto)
+        self.message_class = message_factory.GetMessageClass(
+            pool.FindMessageTypeByName(name)
+        )
+
+    def serialize(self, row):
+        """Returns the serialized proto for a row; raises ValueError if invalid."""
+        message = self.message_class()
+        try:
+            _fill_message(message, self.schema, row)
+        except (TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"Row does not match the results schema: {e}") from e
+        return message.SerializeToString()
+
+
+class StorageWriteTransport:
+    """
+    Appends serialized rows to one Storage Write API stream.
+
+    `mode` is "committed" (rows are visible as soon as they are appended) or
+    "pending" (each flush appends to a new stream that `commit` finalizes and
+    commits, so a flush's rows become visible atomically).
+    Appends are retried at the same offset, so BigQuery reports a retry of
+    an append that already landed as ALREADY_EXISTS and it is not written
+    twice on this stream. A new stream starts over at offset 0 and cannot
+    detect rows written by an earlier one.
+    """
+
+    def __init__(self, write_client, table_id, serializer, mode="committed", max_attempts=5):
+        self.write_client = write_client
+        project, dataset, table = table_id.split(".")
+        self.table_path = f"projects/{project}/datasets/{dataset}/tables/{table}"
+        self.serializer = serializer
+        self.mode = mode
+        self.max_attempts = max_attempts
+        self._write_stream = None
+        self._connection = None
+
+    def append(self, serialized_rows, offset):
+        """
+        Appends rows starting at `offset`.
+
+        Returns a dict of {row index: error message} for rejected rows; when it
+        is non-empty nothing was written and the caller may retry the rest.
+        BigQuery reports rejected rows by failing the append with
+        INVALID_ARGUMENT, whose response carries the row errors.
+        """
+        backoff = 0.25
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self._send(serialized_rows, offset)
+            except exceptions.AlreadyExists:
+                # An earlier attempt landed; the offset makes the retry a no-op.
+                return {}
+            except exceptions.BadRequest as e:
+                row_errors = getattr(getattr(e, "response", None), "row_errors", None)
+                if not row_errors:
+                    raise
+                return {error.index: error.message for error in row_errors}
+            except TRANSIENT_ERRORS:
+                if attempt == self.max_attempts:
+                    raise
+                self._close_connection()
+                time.sleep(random.uniform(0, backoff))
+                backoff = min(backoff * 2, 8.0)
+                continue
+            return {}
+
+    def _send(self, serialized_rows, offset):
+        from google.cloud.bigquery_storage_v1 import types
+
+        request = types.AppendRowsRequest(
+            offset=offset,
+            proto_rows=types.AppendRowsRequest.ProtoData(
+                rows=types.ProtoRows(serialized_rows=serialized_rows)
+            ),
+        )
+        return self._get_connection().send(request).result()
+
+    def _get_connection(self):
+        from google.cloud.bigquery_storage_v1 import types, writer
+
+        if self._write_stream is None:
+            stream_type = (
+                types.WriteStream.Type.PENDING
+                if self.mode == "pending"
+                else types.WriteStream.Type.COMMITTED
+            )
+            self._write_stream = self.write_client.create_write_stream(
+                parent=self.table_path, write_stream=types.WriteStream(type_=stream_type)
+            ).name
+        if self._connection is None or not self._connection.is_active:
+            template = types.AppendRowsRequest(
+                write_stream=self._write_stream,
+                proto_rows=types.AppendRowsRequest.ProtoData(
+                    writer_schema=types.ProtoSchema(
+                        proto_descriptor=self.serializer.descriptor
+                    )
+                ),
+            )
+            self._connection = writer.AppendRowsStream(self.write_client, template)
+        return self._connection
+
+    def _close_connection(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    def commit(self):
+        """
+        Makes the appended rows visible; returns True if the stream was replaced.
+
+        Committed streams need nothing. A pending stream is finalized and
+        committed, and the next append starts a new stream at offset 0.
+        """
+        if self.mode != "pending" or self._write_stream is None:
+            return False
+        from google.cloud.bigquery_storage_v1 import types
+
+        self._close_connection()
+        stream, self._write_stream = self._write_stream, None
+        self.write_client.finalize_write_stream(name=stream)
+        response = self.write_client.batch_commit_write_streams(
+            types.BatchCommitWriteStreamsRequest(
+                parent=self.table_path, write_streams=[stream]
+            )
+        )
+        if response.stream_errors:
+            raise RuntimeError(
+                f"Commit of write stream {stream} failed: "
+                + "; ".join(error.error_message for error in response.stream_errors)
+            )
+        return True
+
+    def reset(self):
+        """
+        Abandons the current stream after an append with an unknown outcome.
+
+        Committed streams are finalized and replaced. A pending stream is
+        dropped uncommitted, so none of its rows become visible.
+        """
+        self._close_connection()
+        if self._write_stream is None:
+            return
+        stream, self._write_stream = self._write_stream, None
+        if self.mode == "pending":
+            return
+        try:
+            self.write_client.finalize_write_stream(name=stream)
+        except Exception as e:
+            print(f"Error finalizing write stream {stream}: {e}")
+
+    def close(self):
+        """Finalizes a committed stream; pending streams are committed per flush."""
+        self._close_connection()
+        if self._write_stream is None or self.mode == "pending":
+            return
+        self.write_client.finalize_write_stream(name=self._write_stream)
+        self._write_stream = None
+
+
+class BufferedResultWriter:
+    """
+    Buffers rows across requests and appends them in batches.
+
+    A flush happens when `max_rows` rows or `max_bytes` bytes are buffered, or
+    when the oldest buffered row has waited `flush_interval` seconds.
+    """
+
+    def __init__(self, transport, max_rows=500, max_bytes=8 * 1024 * 1024, flush_interval=1.0):
+        self.transport = transport
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.offset = 0
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._oldest = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._flusher = threading.Thread(
+            target=self._run_flusher, name="result-writer", daemon=True
+        )
+        self._flusher.start()
+
+    def write(self, rows):
+        """Buffers rows, waits for them to be appended and returns row errors."""
+        errors = []
+        pending = []
+        for index, row in enumerate(rows):
+            try:
+                pending.append((index, self.submit(row)))
+            except ValueError as e:
+                errors.append({"index": index, "errors": [str(e)]})
+        for index, future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append({"index": index, "errors": [str(e)]})
+        return sorted(errors, key=lambda error: error["index"])
+
+    def submit(self, row):
+        """Buffers one row and returns a Future resolved once it is appended."""
+        serialized = self.transport.serializer.serialize(row)
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Result writer is closed.")
+            self._buffer.append((serialized, future))
+            self._buffer_bytes += len(serialized)
+            if self._oldest is None:
+                # Wake the flusher so it starts the flush_interval timer.
+                self._oldest = time.monotonic()
+                self._condition.notify()
+            elif len(self._buffer) >= self.max_rows or self._buffer_bytes >= self.max_bytes:
+                self._condition.notify()
+        return future
+
+    def flush(self):
+        """Appends everything currently buffered."""
+        with self._flush_lock:
+            with self._condition:
+                batch = self._buffer
+                self._buffer = []
+                self._buffer_bytes = 0
+                self._oldest = None
+            if batch:
+                self._append(batch)
+
+    def _append(self, batch):
+        while batch:
+            try:
+                row_errors = self.transport.append([rows for rows, _ in batch], self.offset)
+                # Rows only count as written once they are visible, so a
+                # pending stream is committed before any future resolves.
+                replaced = not row_errors and self.transport.commit()
+            except Exception as e:
+                # The rows may or may not have landed, so the stream offset is
+                # unknown: continue on a fresh stream.
+                self.transport.reset()
+                self.offset = 0
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+            if not row_errors:
+                self.offset = 0 if replaced else self.offset + len(batch)
+                for _, future in batch:
+                    future.set_result(None)
+                return
+            # Nothing was written; reject the bad rows and retry the rest.
+            for index, message in row_errors.items():
+                batch[index][1].set_exception(ValueError(message))
+            batch = [item for index, item in enumerate(batch) if index not in row_errors]
+
+    def _run_flusher(self):
+        while True:
+            with self._condition:
+                while not self._closed and not self._should_flush():
+                    timeout = None
+                    if self._oldest is not None:
+                        timeout = max(0.0, self._oldest + self.flush_interval - time.monotonic())
+                    self._condition.wait(timeout)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _should_flush(self):
+        if not self._buffer:
+            return False
+        return (
+            len(self._buffer) >= self.max_rows
+            or self._buffer_bytes >= self.max_bytes
+            or time.monotonic() - self._oldest >= self.flush_interval
+        )
+
+    def close(self):
+        """Flushes buffered rows and finalizes the underlying stream."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._flusher.join()
+        self.flush()
+        self.transport.close()
+
+
+class InsertAllResultSink:
+    """Writes rows with the streaming `insert_rows_json` API."""
+
+    def __init__(self, bq_client, table_id):
+        self.bq_client = bq_client
+        self.table_id = table_id
+
+    def write(self, rows):
+        return self.bq_client.insert_rows_json(self.table_id, rows)
+
+    def close(self):
+        pass
+
+
+def make_result_sink(kind, bq_client, table_id, schema, mode="committed", max_rows=500, flush_interval=1.0):
+    """Builds the configured result sink (`storage_write` or `insert_all`)."""
+    if kind == "insert_all":
+        return InsertAllResultSink(bq_client, table_id)
+    if kind == "storage_write":
+        from google.cloud import bigquery_storage_v1
+
+        transport = StorageWriteTransport(
+            bigquery_storage_v1.BigQueryWriteClient(),
+            table_id,
+            RowSerializer(schema),
+            mode=mode,
+        )
+        return BufferedResultWriter(
+            transport, max_rows=max_rows, flush_interval=flush_interval
+        )
+    raise ValueError(f"Unknown result sink: {kind}")
@@ -0,0 +1,207 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compiles a prompt's BigQuery `SCHEMA` for structured output.
+
+`compile_schema` turns the schema into a Gemini `response_schema`, so the
+model is constrained to return JSON with exactly the analysis fields, and
+into a row projector with one converter per field, so building a results
+row from a response is a single pass with no per-request schema walk.
+Values that cannot be coerced to their column type are stored as NULL.
+"""
+
+import threading
+
+# Row fields filled from the task payload rather than by the model.
+BASE_FIELDS = ("asset_id", "location", "detection_time", "observation_ids", "gcs_uris")
+
+RESPONSE_TYPES = {
+    "STRING": "STRING",
+    "INTEGER": "INTEGER",
+    "INT64": "INTEGER",
+    "FLOAT": "NUMBER",
+    "FLOAT64": "NUMBER",
+    "NUMERIC": "NUMBER",
+    "BIGNUMERIC": "NUMBER",
+    "BOOLEAN": "BOOLEAN",
+    "BOOL": "BOOLEAN",
+    "RECORD": "OBJECT",
+    "STRUCT": "OBJECT",
+}
+
+
+class ParseStats:
+    """Counts model responses that could not be parsed or projected."""
+
+    def __init__(self):
+        self.responses = 0
+        self.parse_failures = 0
+        self.coercion_failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, parse_failed=False, coercion_failures=0):
+        with self._lock:
+            self.responses += 1
+            self.parse_failures += int(parse_failed)
+            self.coercion_failures += coercion_failures
+
+    def stats(self):
+        return {
+            "responses": self.responses,
+            "parse_failures": self.parse_failures,
+            "parse_failure_rate": (
+                self.parse_failures / self.responses if self.responses else 0.0
+            ),
+            "coercion_failures": self.coercion_failures,
+        }
+
+
+def _field_response_schema(field):
+    if field.field_type in ("RECORD", "STRUCT"):
+        schema = {
+            "type": "OBJECT",
+            "properties": {f.name: _field_response_schema(f) for f in field.fields},
+            "property_ordering": [f.name for f in field.fields],
+        }
+    else:
+        # Dates and times are returned as strings and parsed by BigQuery.
+        schema = {"type": RESPONSE_TYPES.get(field.field_type, "STRING")}
+    if field.description:
+        schema["description"] = field.description
+    if field.mode == "REPEATED":
+        return {"type": "ARRAY", "items": schema}
+    schema["nullable"] = True
+    return schema
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise ValueError("boolean is not an integer")
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"{value} is not an integer")
+        return int(value)
+    return int(value)
+
+
+def _to_float(value):
+    if isinstance(value, bool):
+        raise ValueError("boolean is not a number")
+    return float(value)
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+        return value.strip().lower() == "true"
+    raise ValueError(f"{value!r} is not a boolean")
+
+
+def _to_string(value):
+    if isinstance(value, (dict, list)):
+        raise ValueError("nested value is not a string")
+    return str(value)
+
+
+def _scalar_converter(field_type):
+    if field_type in ("INTEGER", "INT64"):
+        return _to_int
+    if field_type in ("FLOAT", "FLOAT64", "NUMERIC", "BIGNUMERIC"):
+        return _to_float
+    if field_type in ("BOOLEAN", "BOOL"):
+        return _to_bool
+    return _to_string
+
+
+def _field_converter(field):
+    """Returns a function that coerces a value to the field's type or raises ValueError."""
+    if field.field_type in ("RECORD", "STRUCT"):
+        subfields = [(f.name, _field_converter(f)) for f in field.fields]
+
+        def convert(value):
+            if not isinstance(value, dict):
+                raise ValueError(f"{field.name} is not an object")
+            return {
+                name: None if value.get(name) is None else sub(value[name])
+                for name, sub in subfields
+            }
+
+    else:
+        convert = _scalar_converter(field.field_type)
+
+    if field.mode != "REPEATED":
+        return convert
+
+    def convert_repeated(value):
+        if not isinstance(value, list):
+            raise ValueError(f"{field.name} is not a list")
+        return [convert(item) for item in value if item is not None]
+
+    return convert_repeated
+
+
+class CompiledSchema:
+    """A prompt schema compiled into a response schema and a row projector."""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.model_fields = [field for field in schema if field.name not in BASE_FIELDS]
+        properties = {f.name: _field_response_schema(f) for f in self.model_fields}
+        # Prompts may answer with {"error": ...} when the images do not apply.
+        properties.setdefault("error", {"type": "STRING", "nullable": True})
+        self.response_schema = {
+            "type": "OBJECT",
+            "properties": properties,
+            "property_ordering": list(properties),
+            "required": [f.name for f in self.model_fields],
+        }
+        self.generation_config = {
+            "response_mime_type": "application/json",
+            "response_schema": self.response_schema,
+        }
+        self._converters = [(f.name, _field_converter(f)) for f in self.model_fields]
+
+    def project(self, asset, analysis_data):
+        """
+        Builds a results row from an asset payload and the parsed model output.
+
+        Returns the row and the number of values that could not be coerced.
+        """
+        observations = asset.get("observations", [])
+        row = {
+            "asset_id": asset.get("asset_id"),
+            "location": asset.get("location"),
+            "detection_time": asset.get("detection_time"),
+            "observation_ids": [o["observation_id"] for o in observations],
+            "gcs_uris": [o["gcs_uri"] for o in observations],
+        }
+        failures = 0
+        for name, convert in self._converters:
+            value = analysis_data.get(name)
+            if value is None:
+                row[name] = None
+                continue
+            try:
+                row[name] = convert(value)
+            except (TypeError, ValueError):
+                row[name] = None
+                failures += 1
+        return row, failures
+
+
+def compile_schema(schema):
+    """Compiles a prompt's BigQuery schema."""
+    return CompiledSchema(schema)
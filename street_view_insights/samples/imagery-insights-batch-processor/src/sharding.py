@@ -0,0 +1,181 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Snapshot-based sharding for the populate path.
+
+Instead of re-running the grouped source query with `LIMIT n OFFSET m` for
+every shard, the grouped source is materialized once per run into a snapshot
+table. Each row gets a dense `shard_key` (1..N), and every shard reads only
+its own inclusive key range from that table.
+"""
+
+from google.cloud import bigquery
+
+SHARD_KEY_COLUMN = "shard_key"
+
+SNAPSHOT_QUERY = """
+CREATE OR REPLACE TABLE `{snapshot_table}`
+CLUSTER BY shard_key
+OPTIONS (
+  expiration_timestamp = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL {expiration_days} DAY)
+)
+AS
+SELECT
+  ROW_NUMBER() OVER (ORDER BY grouped.asset_id) AS shard_key,
+  grouped.*
+FROM (
+{source_query}
+) AS grouped
+"""
+
+SHARD_RANGE_QUERY = """
+SELECT
+  asset_id,
+  location,
+  detection_time,
+  observations
+FROM
+  `{snapshot_table}`
+WHERE
+  shard_key BETWEEN @shard_start AND @shard_end
+"""
+
+
+def snapshot_table_id(project, dataset, prefix, run_id):
+    """Returns the fully qualified snapshot table name for a run."""
+    return f"{project}.{dataset}.{prefix}{run_id.replace('-', '_')}"
+
+
+def create_source_snapshot(bq_client, source_query, snapshot_table, expiration_days):
+    """Materializes the grouped source query and returns its row count."""
+    query = SNAPSHOT_QUERY.format(
+        snapshot_table=snapshot_table,
+        source_query=source_query,
+        expiration_days=int(expiration_days),
+    )
+    bq_client.query(query).result()
+    return bq_client.get_table(snapshot_table).num_rows
+
+
+SOURCE_COUNT_QUERY = """
+SELECT
+  COUNT(*) AS total_rows
+FROM (
+{source_query}
+) AS grouped
+"""
+
+# Cuts the snapshot into key ranges holding about @target_observations
+# observations each, from the running total of observations in key order.
+SHARD_PLAN_QUERY = """
+SELECT
+  MIN(shard_key) AS shard_start,
+  MAX(shard_key) AS shard_end,
+  COUNT(*) AS assets,
+  SUM(observation_count) AS observations
+FROM (
+  SELECT
+    shard_key,
+    observation_count,
+    SUM(observation_count) OVER (ORDER BY shard_key) AS running_observations
+  FROM (
+    SELECT
+      shard_key,
+      IFNULL(ARRAY_LENGTH(observations), 0) AS observation_count
+    FROM
+      `{snapshot_table}`
+  )
+)
+GROUP BY
+  DIV(GREATEST(running_observations - 1, 0), @target_observations)
+ORDER BY
+  shard_start
+"""
+
+
+def count_source_rows(bq_client, source_query):
+    """Returns the number of grouped rows (assets) the source query returns."""
+    rows = bq_client.query(SOURCE_COUNT_QUERY.format(source_query=source_query)).result()
+    return next(iter(rows))["total_rows"]
+
+
+def plan_observation_shards(bq_client, snapshot_table, target_observations):
+    """
+    Splits a snapshot into key ranges of about `target_observations` each.
+
+    Every shard then carries roughly the same number of images, and so the
+    same amount of model work, however unevenly observations are spread
+    over assets. Returns `(start, end, assets, observations)` tuples.
+    """
+    if target_observations <= 0:
+        raise ValueError("target_observations must be positive.")
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("target_observations", "INT64", target_observations)
+        ]
+    )
+    rows = bq_client.query(
+        SHARD_PLAN_QUERY.format(snapshot_table=snapshot_table), job_config=job_config
+    ).result()
+    return [
+        (row["shard_start"], row["shard_end"], row["assets"], row["observations"])
+        for row in rows
+    ]
+
+
+def plan_shard_ranges(total_rows, shard_size):
+    """Splits shard keys 1..total_rows into inclusive (start, end) ranges."""
+    if shard_size <= 0:
+        raise ValueError("shard_size must be positive.")
+    return [
+        (start, min(start + shard_size - 1, total_rows))
+        for start in range(1, total_rows + 1, shard_size)
+    ]
+
+
+def shard_message(task_queue_id, snapshot_table, shard_start, shard_end):
+    """Builds the Pub/Sub message body for a snapshot shard."""
+    return {
+        "snapshot_table": snapshot_table,
+        "shard_start": shard_start,
+        "shard_end": shard_end,
+        "task_queue_id": task_queue_id,
+    }
+
+
+def is_snapshot_shard(data):
+    """Returns True if a shard message refers to a snapshot key range."""
+    return "snapshot_table" in data
+
+
+def query_shard(bq_client, data, source_query):
+    """
+    Runs the query for one shard message and returns the row iterator.
+
+    Snapshot shards read their key range from the materialized table; legacy
+    messages carrying `limit`/`offset` fall back to the source query.
+    """
+    if is_snapshot_shard(data):
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("shard_start", "INT64", data["shard_start"]),
+                bigquery.ScalarQueryParameter("shard_end", "INT64", data["shard_end"]),
+            ]
+        )
+        query = SHARD_RANGE_QUERY.format(snapshot_table=data["snapshot_table"])
+        return bq_client.query(query, job_config=job_config).result()
+
+    query = source_query + f" LIMIT {int(data['limit'])} OFFSET {int(data['offset'])}"
+    return bq_client.query(query).result()
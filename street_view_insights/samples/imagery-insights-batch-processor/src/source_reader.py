@@ -0,0 +1,308 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Source readers that stream shard data as Arrow record batches.
+
+`StorageSourceReader` reads snapshot key ranges through the BigQuery Storage
+Read API using several parallel read streams. `QuerySourceReader` runs the
+shard query and pages its result as Arrow. `ArrowFileSourceReader` serves
+batches from a local Arrow IPC or Parquet file so the populate path can be
+exercised offline.
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from sharding import SHARD_KEY_COLUMN, is_snapshot_shard, query_shard
+
+SOURCE_COLUMNS = ["asset_id", "location", "detection_time", "observations"]
+
+_END_OF_STREAM = object()
+
+
+class SourceReader:
+    """Base class for readers that yield one shard as Arrow record batches."""
+
+    def read_shard(self, data):
+        """Yields `pyarrow.RecordBatch` objects for a shard message."""
+        raise NotImplementedError
+
+
+class QuerySourceReader(SourceReader):
+    """Runs the shard query and pages the result as Arrow record batches."""
+
+    def __init__(self, bq_client, source_query, bqstorage_client=None):
+        self.bq_client = bq_client
+        self.source_query = source_query
+        self.bqstorage_client = bqstorage_client
+
+    def read_shard(self, data):
+        rows = query_shard(self.bq_client, data, self.source_query)
+        yield from rows.to_arrow_iterable(bqstorage_client=self.bqstorage_client)
+
+
+class StorageSourceReader(SourceReader):
+    """
+    Reads a snapshot key range with the BigQuery Storage Read API.
+
+    The read session is split into up to `max_streams` streams that are read
+    in parallel; their pages are handed to the caller through a bounded queue.
+    Legacy `limit`/`offset` shards cannot be expressed as a row restriction,
+    so they are delegated to `fallback`.
+    """
+
+    def __init__(self, read_client, project, max_streams=4, fallback=None, max_pending_batches=16):
+        self.read_client = read_client
+        self.project = project
+        self.max_streams = max_streams
+        self.fallback = fallback
+        self.max_pending_batches = max_pending_batches
+
+    def read_shard(self, data):
+        if not is_snapshot_shard(data):
+            if self.fallback is None:
+                raise ValueError("StorageSourceReader only reads snapshot shards.")
+            yield from self.fallback.read_shard(data)
+            return
+
+        session = self._create_session(data)
+        if not session.streams:
+            return
+
+        # Each reader can add at most a page and an end marker after cancellation.
+        pending = queue.Queue(
+            maxsize=max(self.max_pending_batches, 2 * len(session.streams))
+        )
+        cancelled = threading.Event()
+
+        def read_stream(stream_name):
+            try:
+                reader = self.read_client.read_rows(stream_name)
+                for page in reader.rows(session).pages:
+                    if cancelled.is_set():
+                        return
+                    pending.put(page.to_arrow())
+            except Exception as e:
+                pending.put(e)
+            finally:
+                pending.put(_END_OF_STREAM)
+
+        with ThreadPoolExecutor(max_workers=len(session.streams)) as executor:
+            for stream in session.streams:
+                executor.submit(read_stream, stream.name)
+            try:
+                remaining = len(session.streams)
+                while remaining:
+                    item = pending.get()
+                    if item is _END_OF_STREAM:
+                        remaining -= 1
+                    elif isinstance(item, Exception):
+                        raise item
+                    elif item.num_rows:
+                        yield item
+            finally:
+                cancelled.set()
+                # Unblock readers waiting on a full queue so the pool can exit.
+                while True:
+                    try:
+                        pending.get_nowait()
+                    except queue.Empty:
+                        break
+
+    def _create_session(self, data):
+        from google.cloud.bigquery_storage_v1 import types
+
+        project, dataset, table = data["snapshot_table"].split(".")
+        requested_session = types.ReadSession(
+            table=f"projects/{project}/datasets/{dataset}/tables/{table}",
+            data_format=types.DataFormat.ARROW,
+            read_options=types.ReadSession.TableReadOptions(
+                selected_fields=SOURCE_COLUMNS,
+                row_restriction=(
+                    f"{SHARD_KEY_COLUMN} BETWEEN {int(data['shard_start'])} "
+                    f"AND {int(data['shard_end'])}"
+                ),
+            ),
+        )
+        return self.read_client.create_read_session(
+            parent=f"projects/{self.project}",
+            read_session=requested_session,
+            max_stream_count=self.max_streams,
+        )
+
+
+class ArrowFileSourceReader(SourceReader):
+    """
+    Serves shards from a local Arrow IPC (`.arrow`) or Parquet file.
+
+    The file holds the same columns as the snapshot table, including
+    `shard_key`. Legacy offset shards are served by row position. An
+    in-memory `table` can be passed instead of a path.
+    """
+
+    def __init__(self, path=None, batch_size=1024, table=None):
+        self.path = path
+        self.batch_size = batch_size
+        self._table = table
+
+    @property
+    def table(self):
+        if self._table is None:
+            if self.path.endswith(".parquet"):
+                import pyarrow.parquet as pq
+
+                self._table = pq.read_table(self.path)
+            else:
+                with pa.memory_map(self.path) as source:
+                    self._table = pa.ipc.open_file(source).read_all()
+        return self._table
+
+    def read_shard(self, data):
+        table = self.table
+        if is_snapshot_shard(data):
+            keys = table.column(SHARD_KEY_COLUMN)
+            mask = pc.and_(
+                pc.greater_equal(keys, data["shard_start"]),
+                pc.less_equal(keys, data["shard_end"]),
+            )
+            table = table.filter(mask)
+        else:
+            table = table.slice(int(data["offset"]), int(data["limit"]))
+        yield from table.select(SOURCE_COLUMNS).to_batches(max_chunksize=self.batch_size)
+
+
+def make_source_reader(kind, bq_client, source_query, project, max_streams=4, path=None):
+    """Builds the configured source reader (`storage`, `query` or `arrow_file`)."""
+    if kind == "arrow_file":
+        return ArrowFileSourceReader(path)
+
+    query_reader = QuerySourceReader(bq_client, source_query)
+    if kind == "query":
+        return query_reader
+    if kind == "storage":
+        from google.cloud import bigquery_storage_v1
+
+        read_client = bigquery_storage_v1.BigQueryReadClient()
+        query_reader.bqstorage_client = read_client
+        return StorageSourceReader(
+            read_client, project, max_streams=max_streams, fallback=query_reader
+        )
+    raise ValueError(f"Unknown source reader: {kind}")
+
+
+def _location_values(column):
+    """Returns per-row location values from a struct or string column."""
+    if pa.types.is_struct(column.type):
+        latitudes = pc.struct_field(column, "latitude").to_pylist()
+        longitudes = pc.struct_field(column, "longitude").to_pylist()
+        return [
+            {"latitude": lat, "longitude": lng}
+            for lat, lng in zip(latitudes, longitudes)
+        ]
+    return pc.cast(column, pa.string()).to_pylist()
+
+
+def _observation_extras(flat):
+    """Returns `(name, values)` for the optional capture_time and heading fields."""
+    names = {flat.type.field(i).name for i in range(flat.type.num_fields)}
+    extras = []
+    if "capture_time" in names:
+        capture_time = pc.struct_field(flat, "capture_time")
+        if pa.types.is_timestamp(capture_time.type):
+            capture_time = pc.strftime(
+                pc.cast(capture_time, pa.timestamp("us", tz="UTC")),
+                format="%Y-%m-%dT%H:%M:%SZ",
+            )
+        extras.append(("capture_time", capture_time.to_pylist()))
+    if "camera_pose" in names:
+        camera_pose = pc.struct_field(flat, "camera_pose")
+        pose_type = camera_pose.type
+        if pa.types.is_struct(pose_type) and pose_type.get_field_index("heading") >= 0:
+            extras.append(("heading", pc.struct_field(camera_pose, "heading").to_pylist()))
+    return extras
+
+
+def sort_shard(batches):
+    """
+    Returns the record batches of a shard as one batch sorted by asset_id.
+
+    Parallel read streams return a shard's rows in no fixed order; sorting
+    them groups the same assets into the same task batches every time the
+    shard is read, so those batches keep their task names.
+    """
+    batches = list(batches)
+    if not batches:
+        return []
+    return pa.Table.from_batches(batches).sort_by("asset_id").combine_chunks().to_batches()
+
+
+def build_task_payloads(batch):
+    """
+    Builds `/process` task payloads from an Arrow record batch.
+
+    Every column, including the flattened observations, is converted to
+    Python in a single call, and payloads are assembled by slicing those
+    lists with the observation offsets instead of walking rows one by one.
+    """
+    if batch.num_rows == 0:
+        return []
+
+    asset_ids = batch.column("asset_id").to_pylist()
+    locations = _location_values(batch.column("location"))
+
+    detection_time = batch.column("detection_time")
+    if pa.types.is_timestamp(detection_time.type):
+        detection_time = pc.strftime(
+            pc.cast(detection_time, pa.timestamp("us", tz="UTC")),
+            format="%Y-%m-%dT%H:%M:%SZ",
+        )
+    detection_times = detection_time.to_pylist()
+
+    observations = batch.column("observations")
+    lengths = pc.fill_null(pc.list_value_length(observations), 0).to_pylist()
+    flat = observations.flatten()
+    observation_ids = pc.struct_field(flat, "observation_id").to_pylist()
+    gcs_uris = pc.struct_field(flat, "gcs_uri").to_pylist()
+    # Capture times and camera headings are optional; the observation
+    # selector uses them when the source query provides them.
+    extras = _observation_extras(flat)
+
+    payloads = []
+    start = 0
+    for asset_id, location, detection_time, length in zip(
+        asset_ids, locations, detection_times, lengths
+    ):
+        end = start + length
+        payloads.append(
+            {
+                "asset_id": asset_id,
+                "location": location,
+                "detection_time": detection_time,
+                "observations": [
+                    {
+                        "observation_id": observation_ids[i],
+                        "gcs_uri": gcs_uris[i],
+                        **{name: values[i] for name, values in extras},
+                    }
+                    for i in range(start, end)
+                ],
+            }
+        )
+        start = end
+    return payloads
@@ -0,0 +1,273 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per-task stage records, so a retried task resumes where it failed.
+
+`/process` saves every result row as `analyzed` before it is written to the
+results table, and marks it `written` once the sink has accepted it. Both
+are keyed by the Cloud Tasks task name, which stays the same across retries.
+A retry loads the records of its task, skips the analyses that already
+succeeded, and writes only the rows that are not yet `written`. A failed
+insert therefore does not pay for the Gemini calls again, and a retried
+batch does not rewrite the rows that were marked `written`. A row that landed
+without being marked (the task failed between the two) is written again.
+
+`SQLiteStageStore` is a local spool that only helps retries that reach the
+same instance; `BigQueryStageStore` shares the records between instances.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from google.cloud import bigquery
+
+ANALYZED = "analyzed"
+WRITTEN = "written"
+
+
+def _merge(records, asset_id, prompt_key, stage, row):
+    """Adds one record to `{asset_id: {prompt_key: (stage, row)}}`; `written` wins."""
+    stages = records.setdefault(asset_id, {})
+    if stages.get(prompt_key, (None, None))[0] != WRITTEN:
+        stages[prompt_key] = (stage, row)
+
+
+class StageStore:
+    """Base class for stage record backends."""
+
+    def load(self, task_name):
+        """Returns `{asset_id: {prompt_key: (stage, row)}}` for a task."""
+        raise NotImplementedError
+
+    def save_analyzed(self, task_name, rows):
+        """Records `(asset_id, prompt_key, row)` tuples as analyzed."""
+        raise NotImplementedError
+
+    def mark_written(self, task_name, keys):
+        """Records `(asset_id, prompt_key)` pairs as written."""
+        raise NotImplementedError
+
+    def clear(self, task_name):
+        """Drops the records of a task that has completed."""
+
+
+class SQLiteStageStore(StageStore):
+    """Stage records in a local SQLite file."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS stages (
+                task_name TEXT NOT NULL,
+                asset_id TEXT NOT NULL,
+                prompt_key TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                row TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (task_name, asset_id, prompt_key)
+            )
+            """
+        )
+        self._db.commit()
+
+    def load(self, task_name):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT asset_id, prompt_key, stage, row FROM stages WHERE task_name = ?",
+                (task_name,),
+            ).fetchall()
+        records = {}
+        for asset_id, prompt_key, stage, row in rows:
+            _merge(records, asset_id, prompt_key, stage, json.loads(row) if row else None)
+        return records
+
+    def save_analyzed(self, task_name, rows):
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (task_name, asset_id, prompt_key, ANALYZED, json.dumps(row), now)
+                    for asset_id, prompt_key, row in rows
+                ],
+            )
+            self._db.commit()
+
+    def mark_written(self, task_name, keys):
+        now = time.time()
+        with self._lock:
+            # The row is no longer needed once it has been written.
+            self._db.executemany(
+                "INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, NULL, ?)",
+                [(task_name, asset_id, prompt_key, WRITTEN, now) for asset_id, prompt_key in keys],
+            )
+            self._db.commit()
+
+    def clear(self, task_name):
+        with self._lock:
+            self._db.execute("DELETE FROM stages WHERE task_name = ?", (task_name,))
+            self._db.commit()
+
+
+class BigQueryStageStore(StageStore):
+    """
+    Stage records shared through a BigQuery table.
+
+    Records are appended with streaming inserts and never updated; a
+    `written` record supersedes the `analyzed` one. Old records expire with
+    their daily partition.
+    """
+
+    SCHEMA = [
+        bigquery.SchemaField("task_name", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("asset_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("prompt_key", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("stage", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("row", "STRING", mode="NULLABLE"),
+        bigquery.SchemaField("updated_at", "TIMESTAMP", mode="NULLABLE"),
+    ]
+
+    LOOKUP_QUERY = """
+    SELECT asset_id, prompt_key, stage, row
+    FROM `{table_id}`
+    WHERE task_name = @task_name
+    """
+
+    def __init__(self, bq_client, table_id, expiration_days=7):
+        self.bq_client = bq_client
+        self.table_id = table_id
+        self.expiration_days = expiration_days
+
+    def create_table(self):
+        """Creates the stage table, partitioned by day and clustered by task."""
+        table = bigquery.Table(self.table_id, schema=self.SCHEMA)
+        table.time_partitioning = bigquery.TimePartitioning(
+            field="updated_at", expiration_ms=self.expiration_days * 24 * 3600 * 1000
+        )
+        table.clustering_fields = ["task_name"]
+        self.bq_client.create_table(table, exists_ok=True)
+
+    def load(self, task_name):
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("task_name", "STRING", task_name)]
+        )
+        rows = self.bq_client.query(
+            self.LOOKUP_QUERY.format(table_id=self.table_id), job_config=job_config
+        ).result()
+        records = {}
+        for row in rows:
+            _merge(
+                records,
+                row["asset_id"],
+                row["prompt_key"],
+                row["stage"],
+                json.loads(row["row"]) if row["row"] else None,
+            )
+        return records
+
+    def save_analyzed(self, task_name, rows):
+        self._insert(
+            [
+                self._record(task_name, asset_id, prompt_key, ANALYZED, json.dumps(row))
+                for asset_id, prompt_key, row in rows
+            ]
+        )
+
+    def mark_written(self, task_name, keys):
+        self._insert(
+            [
+                self._record(task_name, asset_id, prompt_key, WRITTEN, None)
+                for asset_id, prompt_key in keys
+            ]
+        )
+
+    @staticmethod
+    def _record(task_name, asset_id, prompt_key, stage, row):
+        return {
+            "task_name": task_name,
+            "asset_id": asset_id,
+            "prompt_key": prompt_key,
+            "stage": stage,
+            "row": row,
+            "updated_at": time.time(),
+        }
+
+    def _insert(self, records):
+        if not records:
+            return
+        errors = self.bq_client.insert_rows_json(self.table_id, records)
+        if errors:
+            raise RuntimeError(f"Error saving stage records: {errors}")
+
+
+DEAD_LETTER_SCHEMA = [
+    bigquery.SchemaField("task_name", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("asset_id", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("retry_count", "INTEGER", mode="NULLABLE"),
+    bigquery.SchemaField("payload", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("error", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("failed_at", "TIMESTAMP", mode="NULLABLE"),
+]
+
+
+def ensure_dead_letter_table(bq_client, table_id):
+    """Creates the dead-letter table if it does not exist."""
+    bq_client.create_table(bigquery.Table(table_id, schema=DEAD_LETTER_SCHEMA), exists_ok=True)
+
+
+def dead_letter(bq_client, table_id, task_name, retry_count, failures):
+    """
+    Records assets that kept failing, with their payload and last error.
+
+    `failures` holds `(asset_payload, error)` pairs. Raises if the rows
+    cannot be written, so that the task is retried instead of dropped.
+    """
+    now = time.time()
+    errors = bq_client.insert_rows_json(
+        table_id,
+        [
+            {
+                "task_name": task_name,
+                "asset_id": asset.get("asset_id"),
+                "retry_count": retry_count,
+                "payload": json.dumps(asset),
+                "error": error,
+                "failed_at": now,
+            }
+            for asset, error in failures
+        ],
+    )
+    if errors:
+        raise RuntimeError(f"Error writing dead-letter rows: {errors}")
+
+
+def make_stage_store(kind, path=None, bq_client=None, table_id=None):
+    """Builds the configured stage store (`sqlite`, `bigquery` or `none`)."""
+    if kind == "none":
+        return None
+    if kind == "sqlite":
+        return SQLiteStageStore(path)
+    if kind == "bigquery":
+        return BigQueryStageStore(bq_client, table_id)
+    raise ValueError(f"Unknown stage store: {kind}")
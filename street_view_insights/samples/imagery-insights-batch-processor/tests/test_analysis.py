@@ -0,0 +1,190 @@
+import json
+import os
+import sys
+import threading
+import time
+
+from google.cloud import bigquery
+
+# Add the src directory to the Python path to allow importing 'analysis'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from analysis import (
+    analyze_asset,
+    analyze_asset_prompts,
+    parse_model_response,
+    run_batch,
+    task_assets,
+)
+from enqueuer import batch_payloads
+from schema_compiler import compile_schema
+
+SCHEMA = compile_schema(
+    [
+        bigquery.SchemaField("asset_id", "STRING"),
+        bigquery.SchemaField("observation_ids", "STRING", mode="REPEATED"),
+        bigquery.SchemaField("gcs_uris", "STRING", mode="REPEATED"),
+        bigquery.SchemaField("width", "INTEGER"),
+        bigquery.SchemaField("height", "INTEGER"),
+    ]
+)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class SlowModel:
+    """Records how many generate_content calls are in flight at once."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def generate_content(self, contents, generation_config=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return FakeResponse('```json\n{"width": 640, "height": 480}\n```')
+
+
+def make_asset(i):
+    return {
+        "asset_id": f"asset-{i}",
+        "observations": [
+            {"observation_id": f"obs-{i}", "gcs_uri": f"gs://bucket/{i}.jpg"}
+        ],
+    }
+
+
+def test_task_assets_accepts_single_and_batched_bodies():
+    asset = make_asset(1)
+    assert task_assets(asset) == [asset]
+    assert task_assets({"assets": [asset, asset]}) == [asset, asset]
+
+
+def test_batch_payloads_groups_assets():
+    bodies = list(batch_payloads((make_asset(i) for i in range(7)), 3))
+    assert [len(body["assets"]) for body in bodies] == [3, 3, 1]
+    assert list(batch_payloads([make_asset(0)], 1)) == [make_asset(0)]
+
+
+def test_parse_model_response_reports_invalid_json():
+    assert parse_model_response('```json {"a": 1} ```') == {"a": 1}
+    assert "error" in parse_model_response("not json")
+
+
+def test_run_batch_respects_concurrency_limit():
+    model = SlowModel()
+    assets = [make_asset(i) for i in range(12)]
+
+    outcomes = run_batch(
+        assets, lambda asset: analyze_asset(model, asset, "prompt", SCHEMA), 4
+    )
+
+    assert model.max_in_flight == 4
+    assert [o["asset_id"] for o in outcomes] == [a["asset_id"] for a in assets]
+    assert all(o["status"] == "ok" for o in outcomes)
+    assert outcomes[3]["result"] == {
+        "asset_id": "asset-3",
+        "location": None,
+        "detection_time": None,
+        "observation_ids": ["obs-3"],
+        "gcs_uris": ["gs://bucket/3.jpg"],
+        "width": 640,
+        "height": 480,
+    }
+
+
+def test_run_batch_reports_per_asset_failures():
+    def handler(asset):
+        if asset["asset_id"] == "asset-2":
+            raise RuntimeError("model unavailable")
+        return asset["asset_id"]
+
+    outcomes = run_batch([make_asset(i) for i in range(4)], handler, 4)
+
+    assert [o["status"] for o in outcomes] == ["ok", "ok", "error", "ok"]
+    assert outcomes[2]["error"] == "model unavailable"
+
+
+class PromptModel:
+    """Answers each prompt with its own JSON and records the image parts it saw."""
+
+    def __init__(self, fail_prompt=None):
+        self.fail_prompt = fail_prompt
+        self.parts = []
+        self.lock = threading.Lock()
+
+    def generate_content(self, contents, generation_config=None):
+        *image_parts, prompt = contents
+        with self.lock:
+            self.parts.append(image_parts)
+        time.sleep(0.02)
+        if prompt == self.fail_prompt:
+            raise RuntimeError("model unavailable")
+        return FakeResponse(json.dumps({"answer": prompt}))
+
+
+ANSWER_SCHEMA = compile_schema(
+    [
+        bigquery.SchemaField("asset_id", "STRING"),
+        bigquery.SchemaField("answer", "STRING"),
+    ]
+)
+ANALYSES = [
+    ("RESOLUTION", "resolution prompt", ANSWER_SCHEMA),
+    ("ROAD_SIGNS", "road signs prompt", ANSWER_SCHEMA),
+    ("UTILITY_POLE", "utility pole prompt", ANSWER_SCHEMA),
+]
+
+
+def test_analyze_asset_prompts_shares_image_parts():
+    model = PromptModel()
+
+    rows = analyze_asset_prompts(model, make_asset(1), ANALYSES)
+
+    assert {key: row["answer"] for key, row in rows.items()} == {
+        "RESOLUTION": "resolution prompt",
+        "ROAD_SIGNS": "road signs prompt",
+        "UTILITY_POLE": "utility pole prompt",
+    }
+    assert len(model.parts) == 3
+    assert all(parts[0] is model.parts[0][0] for parts in model.parts)
+
+
+def test_call_slots_bound_model_calls_across_prompts():
+    model = SlowModel()
+    call_slots = threading.BoundedSemaphore(4)
+
+    run_batch(
+        [make_asset(i) for i in range(12)],
+        lambda asset: analyze_asset_prompts(
+            model, asset, ANALYSES, call_slots=call_slots
+        ),
+        4,
+    )
+
+    # Without the shared slots, 4 assets with 3 prompts each make 12 calls at once.
+    assert model.max_in_flight == 4
+
+
+def test_analyze_asset_prompts_fails_the_asset_as_a_whole():
+    model = PromptModel(fail_prompt="road signs prompt")
+
+    outcomes = run_batch(
+        [make_asset(1)],
+        lambda asset: analyze_asset_prompts(model, asset, ANALYSES),
+        4,
+    )
+
+    assert outcomes[0]["status"] == "error"
+    assert outcomes[0]["error"] == "model unavailable"
@@ -0,0 +1,177 @@
+import json
+import os
+import sys
+
+import pyarrow as pa
+
+# Add the src directory to the Python path to allow importing 'asset_manifest'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from asset_manifest import (
+    AssetManifest,
+    ManifestCache,
+    reference_bodies,
+    write_manifest,
+    write_shard_manifests,
+)
+from checkpoint import build_shard_messages
+from emulator import Emulator, FakeGeminiModel, synthetic_source
+from rate_limiter import AdaptiveRateLimiter
+from sharding import SHARD_KEY_COLUMN, plan_shard_ranges, shard_message
+from source_reader import ArrowFileSourceReader, build_task_payloads
+
+
+def snapshot(num_assets):
+    table = synthetic_source(num_assets, observations_per_asset=3).sort_by("asset_id")
+    return table.add_column(
+        0, SHARD_KEY_COLUMN, pa.array(range(1, num_assets + 1), type=pa.int64())
+    )
+
+
+def test_manifest_rows_match_the_embedded_payloads(tmp_path):
+    table = snapshot(23)
+    path = str(tmp_path / "shard.arrow")
+    reader = ArrowFileSourceReader(table=table, batch_size=4)
+
+    rows = write_manifest(
+        reader.read_shard(shard_message("queue", "project.dataset.snapshot", 1, 23)), path, 10
+    )
+
+    assert rows == 23
+    expected = build_task_payloads(table.drop([SHARD_KEY_COLUMN]).combine_chunks().to_batches()[0])
+    manifest = AssetManifest(path)
+    assert manifest.num_rows == 23
+    # A range that spans two task batches is served from both record batches.
+    assert manifest.assets(8, 5) == expected[8:13]
+    assert manifest.assets(20, 3) == expected[20:]
+
+
+def test_a_task_decodes_only_its_own_batches(tmp_path):
+    path = str(tmp_path / "shard.arrow")
+    write_manifest(snapshot(30).to_batches(), path, 10)
+    manifest = AssetManifest(path)
+    decoded = []
+    get_batch = manifest._reader.get_batch
+
+    class Reader:
+        def get_batch(self, index):
+            decoded.append(index)
+            return get_batch(index)
+
+    manifest._reader = Reader()
+
+    assert manifest.assets(10, 10)[0]["asset_id"] == "asset-0000010"
+    assert decoded == [1]
+
+
+def test_shard_manifests_are_written_per_shard(tmp_path):
+    table = snapshot(23)
+    messages = [
+        shard_message("queue", "project.dataset.snapshot", start, end)
+        for start, end in plan_shard_ranges(23, 10)
+    ]
+    uris = [str(tmp_path / "run" / f"{i}.arrow") for i in range(len(messages))]
+
+    rows = write_shard_manifests(
+        ArrowFileSourceReader(table=table, batch_size=4), messages, uris, None, 4, max_workers=3
+    )
+
+    assert rows == [10, 10, 3]
+    assert [a["asset_id"] for a in AssetManifest(uris[1]).assets(0, 2)] == [
+        "asset-0000010",
+        "asset-0000011",
+    ]
+
+
+def test_reference_bodies_cover_a_shard_in_task_sized_ranges():
+    reference = {"uri": "gs://bucket/run.arrow", "offset": 40, "rows": 25}
+
+    bodies = list(reference_bodies(reference, 10))
+
+    assert [(b["manifest"]["offset"], b["manifest"]["rows"]) for b in bodies] == [
+        (40, 10),
+        (50, 10),
+        (60, 5),
+    ]
+    assert all(len(json.dumps(body)) < 100 for body in bodies)
+
+
+def test_shard_messages_carry_their_manifest():
+    state = {
+        "run_id": "run",
+        "task_queue_id": "queue",
+        "sharding_mode": "snapshot",
+        "snapshot_table": "project.dataset.snapshot",
+        "shard_size": 10,
+        "total_rows": 15,
+        "manifest": {
+            "shards": [["gs://bucket/run/1-10.arrow", 10], ["gs://bucket/run/11-15.arrow", 5]]
+        },
+    }
+
+    messages = build_shard_messages(state)
+
+    assert [m["manifest"] for m in messages] == [
+        {"uri": "gs://bucket/run/1-10.arrow", "offset": 0, "rows": 10},
+        {"uri": "gs://bucket/run/11-15.arrow", "offset": 0, "rows": 5},
+    ]
+
+
+def test_gs_manifests_are_read_once(tmp_path):
+    table = snapshot(5)
+    source = str(tmp_path / "source.arrow")
+    write_manifest(table.to_batches(), source, 2)
+    downloads = []
+
+    class Blob:
+        def download_as_bytes(self):
+            downloads.append(source)
+            with open(source, "rb") as f:
+                return f.read()
+
+    class Client:
+        def bucket(self, name):
+            return self
+
+        def blob(self, name):
+            return Blob()
+
+    cache = ManifestCache(Client)
+    body = {"manifest": {"uri": "gs://bucket/run.arrow", "offset": 1, "rows": 2}}
+
+    assert [a["asset_id"] for a in cache.task_assets(body)] == ["asset-0000001", "asset-0000002"]
+    assert len(cache.task_assets(body)) == 2
+    assert len(downloads) == 1
+
+
+def test_manifest_cache_keeps_the_most_recently_used(tmp_path):
+    paths = [str(tmp_path / f"{i}.arrow") for i in range(3)]
+    for path in paths:
+        write_manifest(snapshot(3).to_batches(), path, 2)
+    cache = ManifestCache(None, max_manifests=2)
+
+    first = cache.manifest(paths[0])
+    cache.manifest(paths[1])
+    assert cache.manifest(paths[0]) is first
+    cache.manifest(paths[2])
+
+    assert list(cache._manifests) == [paths[0], paths[2]]
+
+
+def test_emulated_reference_run_writes_every_asset_once():
+    emulator = Emulator(
+        synthetic_source(60, observations_per_asset=5),
+        FakeGeminiModel(median_latency=0.0, error_rate=0.1, seed=3),
+        rate_limiter=AdaptiveRateLimiter(initial_rate=10000, max_rate=10000, burst=100),
+        sink_flush_seconds=0.01,
+        task_payload="reference",
+    )
+
+    report = emulator.run()
+
+    assert report["assets"] == 60
+    assert report["failed_tasks"] == 0
+    assert report["rows_written"] == {key: 60 for key in report["rows_written"]}
+    assert report["task_body_bytes_max"] < 200
@@ -0,0 +1,272 @@
+import json
+import os
+import sys
+
+import pyarrow as pa
+import pytest
+
+# Add the src directory to the Python path to allow importing 'batch_prediction'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+import batch_prediction
+import metrics
+from batch_prediction import (
+    BatchPredictionRunner,
+    LocalBatchBackend,
+    build_request,
+    request_key,
+)
+from config import BIGQUERY_SCHEMAS, PROMPTS
+from emulator import synthetic_source
+from schema_compiler import compile_schema
+from sharding import SHARD_KEY_COLUMN, plan_shard_ranges, shard_message
+from source_reader import ArrowFileSourceReader
+
+ANALYSES = [
+    (key, PROMPTS[key], compile_schema(BIGQUERY_SCHEMAS[key]))
+    for key in ("ROAD_SIGNS", "UTILITY_POLE")
+]
+
+
+def snapshot_reader(num_assets):
+    table = synthetic_source(num_assets).sort_by("asset_id")
+    table = table.add_column(
+        0, SHARD_KEY_COLUMN, pa.array(range(1, num_assets + 1), type=pa.int64())
+    )
+    return ArrowFileSourceReader(table=table)
+
+
+def shard_messages(num_assets, shard_size):
+    return [
+        shard_message(None, "project.dataset.snapshot", start, end)
+        for start, end in plan_shard_ranges(num_assets, shard_size)
+    ]
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.results = []
+
+    def __call__(self, results):
+        self.results.extend(results)
+        return {}
+
+
+def test_request_key_matches_the_echoed_snake_case_request():
+    asset = {
+        "asset_id": "a",
+        "observations": [{"observation_id": "o", "gcs_uri": "gs://bucket/a/0.jpg"}],
+    }
+    line = build_request(asset, "Describe the sign.", ANALYSES[0][2])
+    echoed = {
+        "contents": [
+            {
+                "role": "user",
+                "parts": [
+                    {"file_data": {"file_uri": "gs://bucket/a/0.jpg", "mime_type": "image/jpeg"}},
+                    {"text": "Describe the sign."},
+                ],
+            }
+        ]
+    }
+
+    assert request_key(line["request"]) == request_key(echoed)
+    assert line["request"]["generationConfig"]["responseSchema"] == ANALYSES[0][2].response_schema
+
+
+def test_batch_run_writes_a_row_per_asset_and_prompt(tmp_path):
+    def respond(request):
+        uris = [part["fileData"]["fileUri"] for part in request["contents"][0]["parts"][:-1]]
+        if "asset-0000007" in uris[0]:
+            raise RuntimeError("RESOURCE_EXHAUSTED")
+        return json.dumps({"category": "Stop", "sign_quality": "Good", "material": "Wood"})
+
+    writer = RecordingWriter()
+    dead_letters = []
+    completed = []
+    runner = BatchPredictionRunner(
+        LocalBatchBackend(str(tmp_path), respond),
+        snapshot_reader(30),
+        ANALYSES,
+        writer,
+        dead_letter=lambda job, failures: dead_letters.extend(failures),
+        on_shard_complete=lambda message, requests: completed.append(requests),
+        max_requests=25,
+    )
+
+    stats = runner.run("run", shard_messages(30, 10))
+
+    # Three shards of 20 requests each do not fit two to a job.
+    assert stats.jobs == 3
+    assert stats.requests == 60
+    assert completed == [20, 20, 20]
+    assert [asset["asset_id"] for asset, _ in dead_letters] == ["asset-0000007"]
+    assert "RESOURCE_EXHAUSTED" in dead_letters[0][1]
+    assert len(writer.results) == 29
+    rows = writer.results[0]
+    assert set(rows) == {"ROAD_SIGNS", "UTILITY_POLE"}
+    assert rows["ROAD_SIGNS"]["category"] == "Stop"
+    assert rows["ROAD_SIGNS"]["asset_id"] == "asset-0000000"
+    assert rows["ROAD_SIGNS"]["gcs_uris"] == [
+        "gs://emulated-imagery/asset-0000000/0.jpg",
+        "gs://emulated-imagery/asset-0000000/1.jpg",
+    ]
+
+
+def test_local_evaluators_skip_the_batch_job(tmp_path):
+    writer = RecordingWriter()
+    runner = BatchPredictionRunner(
+        LocalBatchBackend(str(tmp_path)),
+        snapshot_reader(5),
+        ANALYSES[:1],
+        writer,
+        evaluators={"ROAD_SIGNS": lambda asset: {"category": "Yield"}},
+    )
+
+    stats = runner.run("run", shard_messages(5, 5))
+
+    assert stats.jobs == 0
+    assert stats.evaluated == 5
+    assert [rows["ROAD_SIGNS"]["category"] for rows in writer.results] == ["Yield"] * 5
+
+
+def test_submitted_jobs_are_collected_after_a_restart(tmp_path):
+    backend = LocalBatchBackend(str(tmp_path))
+    first = BatchPredictionRunner(backend, snapshot_reader(10), ANALYSES[:1], RecordingWriter())
+    jobs = json.loads(json.dumps(first.submit("run", shard_messages(10, 5))))
+
+    writer = RecordingWriter()
+    resumed = BatchPredictionRunner(backend, snapshot_reader(10), ANALYSES[:1], writer)
+    stats = resumed.run("run", [], jobs)
+
+    assert stats.completed_shards == 2
+    assert len(writer.results) == 10
+
+
+def test_jobs_are_saved_as_soon_as_they_are_submitted(tmp_path):
+    class CrashingBackend(LocalBatchBackend):
+        def submit(self, input_uris, output_prefix):
+            if self.submitted:
+                raise RuntimeError("crashed")
+            self.submitted += 1
+            return super().submit(input_uris, output_prefix)
+
+    backend = CrashingBackend(str(tmp_path))
+    backend.submitted = 0
+    saved = []
+    runner = BatchPredictionRunner(
+        backend, snapshot_reader(10), ANALYSES[:1], RecordingWriter(), max_requests=5
+    )
+
+    with pytest.raises(RuntimeError):
+        runner.run("run", shard_messages(10, 5), save_job=lambda job: saved.append(json.dumps(job)))
+
+    # The first job is on record before the second shard's job is submitted.
+    assert [json.loads(job)["shards"] for job in saved] == [shard_messages(10, 5)[:1]]
+
+
+def test_resumed_collection_does_not_rewrite_written_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_prediction, "WRITE_CHUNK_SIZE", 3)
+
+    class CrashingWriter(RecordingWriter):
+        def __call__(self, results):
+            if len(self.results) >= 6:
+                raise RuntimeError("crashed")
+            return super().__call__(results)
+
+    backend = LocalBatchBackend(str(tmp_path))
+    first_writer = CrashingWriter()
+    saved = {}
+    first = BatchPredictionRunner(backend, snapshot_reader(10), ANALYSES[:1], first_writer)
+    with pytest.raises(RuntimeError):
+        first.run("run", shard_messages(10, 10), save_job=lambda job: saved.update(job=json.dumps(job)))
+
+    writer = RecordingWriter()
+    resumed = BatchPredictionRunner(backend, snapshot_reader(10), ANALYSES[:1], writer)
+    resumed.run("run", [], [json.loads(saved["job"])])
+
+    written = first_writer.results + writer.results
+    assert sorted(rows["ROAD_SIGNS"]["asset_id"] for rows in written) == [
+        f"asset-{i:07d}" for i in range(10)
+    ]
+
+
+def test_failures_without_a_dead_letter_table_are_counted_as_failed(tmp_path):
+    def respond(request):
+        raise RuntimeError("RESOURCE_EXHAUSTED")
+
+    runner = BatchPredictionRunner(
+        LocalBatchBackend(str(tmp_path), respond), snapshot_reader(2), ANALYSES[:1], RecordingWriter()
+    )
+
+    stats = runner.run("run", shard_messages(2, 2))
+
+    assert stats.failed_assets == 2
+    assert 'imagery_assets_total{status="failed"}' in metrics.REGISTRY.render()
+
+
+
+class RejectingWriter:
+    """Rejects the UTILITY_POLE row of `asset_id` on its first `times` writes."""
+
+    def __init__(self, asset_id, times):
+        self.asset_id = asset_id
+        self.times = times
+        self.calls = []
+
+    def __call__(self, results):
+        self.calls.append(results)
+        for index, rows in enumerate(results):
+            row = rows.get("UTILITY_POLE")
+            if row is not None and row["asset_id"] == self.asset_id and self.times:
+                self.times -= 1
+                return {"UTILITY_POLE": [{"index": index, "errors": ["backendError"]}]}
+        return {}
+
+
+def test_rejected_rows_are_written_again_before_dead_lettering(tmp_path):
+    writer = RejectingWriter("asset-0000003", times=2)
+    dead_letters = []
+    sleeps = []
+    runner = BatchPredictionRunner(
+        LocalBatchBackend(str(tmp_path)),
+        snapshot_reader(5),
+        ANALYSES,
+        writer,
+        dead_letter=lambda job, failures: dead_letters.extend(failures),
+        sleep=sleeps.append,
+    )
+
+    stats = runner.run("run", shard_messages(5, 5))
+
+    assert dead_letters == []
+    assert stats.assets == 5
+    assert len(sleeps) == 2
+    # Only the rejected row is written again.
+    assert [len(results) for results in writer.calls] == [5, 1, 1]
+    assert writer.calls[1] == [{"UTILITY_POLE": writer.calls[0][3]["UTILITY_POLE"]}]
+
+
+def test_rows_rejected_on_every_attempt_are_dead_lettered(tmp_path):
+    writer = RejectingWriter("asset-0000003", times=10)
+    dead_letters = []
+    runner = BatchPredictionRunner(
+        LocalBatchBackend(str(tmp_path)),
+        snapshot_reader(5),
+        ANALYSES,
+        writer,
+        dead_letter=lambda job, failures: dead_letters.extend(failures),
+        write_attempts=3,
+        sleep=lambda seconds: None,
+    )
+
+    stats = runner.run("run", shard_messages(5, 5))
+
+    assert len(writer.calls) == 3
+    assert [(asset["asset_id"], error) for asset, error in dead_letters] == [
+        ("asset-0000003", "UTILITY_POLE: ['backendError']")
+    ]
+    assert stats.assets == 4
+    assert stats.failed_assets == 1
@@ -0,0 +1,104 @@
+import os
+import sys
+
+from google.api_core import exceptions
+
+# Add the src directory to the Python path to allow importing 'checkpoint'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from checkpoint import (
+    build_shard_messages,
+    incremental_source_query,
+    load_state,
+    pending_shard_messages,
+    record_shard_complete,
+    save_state,
+    shard_id,
+)
+
+SNAPSHOT_STATE = {
+    "run_id": "20260101",
+    "task_queue_id": "queue-20260101",
+    "sharding_mode": "snapshot",
+    "snapshot_table": "project.dataset.source_snapshot_20260101",
+    "total_rows": 25,
+    "shard_size": 10,
+}
+
+
+class FakeBigQueryClient:
+    def __init__(self, tables=()):
+        self.tables = set(tables)
+        self.inserted = []
+
+    def get_table(self, table_id):
+        if table_id not in self.tables:
+            raise exceptions.NotFound(table_id)
+        return table_id
+
+    def insert_rows_json(self, table_id, rows):
+        self.inserted.append((table_id, rows))
+        return []
+
+
+def test_shard_ids_are_stable_per_mode():
+    assert shard_id({"snapshot_table": "t", "shard_start": 11, "shard_end": 20}) == "11-20"
+    assert shard_id({"limit": 10, "offset": 30}) == "offset-30"
+
+
+def test_build_shard_messages_tags_every_shard_with_the_run():
+    messages = build_shard_messages(SNAPSHOT_STATE)
+
+    assert [shard_id(m) for m in messages] == ["1-10", "11-20", "21-25"]
+    assert all(m["run_id"] == "20260101" for m in messages)
+
+    offset_state = dict(SNAPSHOT_STATE, sharding_mode="offset")
+    assert [m["offset"] for m in build_shard_messages(offset_state)] == [0, 10, 20]
+
+
+def test_build_shard_messages_uses_planned_ranges():
+    state = dict(SNAPSHOT_STATE, shard_ranges=[[1, 3], [4, 20], [21, 25]])
+
+    assert [shard_id(m) for m in build_shard_messages(state)] == ["1-3", "4-20", "21-25"]
+
+
+def test_pending_shard_messages_skip_checkpointed_shards():
+    pending = pending_shard_messages(SNAPSHOT_STATE, {"1-10", "21-25"})
+
+    assert [shard_id(m) for m in pending] == ["11-20"]
+
+
+def test_state_round_trip(tmp_path):
+    path = str(tmp_path / "populate_state.json")
+    assert load_state(path) is None
+
+    save_state(path, SNAPSHOT_STATE)
+
+    assert load_state(path) == SNAPSHOT_STATE
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_record_shard_complete_skips_untracked_messages():
+    client = FakeBigQueryClient()
+    record_shard_complete(client, "checkpoints", {"offset": 0, "limit": 10}, 10)
+    assert client.inserted == []
+
+    record_shard_complete(client, "checkpoints", build_shard_messages(SNAPSHOT_STATE)[1], 10)
+    (table_id, rows), = client.inserted
+    assert rows[0]["shard_id"] == "11-20"
+    assert rows[0]["tasks_created"] == 10
+
+
+def test_incremental_query_needs_every_results_table():
+    source_query = "SELECT asset_id, detection_time FROM source"
+    tables = ["results_resolution", "results_road_signs"]
+
+    client = FakeBigQueryClient({"results_resolution"})
+    assert incremental_source_query(client, source_query, tables) == source_query
+
+    query = incremental_source_query(FakeBigQueryClient(tables), source_query, tables)
+    assert source_query in query
+    assert query.count("EXISTS") == 2
+    assert "`results_resolution`" in query and "`results_road_signs`" in query
@@ -0,0 +1,66 @@
+import os
+import sys
+
+# Add the src directory to the Python path to allow importing 'emulator'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from emulator import Emulator, FakeGeminiModel, percentile, synthetic_source
+from rate_limiter import AdaptiveRateLimiter
+
+
+def fast_limiter():
+    return AdaptiveRateLimiter(initial_rate=10000, max_rate=10000, burst=100)
+
+
+def test_emulated_run_writes_every_asset():
+    emulator = Emulator(
+        synthetic_source(120),
+        FakeGeminiModel(median_latency=0.0),
+        rate_limiter=fast_limiter(),
+        sink_flush_seconds=0.01,
+    )
+
+    report = emulator.run(timeout=60)
+
+    assert report["source_rows"] == 120
+    assert report["assets"] == 120
+    assert report["failed_tasks"] == 0
+    assert report["rows_written"] == {key: 120 for key in report["rows_written"]}
+    assert report["gemini_calls"] == 120
+    assert {"setup", "shard", "populate", "process", "gemini", "write"} <= set(report["stages"])
+    # Every shard was checkpointed by the populate service.
+    checkpoints = [
+        rows for table_id, rows in emulator.bq_client.rows.items() if "checkpoint" in table_id
+    ]
+    assert len(checkpoints[0]) == report["shards"]
+
+
+def test_failed_tasks_are_retried_by_the_queue():
+    emulator = Emulator(
+        synthetic_source(40),
+        FakeGeminiModel(median_latency=0.0, error_rate=0.1, seed=3),
+        rate_limiter=fast_limiter(),
+        sink_flush_seconds=0.01,
+        max_attempts=50,
+    )
+
+    report = emulator.run(timeout=60)
+
+    assert report["assets"] == 40
+    assert report["failed_tasks"] == 0
+    assert report["task_retries"] > 0
+    # A retried batch re-analyzes only its failed assets: the staged results of
+    # the others are not analyzed or written again, so every asset is written once.
+    assert report["gemini_calls"] > 40
+    assert report["rows_written"] and all(
+        rows == 40 for rows in report["rows_written"].values()
+    )
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([], 0.5) == 0.0
@@ -0,0 +1,134 @@
+import json
+import os
+import sys
+import threading
+
+from google.api_core import exceptions
+
+# Add the src directory to the Python path to allow importing 'enqueuer'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from emulator import synthetic_source
+from enqueuer import TaskEnqueuer, batch_payloads, build_task, task_id
+from source_reader import build_task_payloads, sort_shard
+
+
+class FlakyTasksClient:
+    """Fails the first `failures` attempts for every task, then succeeds."""
+
+    def __init__(self, failures=0, error=exceptions.ServiceUnavailable):
+        self.failures = failures
+        self.error = error
+        self.attempts = {}
+        self.created = []
+        self.lock = threading.Lock()
+
+    def create_task(self, parent, task):
+        asset_id = json.loads(task["http_request"]["body"])["asset_id"]
+        with self.lock:
+            self.attempts[asset_id] = self.attempts.get(asset_id, 0) + 1
+            if self.attempts[asset_id] <= self.failures:
+                raise self.error("try again")
+            self.created.append((parent, asset_id))
+
+
+def make_tasks(count):
+    return (
+        build_task({"asset_id": f"asset-{i}"}, "https://service", "sa@example.com")
+        for i in range(count)
+    )
+
+
+def test_enqueue_creates_every_task_once():
+    client = FlakyTasksClient()
+    enqueuer = TaskEnqueuer(client, max_workers=8, sleep=lambda _: None)
+
+    stats = enqueuer.enqueue("queue", make_tasks(500))
+
+    assert stats.created == 500
+    assert stats.failed == 0
+    assert sorted(asset_id for _, asset_id in client.created) == sorted(
+        f"asset-{i}" for i in range(500)
+    )
+    assert {parent for parent, _ in client.created} == {"queue"}
+
+
+def test_enqueue_retries_transient_errors():
+    client = FlakyTasksClient(failures=2)
+    enqueuer = TaskEnqueuer(client, max_workers=4, max_attempts=3, sleep=lambda _: None)
+
+    stats = enqueuer.enqueue("queue", make_tasks(20))
+
+    assert stats.created == 20
+    assert stats.retries == 40
+    assert stats.failed == 0
+
+
+def test_enqueue_reports_exhausted_and_permanent_failures():
+    transient = FlakyTasksClient(failures=5)
+    stats = TaskEnqueuer(transient, max_attempts=3, sleep=lambda _: None).enqueue(
+        "queue", make_tasks(4)
+    )
+    assert (stats.created, stats.failed, stats.retries) == (0, 4, 8)
+
+    permanent = FlakyTasksClient(failures=1, error=exceptions.PermissionDenied)
+    stats = TaskEnqueuer(permanent, sleep=lambda _: None).enqueue("queue", make_tasks(4))
+    assert (stats.created, stats.failed, stats.retries) == (0, 4, 0)
+    assert all(attempts == 1 for attempts in permanent.attempts.values())
+
+
+class AmbiguousTasksClient:
+    """Creates every task but reports a deadline on the first attempt."""
+
+    def __init__(self):
+        self.tasks = {}
+        self.lock = threading.Lock()
+
+    def create_task(self, parent, task):
+        with self.lock:
+            if task["name"] in self.tasks:
+                raise exceptions.AlreadyExists("task exists")
+            self.tasks[task["name"]] = task
+        raise exceptions.DeadlineExceeded("deadline exceeded")
+
+
+def test_retried_tasks_are_deduplicated_by_name():
+    client = AmbiguousTasksClient()
+    tasks = [
+        build_task({"asset_id": f"asset-{i}"}, "https://service", "sa@example.com", "queue")
+        for i in range(10)
+    ]
+
+    stats = TaskEnqueuer(client, sleep=lambda _: None).enqueue("queue", tasks)
+
+    assert (stats.created, stats.existing, stats.retries, stats.failed) == (10, 10, 10, 0)
+    assert len(client.tasks) == 10
+
+
+def test_task_id_identifies_the_batch():
+    batch = {"assets": [{"asset_id": "b"}, {"asset_id": "a"}]}
+    reordered = {"assets": [{"asset_id": "a"}, {"asset_id": "b"}]}
+    reference = {"manifest": {"uri": "gs://bucket/run.arrow", "offset": 10, "rows": 5}}
+
+    assert task_id(batch) == task_id(reordered)
+    assert task_id(batch) != task_id({"assets": [{"asset_id": "a"}]})
+    assert task_id(reference) != task_id(
+        {"manifest": {"uri": "gs://bucket/run.arrow", "offset": 15, "rows": 5}}
+    )
+    task = build_task(batch, "https://service", "sa@example.com", "queue")
+    assert task["name"] == f"queue/tasks/{task_id(batch)}"
+
+
+def test_a_shard_read_in_another_order_gets_the_same_task_names():
+    batches = synthetic_source(25).to_batches(max_chunksize=4)
+    shuffled = [batch.take(list(reversed(range(batch.num_rows)))) for batch in batches[::-1]]
+
+    def names(shard):
+        payloads = (p for batch in sort_shard(shard) for p in build_task_payloads(batch))
+        return [task_id(body) for body in batch_payloads(payloads, 10)]
+
+    assert names(shuffled) == names(batches)
+    assert len(set(names(batches))) == 3
+    assert sort_shard([]) == []
@@ -0,0 +1,114 @@
+import os
+import struct
+import sys
+
+import pytest
+from google.cloud import bigquery
+
+# Add the src directory to the Python path to allow importing 'image_header'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from analysis import analyze_asset
+from config import EVALUATORS
+from image_header import HeaderReader, IncompleteHeader, jpeg_dimensions
+from schema_compiler import compile_schema
+
+
+def segment(marker, payload):
+    return struct.pack(">BBH", 0xFF, marker, len(payload) + 2) + payload
+
+
+def make_jpeg(width, height, sof=0xC0, exif_bytes=0):
+    """A JPEG header (SOI, APP0, optional APP1, DQT, SOF) followed by filler scan data."""
+    data = b"\xff\xd8" + segment(0xE0, b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00")
+    if exif_bytes:
+        data += segment(0xE1, b"Exif\x00\x00" + b"\x00" * (exif_bytes - 6))
+    data += segment(0xDB, b"\x00" + bytes(range(64)))
+    data += segment(sof, struct.pack(">BHHB", 8, height, width, 3) + b"\x01\x22\x00" * 3)
+    data += segment(0xDA, b"\x03\x01\x00\x02\x11\x03\x11\x00\x3f\x00")
+    return data + b"\x12\x34" * 2048 + b"\xff\xd9"
+
+
+class FakeHeaderReader(HeaderReader):
+    """Serves in-memory objects and records the ranges that were read."""
+
+    def __init__(self, objects, **kwargs):
+        super().__init__(None, **kwargs)
+        self.objects = objects
+        self.reads = []
+
+    def read_range(self, gcs_uri, start, end):
+        self.reads.append((start, end))
+        return self.objects[gcs_uri][start:end]
+
+
+def test_jpeg_dimensions_baseline_and_progressive():
+    assert jpeg_dimensions(make_jpeg(640, 480)) == (640, 480)
+    assert jpeg_dimensions(make_jpeg(8192, 4096, sof=0xC2)) == (8192, 4096)
+
+
+def test_jpeg_dimensions_reports_missing_bytes():
+    data = make_jpeg(640, 480, exif_bytes=30000)
+    with pytest.raises(IncompleteHeader) as e:
+        jpeg_dimensions(data[:4096])
+    assert 30000 < e.value.needed < 30100
+    assert jpeg_dimensions(data[: e.value.needed + 200]) == (640, 480)
+
+
+def test_jpeg_dimensions_rejects_other_formats():
+    with pytest.raises(ValueError):
+        jpeg_dimensions(b"\x89PNG\r\n\x1a\n" + b"\x00" * 32)
+
+
+def test_header_reader_reads_only_the_header():
+    jpeg = make_jpeg(1920, 1080, exif_bytes=20000)
+    reader = FakeHeaderReader({"gs://bucket/a.jpg": jpeg}, initial_bytes=1024)
+
+    assert reader.jpeg_dimensions("gs://bucket/a.jpg") == (1920, 1080)
+    assert reader.reads[0] == (0, 1024)
+    assert reader.reads[-1][1] < 25000
+
+
+def test_header_reader_gives_up_on_truncated_objects():
+    jpeg = make_jpeg(640, 480)[:90]
+    reader = FakeHeaderReader({"gs://bucket/a.jpg": jpeg}, initial_bytes=64)
+
+    with pytest.raises(ValueError):
+        reader.jpeg_dimensions("gs://bucket/a.jpg")
+
+
+def test_resolution_evaluator_replaces_the_model():
+    class NoModel:
+        def generate_content(self, contents, generation_config=None):
+            raise AssertionError("the model should not be called")
+
+    reader = FakeHeaderReader({"gs://bucket/a.jpg": make_jpeg(4096, 2048)})
+    asset = {
+        "asset_id": "asset-1",
+        "observations": [{"observation_id": "obs-1", "gcs_uri": "gs://bucket/a.jpg"}],
+    }
+    schema = compile_schema(
+        [
+            bigquery.SchemaField("width", "INTEGER"),
+            bigquery.SchemaField("height", "INTEGER"),
+        ]
+    )
+
+    row = analyze_asset(
+        NoModel(),
+        asset,
+        "prompt",
+        schema,
+        evaluator=lambda asset: EVALUATORS["RESOLUTION"](asset, reader),
+    )
+
+    assert (row["width"], row["height"]) == (4096, 2048)
+
+
+def test_resolution_evaluator_falls_back_to_the_model():
+    reader = FakeHeaderReader({"gs://bucket/a.png": b"\x89PNG\r\n\x1a\n" + b"\x00" * 64})
+    asset = {"asset_id": "asset-1", "observations": [{"gcs_uri": "gs://bucket/a.png"}]}
+
+    assert EVALUATORS["RESOLUTION"](asset, reader) is None
@@ -0,0 +1,47 @@
+import os
+import sys
+import threading
+import time
+
+# Add the src directory to the Python path to allow importing 'clients'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from clients import lazy
+from config import PromptAttributes, PromptRegistry
+
+
+def test_lazy_builds_once_across_threads():
+    calls = []
+
+    @lazy
+    def client():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_prompt_modules_load_on_first_use(tmp_path):
+    (tmp_path / "first.py").write_text('PROMPT = "first"\nSCHEMA = ["a"]\n')
+    (tmp_path / "second.py").write_text('raise RuntimeError("should not be loaded")\n')
+    (tmp_path / "notes.txt").write_text("not a prompt")
+    registry = PromptRegistry(str(tmp_path))
+    prompts = PromptAttributes(registry, "PROMPT")
+    evaluators = PromptAttributes(registry, "EVALUATOR")
+
+    assert registry.keys == ["FIRST", "SECOND"]
+    assert prompts["FIRST"] == "first"
+    assert "FIRST" not in evaluators
+    assert "MISSING" not in prompts
+    assert list(registry._modules) == ["FIRST"]
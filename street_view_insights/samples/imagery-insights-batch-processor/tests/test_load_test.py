@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+
+# Add the benchmarks directory to the Python path to allow importing 'load_test'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+)
+
+import load_test
+
+
+class StubServer:
+    """A local /process that records each request and answers after `delay` seconds."""
+
+    def __init__(self, delay=0.0, status=200):
+        self.requests = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                arrived = time.perf_counter()
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                with stub.lock:
+                    stub.requests.append(
+                        {
+                            "path": self.path,
+                            "body": body,
+                            "headers": dict(self.headers),
+                            "at": arrived,
+                        }
+                    )
+                time.sleep(delay)
+                payload = json.dumps({"results": [{"status": "success"}]}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def write_corpus(tmp_path, bodies):
+    path = tmp_path / "corpus.jsonl"
+    path.write_text("".join(body + "\n" for body in bodies))
+    return str(path)
+
+
+def replay_args(corpus, url, **overrides):
+    args = {
+        "corpus": corpus,
+        "url": url,
+        "qps": None,
+        "concurrency": None,
+        "arrival": "uniform",
+        "requests": None,
+        "duration": None,
+        "timeout": 10.0,
+        "max_connections": 100,
+        "task_names": False,
+        "auth": False,
+        "seed": 0,
+    }
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def test_replay_sends_the_recorded_bodies_unchanged(tmp_path):
+    # Key order and spacing must survive, as the bodies are sent as recorded.
+    bodies = ['{"assets": [{"asset_id": "b", "observations": []}]}', '{"asset_id":"a"}']
+    corpus = write_corpus(tmp_path, bodies)
+    with StubServer() as server:
+        args = replay_args(corpus, server.url, concurrency=1, requests=5, task_names=True)
+        report = asyncio.run(load_test.replay(args))
+
+    assert [request["body"].decode("utf-8") for request in server.requests] == [
+        bodies[i % 2] for i in range(5)
+    ]
+    assert {request["path"] for request in server.requests} == {"/process"}
+    assert [request["headers"]["X-CloudTasks-TaskName"] for request in server.requests] == [
+        f"{i:010d}" for i in range(5)
+    ]
+    assert len({request["headers"]["X-CloudTasks-QueueName"] for request in server.requests}) == 1
+    assert report["sent"] == report["completed"] == 5
+    assert report["failed"] == 0
+    assert report["asset_statuses"] == {"success": 5}
+
+
+def test_open_loop_starts_requests_on_schedule_while_the_service_lags(tmp_path):
+    # Each answer takes far longer than the gap between requests.
+    corpus = write_corpus(tmp_path, ["{}"])
+    with StubServer(delay=0.5) as server:
+        start = time.perf_counter()
+        report = asyncio.run(
+            load_test.replay(replay_args(corpus, server.url, qps=20, requests=10))
+        )
+
+    arrivals = sorted(request["at"] - start for request in server.requests)
+    assert len(arrivals) == 10
+    # Request i is scheduled i / qps after the first.
+    for i, arrival in enumerate(arrivals):
+        assert i / 20 - 0.02 <= arrival <= i / 20 + 0.2
+    # Latency counts from the scheduled start, so it includes the service's delay.
+    assert report["latency_ms"]["p50"] >= 500
+    assert report["elapsed_seconds"] < 2.0
+
+
+def test_closed_loop_keeps_the_concurrency_in_flight(tmp_path):
+    corpus = write_corpus(tmp_path, ["{}"])
+    with StubServer(delay=0.2, status=503) as server:
+        report = asyncio.run(
+            load_test.replay(replay_args(corpus, server.url, concurrency=4, requests=8))
+        )
+
+    arrivals = sorted(request["at"] for request in server.requests)
+    # Two waves of four: the second starts once the first is answered.
+    assert arrivals[3] - arrivals[0] < 0.1
+    assert arrivals[4] - arrivals[0] >= 0.2
+    assert report["errors"] == {"HTTP 503": 8}
+    assert report["failed"] == 8
@@ -0,0 +1,144 @@
+import os
+import sys
+import threading
+
+import pyarrow as pa
+
+# Add the src directory to the Python path to allow importing 'local_runner'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from analysis import task_assets
+from emulator import Emulator, FakeGeminiModel, synthetic_source
+from local_runner import LocalRunner, task_name, use_local_stores
+from rate_limiter import AdaptiveRateLimiter
+from response_cache import SQLiteResponseCache
+from stage_store import SQLiteStageStore
+from sharding import SHARD_KEY_COLUMN, plan_shard_ranges, shard_message
+from source_reader import ArrowFileSourceReader
+
+
+def snapshot_reader(num_assets):
+    table = synthetic_source(num_assets).sort_by("asset_id")
+    table = table.add_column(
+        0, SHARD_KEY_COLUMN, pa.array(range(1, num_assets + 1), type=pa.int64())
+    )
+    return ArrowFileSourceReader(table=table, batch_size=7)
+
+
+def shard_messages(num_assets, shard_size):
+    return [
+        shard_message("queue", "project.dataset.snapshot", start, end)
+        for start, end in plan_shard_ranges(num_assets, shard_size)
+    ]
+
+
+class RecordingTask:
+    """Records the assets of every batch and the most batches running at once."""
+
+    def __init__(self, fail_asset_ids=()):
+        self.fail_asset_ids = set(fail_asset_ids)
+        self.asset_ids = []
+        self.names = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, name, body, resumed=False):
+        assets = task_assets(body)
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.names.append(name)
+            self.asset_ids.extend(asset["asset_id"] for asset in assets)
+        statuses = {"ok": 0, "error": 0}
+        for asset in assets:
+            statuses["error" if asset["asset_id"] in self.fail_asset_ids else "ok"] += 1
+        with self._lock:
+            self.running -= 1
+        return {"statuses": statuses, "retries": 0, "seconds": 0.0}
+
+
+def test_every_asset_is_processed_once_and_shards_are_checkpointed():
+    task = RecordingTask()
+    completed = []
+    runner = LocalRunner(
+        snapshot_reader(95),
+        "run",
+        workers=3,
+        max_in_flight=4,
+        batch_size=4,
+        on_shard_complete=lambda message, tasks: completed.append((message, tasks)),
+        task=task,
+    )
+
+    stats = runner.run(shard_messages(95, 20))
+
+    assert sorted(task.asset_ids) == sorted(f"asset-{i:07d}" for i in range(95))
+    assert task.max_running <= 3
+    assert len(set(task.names)) == len(task.names) == stats.tasks
+    assert stats.assets["ok"] == 95
+    assert stats.completed_shards == stats.shards == 5
+    assert [tasks for _, tasks in completed] == [5, 5, 5, 5, 4]
+
+
+def test_shards_with_failed_assets_are_left_for_resume():
+    task = RecordingTask(fail_asset_ids=["asset-0000025"])
+    completed = []
+    runner = LocalRunner(
+        snapshot_reader(60),
+        "run",
+        workers=2,
+        batch_size=5,
+        on_shard_complete=lambda message, tasks: completed.append(message),
+        task=task,
+    )
+
+    stats = runner.run(shard_messages(60, 20))
+
+    assert stats.failed_tasks == 1
+    assert stats.completed_shards == 2
+    assert [(m["shard_start"], m["shard_end"]) for m in completed] == [(1, 20), (41, 60)]
+
+
+def test_task_names_depend_on_the_batch_assets_not_their_order():
+    message = shard_message("queue", "project.dataset.snapshot", 1, 10)
+    first = {"assets": [{"asset_id": "a"}, {"asset_id": "b"}]}
+    second = {"assets": [{"asset_id": "b"}, {"asset_id": "a"}]}
+
+    assert task_name("run", message, first) == task_name("run", message, second)
+    assert task_name("run", message, first).startswith("local-run/1-10/")
+
+
+def test_emulated_local_run_writes_every_asset_once():
+    emulator = Emulator(
+        synthetic_source(80),
+        FakeGeminiModel(median_latency=0.0, error_rate=0.1, seed=5),
+        rate_limiter=AdaptiveRateLimiter(initial_rate=10000, max_rate=10000, burst=100),
+        sink_flush_seconds=0.01,
+    )
+
+    report = emulator.run_local(workers=4)
+
+    assert report["assets"] == 80
+    assert report["failed_tasks"] == 0
+    assert report["completed_shards"] == report["shards"]
+    assert report["task_retries"] > 0
+    # Staged rows are not rewritten when a batch is retried.
+    assert report["rows_written"] == {key: 80 for key in report["rows_written"]}
+
+
+def test_local_runs_keep_cache_and_stages_on_disk(tmp_path, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "RESPONSE_CACHE_PATH", str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(main, "STAGE_STORE_PATH", str(tmp_path / "stages.sqlite"))
+    try:
+        use_local_stores()
+
+        assert isinstance(main.get_response_cache(), SQLiteResponseCache)
+        assert isinstance(main.get_stage_store(), SQLiteStageStore)
+    finally:
+        main.get_response_cache.reset()
+        main.get_stage_store.reset()
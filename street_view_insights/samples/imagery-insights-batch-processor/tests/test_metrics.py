@@ -0,0 +1,165 @@
+import os
+import sys
+
+from google.api_core import exceptions
+
+from google.cloud import bigquery
+
+# Add the src directory to the Python path to allow importing 'metrics'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+import metrics
+from analysis import analyze_asset
+from metrics import Counter, Gauge, Histogram, Registry, timed_batches
+from rate_limiter import AdaptiveRateLimiter, RateLimitedModel
+from schema_compiler import compile_schema
+
+
+def test_counter_renders_one_sample_per_label_set():
+    registry = Registry()
+    counter = Counter("requests_total", "Requests.", ["prompt_key"], registry=registry)
+    counter.labels("ROAD_SIGNS").inc()
+    counter.labels("ROAD_SIGNS").inc(2)
+    counter.labels('SAY "HI"').inc()
+
+    text = registry.render()
+
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{prompt_key="ROAD_SIGNS"} 3' in text
+    assert 'requests_total{prompt_key="SAY \\"HI\\""} 1' in text
+
+
+def test_label_values_and_help_text_are_escaped():
+    registry = Registry()
+    counter = Counter("paths_total", "Paths under C:\\data,\nby kind.", ["path"], registry=registry)
+    counter.labels('C:\\new\nline "quoted"').inc()
+
+    lines = registry.render().splitlines()
+
+    assert lines[0] == "# HELP paths_total Paths under C:\\\\data,\\nby kind."
+    assert lines[2] == 'paths_total{path="C:\\\\new\\nline \\"quoted\\""} 1'
+
+
+def test_labeled_histogram_renders_bucket_sum_and_count_per_label_set():
+    registry = Registry()
+    histogram = Histogram(
+        "call_seconds", "Calls.", ["prompt_key"], buckets=(1, 0.5), registry=registry
+    )
+    histogram.labels("B").observe(0.25)
+    histogram.labels("A").observe(2)
+    histogram.labels("A").observe(0.75)
+
+    samples = [line for line in registry.render().splitlines() if not line.startswith("#")]
+
+    assert samples == [
+        'call_seconds_bucket{prompt_key="A",le="0.5"} 0',
+        'call_seconds_bucket{prompt_key="A",le="1"} 1',
+        'call_seconds_bucket{prompt_key="A",le="+Inf"} 2',
+        'call_seconds_sum{prompt_key="A"} 2.75',
+        'call_seconds_count{prompt_key="A"} 2',
+        'call_seconds_bucket{prompt_key="B",le="0.5"} 1',
+        'call_seconds_bucket{prompt_key="B",le="1"} 1',
+        'call_seconds_bucket{prompt_key="B",le="+Inf"} 1',
+        'call_seconds_sum{prompt_key="B"} 0.25',
+        'call_seconds_count{prompt_key="B"} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1), registry=registry)
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_sum 3.65" in lines
+    assert "latency_seconds_count 4" in lines
+
+
+def test_gauge_reads_its_function_when_rendered():
+    registry = Registry()
+    values = [1.5]
+    Gauge("rate", "Rate.", lambda: values[0], registry=registry)
+    values[0] = 4
+    assert "rate 4" in registry.render().splitlines()
+
+
+def test_labels_must_match_label_names():
+    counter = Counter("x_total", "X.", ["a", "b"], registry=None)
+    try:
+        counter.labels("only-one")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected a ValueError")
+
+
+def test_timed_batches_observes_once_per_shard():
+    histogram = Histogram("read_seconds", "Reads.", registry=None)
+    assert list(timed_batches(iter([1, 2, 3]), histogram.labels())) == [1, 2, 3]
+    assert sum(histogram.labels().counts) == 1
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def generate_content(self, contents, generation_config=None):
+        return FakeResponse("not json")
+
+
+def test_parse_failures_are_counted_per_prompt():
+    schema = compile_schema([bigquery.SchemaField("width", "INTEGER")])
+    counter = metrics.PARSE_FAILURES.labels("METRICS_TEST")
+    before = counter.value
+
+    analyze_asset(
+        FakeModel(),
+        {"asset_id": "a", "observations": []},
+        "prompt",
+        schema,
+        image_parts=[],
+        prompt_key="METRICS_TEST",
+    )
+
+    assert counter.value == before + 1
+    assert 'imagery_parse_failures_total{prompt_key="METRICS_TEST"}' in metrics.REGISTRY.render()
+
+
+class ThrottledOnceModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, contents, generation_config=None):
+        self.calls += 1
+        if self.calls == 1:
+            raise exceptions.ResourceExhausted("quota exceeded")
+        return FakeResponse('{"width": 640}')
+
+
+def test_gemini_retries_are_counted_per_prompt():
+    schema = compile_schema([bigquery.SchemaField("width", "INTEGER")])
+    limiter = AdaptiveRateLimiter(initial_rate=1000, max_rate=1000, burst=10, sleep=lambda _: None)
+    model = RateLimitedModel(ThrottledOnceModel(), limiter, initial_backoff=0)
+    counter = metrics.RETRIES.labels("gemini", "RETRY_TEST")
+    before = counter.value
+
+    analyze_asset(
+        model,
+        {"asset_id": "a", "observations": []},
+        "prompt",
+        schema,
+        image_parts=[],
+        prompt_key="RETRY_TEST",
+    )
+
+    assert counter.value == before + 1
+    assert 'imagery_retries_total{stage="gemini",prompt_key="RETRY_TEST"}' in metrics.REGISTRY.render()
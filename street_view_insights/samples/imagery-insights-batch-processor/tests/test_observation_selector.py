@@ -0,0 +1,168 @@
+import os
+import sys
+
+import pyarrow as pa
+import pytest
+
+# Add the src directory to the Python path to allow importing 'observation_selector'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+import metrics
+from observation_selector import ObservationSelector
+from source_reader import build_task_payloads
+
+
+def observation(index, capture_time=None, heading=None, gcs_uri=None):
+    result = {
+        "observation_id": f"o{index}",
+        "gcs_uri": gcs_uri or f"gs://bucket/a/{index}.jpg",
+    }
+    if capture_time is not None:
+        result["capture_time"] = capture_time
+    if heading is not None:
+        result["heading"] = heading
+    return result
+
+
+def ids(asset):
+    return [o["observation_id"] for o in asset["observations"]]
+
+
+def test_duplicate_images_are_dropped_with_every_strategy():
+    asset = {
+        "asset_id": "a",
+        "observations": [
+            observation(0),
+            observation(1, gcs_uri="gs://bucket/a/0.jpg"),
+            observation(2),
+        ],
+    }
+
+    selector = ObservationSelector("all")
+
+    assert ids(selector(asset)) == ["o0", "o2"]
+    assert selector.stats()["duplicates"] == 1
+    assert selector.stats()["dropped"] == 0
+
+
+def test_dropped_images_are_counted_without_logging(capsys):
+    asset = {
+        "asset_id": "a",
+        "observations": [observation(i, f"2025-01-0{i + 1}T00:00:00Z") for i in range(4)],
+    }
+    dropped = metrics.OBSERVATIONS.labels("dropped")
+    before = dropped.value
+
+    ObservationSelector("most_recent", max_images=1)(asset)
+
+    assert dropped.value == before + 3
+    assert capsys.readouterr().out == ""
+
+
+def test_most_recent_keeps_the_latest_captures():
+    asset = {
+        "asset_id": "a",
+        "observations": [
+            observation(0, "2024-01-01T00:00:00Z"),
+            observation(1),
+            observation(2, "2025-06-01T00:00:00Z"),
+            observation(3, "2024-09-01T00:00:00Z"),
+        ],
+    }
+    selector = ObservationSelector("most_recent", max_images=3)
+
+    assert ids(selector(asset)) == ["o2", "o3", "o0"]
+    assert selector.stats() == {
+        "strategy": "most_recent",
+        "max_images": 3,
+        "selected": 3,
+        "duplicates": 0,
+        "dropped": 1,
+    }
+
+
+def test_heading_diverse_covers_opposite_sides():
+    # Three views from the front, one from behind and one from the side.
+    asset = {
+        "asset_id": "a",
+        "observations": [
+            observation(0, "2025-01-05T00:00:00Z", heading=10),
+            observation(1, "2025-01-04T00:00:00Z", heading=15),
+            observation(2, "2025-01-03T00:00:00Z", heading=355),
+            observation(3, "2025-01-02T00:00:00Z", heading=190),
+            observation(4, "2025-01-01T00:00:00Z", heading=100),
+        ],
+    }
+
+    assert ids(ObservationSelector("heading_diverse", max_images=2)(asset)) == ["o0", "o3"]
+    assert ids(ObservationSelector("heading_diverse", max_images=3)(asset)) == ["o0", "o3", "o4"]
+
+
+def test_heading_diverse_fills_with_recent_observations_without_a_pose():
+    asset = {
+        "asset_id": "a",
+        "observations": [
+            observation(0, "2025-01-03T00:00:00Z"),
+            observation(1, "2025-01-02T00:00:00Z", heading=90),
+            observation(2, "2025-01-01T00:00:00Z"),
+        ],
+    }
+
+    assert ids(ObservationSelector("heading_diverse", max_images=2)(asset)) == ["o0", "o1"]
+
+
+def test_unchanged_assets_are_returned_as_is():
+    asset = {"asset_id": "a", "observations": [observation(0), observation(1)]}
+
+    assert ObservationSelector("most_recent", max_images=2)(asset) is asset
+
+
+def test_rejects_unknown_strategies():
+    with pytest.raises(ValueError):
+        ObservationSelector("random")
+    with pytest.raises(ValueError):
+        ObservationSelector("most_recent", max_images=0)
+
+
+def test_payloads_carry_capture_time_and_heading_when_present():
+    observation_type = pa.struct(
+        [
+            ("observation_id", pa.string()),
+            ("gcs_uri", pa.string()),
+            ("capture_time", pa.timestamp("us", tz="UTC")),
+            ("camera_pose", pa.struct([("heading", pa.float64()), ("pitch", pa.float64())])),
+        ]
+    )
+    batch = pa.record_batch(
+        {
+            "asset_id": ["a"],
+            "location": ["POINT(0 0)"],
+            "detection_time": ["2025-01-01T00:00:00Z"],
+            "observations": pa.array(
+                [
+                    [
+                        {
+                            "observation_id": "o0",
+                            "gcs_uri": "gs://bucket/a/0.jpg",
+                            "capture_time": None,
+                            "camera_pose": {"heading": 42.5, "pitch": 0.0},
+                        }
+                    ]
+                ],
+                type=pa.list_(observation_type),
+            ),
+        }
+    )
+
+    (payload,) = build_task_payloads(batch)
+
+    assert payload["observations"] == [
+        {
+            "observation_id": "o0",
+            "gcs_uri": "gs://bucket/a/0.jpg",
+            "capture_time": None,
+            "heading": 42.5,
+        }
+    ]
@@ -0,0 +1,186 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions
+from google.protobuf import duration_pb2
+from google.rpc import error_details_pb2
+
+# Add the src directory to the Python path to allow importing 'rate_limiter'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from rate_limiter import AdaptiveRateLimiter, RateLimitedModel, retry_delay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class ThrottlingModel:
+    """Admits `capacity` calls per second of the fake clock and throttles the rest."""
+
+    def __init__(self, clock, capacity, latency=0.0, retry_hint=None):
+        self.clock = clock
+        self.capacity = capacity
+        self.latency = latency
+        self.retry_hint = retry_hint
+        self.calls = 0
+        self.throttled = 0
+        self._window = None
+        self._admitted = 0
+
+    def generate_content(self, contents):
+        self.calls += 1
+        window = int(self.clock())
+        if window != self._window:
+            self._window, self._admitted = window, 0
+        if self._admitted >= self.capacity:
+            self.throttled += 1
+            details = []
+            if self.retry_hint is not None:
+                details = [
+                    error_details_pb2.RetryInfo(
+                        retry_delay=duration_pb2.Duration(seconds=self.retry_hint)
+                    )
+                ]
+            raise exceptions.ResourceExhausted("quota exceeded", details=details)
+        self._admitted += 1
+        self.clock.sleep(self.latency)
+        return contents
+
+
+def make_limiter(clock, **kwargs):
+    return AdaptiveRateLimiter(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_rate_increases_additively_and_decreases_multiplicatively():
+    clock = FakeClock()
+    limiter = make_limiter(clock, initial_rate=4.0, max_rate=5.0, additive_increase=1.0)
+
+    limiter.on_success(0.1)
+    assert limiter.current_rate == pytest.approx(4.25)
+    for _ in range(10):
+        limiter.on_success(0.1)
+    assert limiter.current_rate == 5.0
+
+    limiter.on_throttle()
+    assert limiter.current_rate == pytest.approx(2.5, abs=0.01)
+    # A burst of throttles seen within one interval only decreases once.
+    limiter.on_throttle()
+    assert limiter.current_rate == pytest.approx(2.5, abs=0.01)
+    assert limiter.throttled == 2
+
+
+def test_slow_calls_decrease_the_rate():
+    clock = FakeClock()
+    limiter = make_limiter(clock, initial_rate=4.0, latency_target=2.0)
+
+    limiter.on_success(5.0)
+
+    assert limiter.current_rate == pytest.approx(2.0)
+
+
+def test_rate_never_drops_below_minimum():
+    clock = FakeClock()
+    limiter = make_limiter(clock, initial_rate=1.0, min_rate=0.5)
+
+    for _ in range(5):
+        clock.sleep(10)
+        limiter.on_throttle()
+
+    assert limiter.current_rate == 0.5
+
+
+def test_acquire_paces_calls_and_honors_retry_hint():
+    clock = FakeClock()
+    limiter = make_limiter(clock, initial_rate=2.0)
+
+    for _ in range(5):
+        limiter.acquire()
+    assert clock.now == pytest.approx(2.0)
+
+    limiter.on_throttle(retry_after=10)
+    limiter.acquire()
+    assert clock.now >= 12.0
+
+
+def test_retry_delay_reads_retry_info_and_retry_after():
+    error = exceptions.ResourceExhausted(
+        "quota",
+        details=[error_details_pb2.RetryInfo(retry_delay=duration_pb2.Duration(seconds=3, nanos=500000000))],
+    )
+    assert retry_delay(error) == 3.5
+
+    class Response:
+        headers = {"Retry-After": "7"}
+
+    assert retry_delay(exceptions.TooManyRequests("slow down", response=Response())) == 7.0
+    assert retry_delay(exceptions.ResourceExhausted("quota")) is None
+
+
+def test_rate_limited_model_converges_below_capacity():
+    clock = FakeClock()
+    fake = ThrottlingModel(clock, capacity=4, retry_hint=1)
+    limiter = make_limiter(clock, initial_rate=20.0, additive_increase=0.5)
+    model = RateLimitedModel(fake, limiter, max_attempts=10)
+
+    for i in range(200):
+        assert model.generate_content(i) == i
+
+    assert fake.throttled > 0
+    # Once adapted, nearly every call is admitted on its first attempt.
+    assert fake.throttled < 20
+    assert limiter.current_rate < 8
+
+
+def test_rate_limited_model_gives_up_after_max_attempts():
+    clock = FakeClock()
+    fake = ThrottlingModel(clock, capacity=0)
+    model = RateLimitedModel(fake, make_limiter(clock), max_attempts=3)
+
+    with pytest.raises(exceptions.ResourceExhausted):
+        model.generate_content("contents")
+    assert fake.calls == 3
+
+
+def test_other_errors_are_not_retried():
+    class BrokenModel:
+        calls = 0
+
+        def generate_content(self, contents):
+            self.calls += 1
+            raise exceptions.InvalidArgument("bad image")
+
+    clock = FakeClock()
+    broken = BrokenModel()
+    model = RateLimitedModel(broken, make_limiter(clock))
+
+    with pytest.raises(exceptions.InvalidArgument):
+        model.generate_content("contents")
+    assert broken.calls == 1
+
+
+def test_queue_depth_counts_waiting_callers():
+    limiter = AdaptiveRateLimiter(initial_rate=1.0, min_rate=1.0, max_rate=1.0)
+    limiter.acquire()
+    threads = [threading.Thread(target=limiter.acquire) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+
+    assert limiter.queue_depth == 3
+    assert limiter.stats()["queue_depth"] == 3
+    for thread in threads:
+        thread.join(timeout=5)
+    assert limiter.queue_depth == 0
@@ -0,0 +1,98 @@
+import os
+import sys
+
+from google.cloud import bigquery
+
+# Add the src directory to the Python path to allow importing 'response_cache'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from analysis import analyze_asset
+from response_cache import SQLiteResponseCache, cache_key
+from schema_compiler import compile_schema
+
+SCHEMA = compile_schema(
+    [
+        bigquery.SchemaField("asset_id", "STRING"),
+        bigquery.SchemaField("width", "INTEGER"),
+    ]
+)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class CountingModel:
+    def __init__(self, text='{"width": 640}'):
+        self.text = text
+        self.calls = 0
+
+    def generate_content(self, contents, generation_config=None):
+        self.calls += 1
+        return FakeResponse(self.text)
+
+
+def make_asset(uris):
+    return {
+        "asset_id": "asset-1",
+        "observations": [
+            {"observation_id": f"obs-{i}", "gcs_uri": uri} for i, uri in enumerate(uris)
+        ],
+    }
+
+
+def test_cache_key_covers_every_input():
+    base = cache_key("gemini", "prompt", ["gs://a", "gs://b"], {"temperature": 0})
+    assert base == cache_key("gemini", "prompt", ["gs://a", "gs://b"], {"temperature": 0})
+    assert base != cache_key("other", "prompt", ["gs://a", "gs://b"], {"temperature": 0})
+    assert base != cache_key("gemini", "prompt 2", ["gs://a", "gs://b"], {"temperature": 0})
+    assert base != cache_key("gemini", "prompt", ["gs://b", "gs://a"], {"temperature": 0})
+    assert base != cache_key("gemini", "prompt", ["gs://a", "gs://b"], {"temperature": 1})
+
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    cache = SQLiteResponseCache("gemini", str(tmp_path / "cache.sqlite"), max_bytes=300)
+    for name in ["a", "b", "c"]:
+        cache.put(name, name * 100)
+    assert cache.get("a") == "a" * 100  # refresh "a" so "b" is the oldest
+
+    cache.put("d", "d" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("d") is not None
+    assert cache.size_bytes <= 300
+    assert len(cache) == 3
+
+
+def test_sqlite_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    SQLiteResponseCache("gemini", path).put("key", "value")
+    assert SQLiteResponseCache("gemini", path).get("key") == "value"
+
+
+def test_cache_hit_skips_model_call(tmp_path):
+    cache = SQLiteResponseCache("gemini", str(tmp_path / "cache.sqlite"))
+    model = CountingModel()
+    asset = make_asset(["gs://bucket/1.jpg", "gs://bucket/2.jpg"])
+
+    first = analyze_asset(model, asset, "prompt", SCHEMA, cache=cache)
+    second = analyze_asset(model, asset, "prompt", SCHEMA, cache=cache)
+
+    assert model.calls == 1
+    assert first == second and second["width"] == 640
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_unparseable_responses_are_not_cached(tmp_path):
+    cache = SQLiteResponseCache("gemini", str(tmp_path / "cache.sqlite"))
+    model = CountingModel(text="not json")
+    asset = make_asset(["gs://bucket/1.jpg"])
+
+    analyze_asset(model, asset, "prompt", SCHEMA, cache=cache)
+    analyze_asset(model, asset, "prompt", SCHEMA, cache=cache)
+
+    assert model.calls == 2
+    assert len(cache) == 0
@@ -0,0 +1,276 @@
+import os
+import sys
+import threading
+import time
+
+import grpc
+import pytest
+from google.api_core import exceptions
+from google.cloud import bigquery
+
+# Add the src directory to the Python path to allow importing 'result_sink'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from result_sink import BufferedResultWriter, RowSerializer, StorageWriteTransport
+
+SCHEMA = [
+    bigquery.SchemaField("asset_id", "STRING"),
+    bigquery.SchemaField(
+        "location",
+        "RECORD",
+        fields=[
+            bigquery.SchemaField("latitude", "FLOAT"),
+            bigquery.SchemaField("longitude", "FLOAT"),
+        ],
+    ),
+    bigquery.SchemaField("observation_ids", "STRING", mode="REPEATED"),
+    bigquery.SchemaField("detection_time", "TIMESTAMP"),
+    bigquery.SchemaField("width", "INTEGER"),
+]
+
+
+def make_row(i):
+    return {
+        "asset_id": f"asset-{i}",
+        "location": {"latitude": 34.5, "longitude": 135.5},
+        "observation_ids": [f"obs-{i}-a", f"obs-{i}-b"],
+        "detection_time": "2025-05-27T03:17:03Z",
+        "width": str(640 + i),
+    }
+
+
+class FakeAppendResponse:
+    def __init__(self, row_errors=()):
+        self.row_errors = list(row_errors)
+
+
+def reject_rows(row_errors):
+    """Fails an append the way AppendRowsStream does for rejected rows."""
+    return exceptions.from_grpc_status(
+        grpc.StatusCode.INVALID_ARGUMENT,
+        "Rows are invalid.",
+        response=FakeAppendResponse(row_errors),
+    )
+
+
+class FakeRowError:
+    def __init__(self, index, message):
+        self.index = index
+        self.message = message
+
+
+class FakeStreamTransport(StorageWriteTransport):
+    """A committed stream kept in memory, keyed by offset like BigQuery's."""
+
+    def __init__(self, serializer, lose_first_response=False, reject_first_row=None):
+        super().__init__(None, "project.dataset.table", serializer, max_attempts=3)
+        self.stream = []
+        self.appends = []
+        self.lose_first_response = lose_first_response
+        self.reject_first_row = reject_first_row
+
+    def _send(self, serialized_rows, offset):
+        self.appends.append((offset, len(serialized_rows)))
+        if offset < len(self.stream):
+            raise exceptions.AlreadyExists("offset already written")
+        if offset > len(self.stream):
+            raise exceptions.OutOfRange("offset beyond end of stream")
+        if self.reject_first_row is not None:
+            # BigQuery rejects the whole request when any row is invalid.
+            index, self.reject_first_row = self.reject_first_row, None
+            raise reject_rows([FakeRowError(index, "invalid row")])
+        self.stream.extend(serialized_rows)
+        if self.lose_first_response:
+            # The rows landed but the client never saw the acknowledgement.
+            self.lose_first_response = False
+            raise exceptions.DeadlineExceeded("response lost")
+        return FakeAppendResponse()
+
+    def _close_connection(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeWriteClient:
+    """Finalizes and commits pending streams held by a FakePendingTransport."""
+
+    def __init__(self):
+        self.streams = {}
+        self.committed = []
+
+    def finalize_write_stream(self, name):
+        pass
+
+    def batch_commit_write_streams(self, request):
+        for name in request.write_streams:
+            self.committed.extend(self.streams.pop(name))
+        return FakeCommitResponse()
+
+
+class FakeCommitResponse:
+    stream_errors = []
+
+
+class FakePendingTransport(StorageWriteTransport):
+    """Pending streams kept in memory; rows are visible once committed."""
+
+    def __init__(self, serializer, fail_appends=0):
+        self.client = FakeWriteClient()
+        super().__init__(self.client, "project.dataset.table", serializer, mode="pending", max_attempts=1)
+        self.fail_appends = fail_appends
+
+    def _send(self, serialized_rows, offset):
+        if self._write_stream is None:
+            self._write_stream = f"stream-{len(self.client.committed)}-{len(self.client.streams)}"
+            self.client.streams[self._write_stream] = []
+        stream = self.client.streams[self._write_stream]
+        assert offset == len(stream)
+        stream.extend(serialized_rows)
+        if self.fail_appends:
+            # The rows landed on the stream but the append is reported failed.
+            self.fail_appends -= 1
+            raise exceptions.DeadlineExceeded("response lost")
+        return FakeAppendResponse()
+
+    def _close_connection(self):
+        pass
+
+
+def test_row_serializer_round_trip():
+    serializer = RowSerializer(SCHEMA)
+    message = serializer.message_class.FromString(serializer.serialize(make_row(1)))
+
+    assert message.asset_id == "asset-1"
+    assert message.location.latitude == 34.5
+    assert list(message.observation_ids) == ["obs-1-a", "obs-1-b"]
+    assert message.detection_time == 1748315823000000
+    assert message.width == 641
+
+
+def test_row_serializer_rejects_bad_values():
+    serializer = RowSerializer(SCHEMA)
+    with pytest.raises(ValueError):
+        serializer.serialize({"asset_id": "a", "width": "wide"})
+
+
+def test_writer_flushes_at_row_threshold_with_contiguous_offsets():
+    transport = FakeStreamTransport(RowSerializer(SCHEMA))
+    # A flush may take more than max_rows rows, so the interval picks up any tail.
+    writer = BufferedResultWriter(transport, max_rows=4, flush_interval=0.2)
+
+    threads = [
+        threading.Thread(target=writer.write, args=([make_row(i), make_row(i + 100)],))
+        for i in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert len(transport.stream) == 12
+    offsets = [offset for offset, _ in transport.appends]
+    assert offsets == sorted(offsets) and offsets[0] == 0
+    assert max(size for _, size in transport.appends) >= 4
+    writer.close()
+
+
+def test_writer_flushes_on_time_threshold():
+    transport = FakeStreamTransport(RowSerializer(SCHEMA))
+    writer = BufferedResultWriter(transport, max_rows=1000, flush_interval=0.05)
+
+    start = time.monotonic()
+    assert writer.write([make_row(1)]) == []
+
+    assert time.monotonic() - start < 2
+    assert len(transport.stream) == 1
+    writer.close()
+
+
+def test_retried_append_is_not_duplicated():
+    transport = FakeStreamTransport(RowSerializer(SCHEMA), lose_first_response=True)
+    writer = BufferedResultWriter(transport, max_rows=3, flush_interval=60)
+
+    errors = writer.write([make_row(1), make_row(2), make_row(3)])
+    assert errors == []
+    assert writer.write([make_row(4), make_row(5), make_row(6)]) == []
+
+    assert len(transport.stream) == 6
+    assert [offset for offset, _ in transport.appends] == [0, 0, 3]
+    writer.close()
+
+
+def test_writer_reports_invalid_rows_and_flushes_on_close():
+    transport = FakeStreamTransport(RowSerializer(SCHEMA))
+    writer = BufferedResultWriter(transport, max_rows=1000, flush_interval=60)
+
+    future = writer.submit(make_row(1))
+    with pytest.raises(ValueError):
+        writer.submit({"asset_id": "bad", "width": "wide"})
+    writer.close()
+
+    assert future.result(timeout=1) is None
+    assert len(transport.stream) == 1
+
+
+def test_rejected_row_fails_alone_and_the_rest_is_appended():
+    transport = FakeStreamTransport(RowSerializer(SCHEMA), reject_first_row=1)
+    writer = BufferedResultWriter(transport, max_rows=3, flush_interval=60)
+
+    errors = writer.write([make_row(1), make_row(2), make_row(3)])
+
+    assert [error["index"] for error in errors] == [1]
+    message_class = transport.serializer.message_class
+    assert [message_class.FromString(row).asset_id for row in transport.stream] == [
+        "asset-1",
+        "asset-3",
+    ]
+    assert writer.offset == 2
+    writer.close()
+
+
+def test_invalid_append_without_row_errors_fails_the_batch():
+    class InvalidStreamTransport(FakeStreamTransport):
+        def _send(self, serialized_rows, offset):
+            raise reject_rows([])
+
+    transport = InvalidStreamTransport(RowSerializer(SCHEMA))
+    writer = BufferedResultWriter(transport, max_rows=2, flush_interval=60)
+
+    errors = writer.write([make_row(1), make_row(2)])
+
+    assert [error["index"] for error in errors] == [0, 1]
+    writer.close()
+
+
+def test_pending_rows_are_committed_before_write_returns():
+    transport = FakePendingTransport(RowSerializer(SCHEMA))
+    writer = BufferedResultWriter(transport, max_rows=2, flush_interval=60)
+
+    assert writer.write([make_row(1), make_row(2)]) == []
+    assert len(transport.client.committed) == 2
+    assert writer.write([make_row(3), make_row(4)]) == []
+
+    assert len(transport.client.committed) == 4
+    assert writer.offset == 0
+    writer.close()
+
+
+def test_failed_pending_append_is_dropped_and_later_writes_succeed():
+    transport = FakePendingTransport(RowSerializer(SCHEMA), fail_appends=1)
+    writer = BufferedResultWriter(transport, max_rows=2, flush_interval=60)
+
+    errors = writer.write([make_row(1), make_row(2)])
+    assert [error["index"] for error in errors] == [0, 1]
+    assert writer.write([make_row(3), make_row(4)]) == []
+    writer.close()
+
+    # Only the acknowledged rows are visible; the failed stream never is.
+    serializer = RowSerializer(SCHEMA)
+    assert [
+        serializer.message_class.FromString(row).asset_id for row in transport.client.committed
+    ] == ["asset-3", "asset-4"]
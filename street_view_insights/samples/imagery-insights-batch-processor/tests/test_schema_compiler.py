@@ -0,0 +1,163 @@
+import os
+import sys
+import threading
+
+from google.cloud import bigquery
+
+# Add the src directory to the Python path to allow importing 'schema_compiler'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from analysis import analyze_asset
+from config import BIGQUERY_SCHEMAS
+from schema_compiler import ParseStats, compile_schema
+
+SCHEMA = [
+    bigquery.SchemaField("asset_id", "STRING"),
+    bigquery.SchemaField(
+        "location",
+        "RECORD",
+        fields=[
+            bigquery.SchemaField("latitude", "FLOAT"),
+            bigquery.SchemaField("longitude", "FLOAT"),
+        ],
+    ),
+    bigquery.SchemaField("observation_ids", "STRING", mode="REPEATED"),
+    bigquery.SchemaField("gcs_uris", "STRING", mode="REPEATED"),
+    bigquery.SchemaField("detection_time", "TIMESTAMP"),
+    bigquery.SchemaField("transformers", "INTEGER"),
+    bigquery.SchemaField("confidence", "FLOAT"),
+    bigquery.SchemaField("damaged", "BOOLEAN"),
+    bigquery.SchemaField("notes", "STRING"),
+    bigquery.SchemaField("tags", "STRING", mode="REPEATED"),
+    bigquery.SchemaField(
+        "sign", "RECORD", fields=[bigquery.SchemaField("height_m", "FLOAT")]
+    ),
+]
+
+ASSET = {
+    "asset_id": "asset-1",
+    "location": {"latitude": 34.5, "longitude": 135.5},
+    "detection_time": "2025-05-27T03:17:03Z",
+    "observations": [{"observation_id": "obs-1", "gcs_uri": "gs://bucket/1.jpg"}],
+}
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FixedModel:
+    def __init__(self, text):
+        self.text = text
+        self.generation_configs = []
+
+    def generate_content(self, contents, generation_config=None):
+        self.generation_configs.append(generation_config)
+        return FakeResponse(self.text)
+
+
+def test_response_schema_covers_only_model_fields():
+    compiled = compile_schema(SCHEMA)
+    properties = compiled.response_schema["properties"]
+
+    assert compiled.response_schema["required"] == [
+        "transformers", "confidence", "damaged", "notes", "tags", "sign"
+    ]
+    assert "asset_id" not in properties and "location" not in properties
+    assert properties["transformers"] == {"type": "INTEGER", "nullable": True}
+    assert properties["confidence"]["type"] == "NUMBER"
+    assert properties["tags"] == {"type": "ARRAY", "items": {"type": "STRING"}}
+    assert properties["sign"]["properties"]["height_m"]["type"] == "NUMBER"
+    assert properties["error"]["type"] == "STRING"
+
+
+def test_every_prompt_schema_compiles():
+    for schema in BIGQUERY_SCHEMAS.values():
+        compiled = compile_schema(schema)
+        assert compiled.response_schema["required"]
+        assert compiled.generation_config["response_mime_type"] == "application/json"
+
+
+def test_project_coerces_values_to_column_types():
+    compiled = compile_schema(SCHEMA)
+
+    row, failures = compiled.project(
+        ASSET,
+        {
+            "transformers": "2",
+            "confidence": 1,
+            "damaged": "false",
+            "notes": 42,
+            "tags": ["a", None, "b"],
+            "sign": {"height_m": "2.5"},
+            "unexpected": "ignored",
+        },
+    )
+
+    assert failures == 0
+    assert row == {
+        "asset_id": "asset-1",
+        "location": {"latitude": 34.5, "longitude": 135.5},
+        "detection_time": "2025-05-27T03:17:03Z",
+        "observation_ids": ["obs-1"],
+        "gcs_uris": ["gs://bucket/1.jpg"],
+        "transformers": 2,
+        "confidence": 1.0,
+        "damaged": False,
+        "notes": "42",
+        "tags": ["a", "b"],
+        "sign": {"height_m": 2.5},
+    }
+
+
+def test_project_nulls_values_that_do_not_fit():
+    compiled = compile_schema(SCHEMA)
+
+    row, failures = compiled.project(
+        ASSET, {"transformers": 2.5, "damaged": "maybe", "tags": "a", "notes": None}
+    )
+
+    assert failures == 3
+    assert row["transformers"] is None and row["damaged"] is None and row["tags"] is None
+    assert row["notes"] is None
+
+
+def test_analyze_asset_requests_the_response_schema():
+    compiled = compile_schema(SCHEMA)
+    model = FixedModel('{"transformers": 3, "notes": "ok"}')
+    stats = ParseStats()
+
+    row = analyze_asset(model, ASSET, "prompt", compiled, parse_stats=stats)
+
+    assert model.generation_configs == [compiled.generation_config]
+    assert row["transformers"] == 3
+    assert stats.stats() == {
+        "responses": 1,
+        "parse_failures": 0,
+        "parse_failure_rate": 0.0,
+        "coercion_failures": 0,
+    }
+
+
+def test_parse_failures_are_counted():
+    compiled = compile_schema(SCHEMA)
+    stats = ParseStats()
+
+    def analyze(text):
+        analyze_asset(FixedModel(text), ASSET, "prompt", compiled, parse_stats=stats)
+
+    threads = [
+        threading.Thread(target=analyze, args=(text,))
+        for text in ['{"transformers": 1}', "not json", '```json\n{"notes": "x"}\n```', "{"]
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stats.responses == 4
+    assert stats.parse_failures == 2
+    assert stats.stats()["parse_failure_rate"] == 0.5
@@ -0,0 +1,107 @@
+import os
+import random
+import sys
+
+import pyarrow as pa
+import pytest
+
+# Add the src directory to the Python path to allow importing 'sharding'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from emulator import FakeBigQueryClient, synthetic_source
+from sharding import (
+    create_source_snapshot,
+    plan_observation_shards,
+    plan_shard_ranges,
+    query_shard,
+    shard_message,
+)
+
+
+class FakeSnapshotClient:
+    """Serves shard range queries from an in-memory snapshot table."""
+
+    def __init__(self, asset_ids):
+        # Mirrors ROW_NUMBER() OVER (ORDER BY asset_id) in SNAPSHOT_QUERY.
+        self.rows = [
+            {"shard_key": i, "asset_id": asset_id}
+            for i, asset_id in enumerate(sorted(asset_ids), start=1)
+        ]
+
+    def query(self, query, job_config=None):
+        params = {p.name: p.value for p in job_config.query_parameters}
+        matched = [
+            row for row in self.rows
+            if params["shard_start"] <= row["shard_key"] <= params["shard_end"]
+        ]
+        return FakeJob(matched)
+
+
+class FakeJob:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def result(self):
+        return iter(self.rows)
+
+
+def test_plan_shard_ranges_covers_every_key_once():
+    for total_rows in [0, 1, 49, 50, 51, 1000, 1234]:
+        for shard_size in [1, 7, 50, 5000]:
+            keys = [
+                key
+                for start, end in plan_shard_ranges(total_rows, shard_size)
+                for key in range(start, end + 1)
+            ]
+            assert keys == list(range(1, total_rows + 1))
+
+
+def test_plan_shard_ranges_rejects_non_positive_size():
+    with pytest.raises(ValueError):
+        plan_shard_ranges(10, 0)
+
+
+def test_no_asset_lost_or_duplicated_across_shards():
+    rng = random.Random(42)
+    asset_ids = [f"asset-{rng.getrandbits(64):016x}" for _ in range(2017)]
+    client = FakeSnapshotClient(asset_ids)
+
+    seen = []
+    for start, end in plan_shard_ranges(len(asset_ids), 50):
+        message = shard_message("queue", "project.dataset.snapshot", start, end)
+        seen.extend(row["asset_id"] for row in query_shard(client, message, "unused"))
+
+    assert len(seen) == len(set(seen))
+    assert sorted(seen) == sorted(asset_ids)
+
+
+def test_observation_shards_balance_skewed_assets():
+    # Most assets have one image, a few have fifty.
+    source = synthetic_source(300, observations_per_asset=1)
+    observations = source.column("observations").to_pylist()
+    for i in range(0, 300, 60):
+        observations[i] = observations[i] * 50
+    source = source.set_column(
+        source.schema.get_field_index("observations"),
+        "observations",
+        pa.array(observations, type=source.schema.field("observations").type),
+    )
+    client = FakeBigQueryClient(source)
+    snapshot = "project.dataset.source_snapshot_test"
+    create_source_snapshot(client, "SELECT 1", snapshot, 1)
+
+    plan = plan_observation_shards(client, snapshot, 40)
+
+    keys = [key for start, end, _, _ in plan for key in range(start, end + 1)]
+    assert keys == list(range(1, 301))
+    assert sum(shard[2] for shard in plan) == 300
+    assert sum(shard[3] for shard in plan) == 300 - 5 + 5 * 50
+    # A shard only exceeds the target by the assets that straddle its end.
+    assert all(shard[3] < 40 + 50 for shard in plan)
+
+
+def test_plan_observation_shards_rejects_non_positive_target():
+    with pytest.raises(ValueError):
+        plan_observation_shards(None, "project.dataset.snapshot", 0)
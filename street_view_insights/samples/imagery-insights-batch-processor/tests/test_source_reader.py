@@ -0,0 +1,169 @@
+import datetime
+import os
+import sys
+
+import pyarrow as pa
+
+# Add the src directory to the Python path to allow importing 'source_reader'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from sharding import plan_shard_ranges, shard_message
+from source_reader import (
+    ArrowFileSourceReader,
+    StorageSourceReader,
+    build_task_payloads,
+)
+
+SNAPSHOT_SCHEMA = pa.schema(
+    [
+        ("shard_key", pa.int64()),
+        ("asset_id", pa.string()),
+        (
+            "location",
+            pa.struct([("latitude", pa.float64()), ("longitude", pa.float64())]),
+        ),
+        ("detection_time", pa.timestamp("us", tz="UTC")),
+        (
+            "observations",
+            pa.list_(
+                pa.struct([("observation_id", pa.string()), ("gcs_uri", pa.string())])
+            ),
+        ),
+    ]
+)
+
+
+def make_rows(count):
+    base_time = datetime.datetime(2025, 5, 27, 3, 17, 3, tzinfo=datetime.timezone.utc)
+    return [
+        {
+            "shard_key": i,
+            "asset_id": f"asset-{i:05d}",
+            "location": {"latitude": 34.0 + i / 1000, "longitude": 135.0 - i / 1000},
+            "detection_time": base_time + datetime.timedelta(minutes=i),
+            "observations": [
+                {"observation_id": f"obs-{i}-{j}", "gcs_uri": f"gs://bucket/{i}/{j}.jpg"}
+                for j in range(i % 4)
+            ],
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def write_snapshot(path, rows):
+    table = pa.Table.from_pylist(rows, schema=SNAPSHOT_SCHEMA)
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def expected_payload(row):
+    return {
+        "asset_id": row["asset_id"],
+        "location": row["location"],
+        "detection_time": row["detection_time"].strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "observations": row["observations"],
+    }
+
+
+def test_build_task_payloads_matches_row_by_row_payloads():
+    rows = make_rows(25)
+    batch = pa.RecordBatch.from_pylist(rows, schema=SNAPSHOT_SCHEMA)
+    assert build_task_payloads(batch) == [expected_payload(row) for row in rows]
+
+
+def test_build_task_payloads_handles_sliced_batches():
+    rows = make_rows(25)
+    batch = pa.RecordBatch.from_pylist(rows, schema=SNAPSHOT_SCHEMA).slice(7, 10)
+    assert build_task_payloads(batch) == [expected_payload(row) for row in rows[7:17]]
+
+
+def test_arrow_file_reader_serves_each_asset_once(tmp_path):
+    rows = make_rows(503)
+    path = tmp_path / "snapshot.arrow"
+    write_snapshot(path, rows)
+    reader = ArrowFileSourceReader(str(path), batch_size=16)
+
+    payloads = []
+    for start, end in plan_shard_ranges(len(rows), 50):
+        for batch in reader.read_shard(shard_message("queue", "p.d.t", start, end)):
+            payloads.extend(build_task_payloads(batch))
+
+    assert payloads == [expected_payload(row) for row in rows]
+
+
+def test_arrow_file_reader_serves_offset_shards(tmp_path):
+    rows = make_rows(30)
+    path = tmp_path / "snapshot.arrow"
+    write_snapshot(path, rows)
+    reader = ArrowFileSourceReader(str(path))
+
+    batches = reader.read_shard({"limit": 10, "offset": 5})
+    payloads = [p for batch in batches for p in build_task_payloads(batch)]
+    assert payloads == [expected_payload(row) for row in rows[5:15]]
+
+
+class FakeReadClient:
+    """Splits a snapshot key range across several in-memory read streams."""
+
+    def __init__(self, rows, stream_count):
+        self.table = pa.Table.from_pylist(rows, schema=SNAPSHOT_SCHEMA)
+        self.stream_count = stream_count
+
+    def create_read_session(self, parent, read_session, max_stream_count):
+        restriction = read_session.read_options.row_restriction.split()
+        start, end = int(restriction[2]), int(restriction[4])
+        selected = self.table.slice(start - 1, end - start + 1)
+        count = min(self.stream_count, max_stream_count)
+        step = -(-selected.num_rows // count)
+        self.streams = {
+            f"stream-{i}": selected.slice(i * step, step) for i in range(count)
+        }
+        return FakeSession([FakeStream(name) for name in self.streams])
+
+    def read_rows(self, name):
+        return FakeRowsReader(self.streams[name])
+
+
+class FakeSession:
+    def __init__(self, streams):
+        self.streams = streams
+
+
+class FakeStream:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeRowsReader:
+    def __init__(self, table):
+        self.table = table
+
+    def rows(self, session):
+        return self
+
+    @property
+    def pages(self):
+        return [FakePage(batch) for batch in self.table.to_batches(max_chunksize=8)]
+
+
+class FakePage:
+    def __init__(self, batch):
+        self.batch = batch
+
+    def to_arrow(self):
+        return self.batch
+
+
+def test_storage_reader_merges_parallel_streams():
+    rows = make_rows(200)
+    reader = StorageSourceReader(FakeReadClient(rows, stream_count=4), "project")
+
+    batches = reader.read_shard(shard_message("queue", "p.d.t", 11, 150))
+    payloads = [p for batch in batches for p in build_task_payloads(batch)]
+
+    assert sorted(payloads, key=lambda p: p["asset_id"]) == [
+        expected_payload(row) for row in rows[10:150]
+    ]
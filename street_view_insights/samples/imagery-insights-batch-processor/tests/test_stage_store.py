@@ -0,0 +1,141 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Add the src directory to the Python path to allow importing 'stage_store'
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+import main
+from config import DEAD_LETTER_AFTER_RETRIES, SELECTED_PROMPT_KEYS
+from emulator import FakeBigQueryClient, FakeGeminiModel, synthetic_source
+from stage_store import ANALYZED, WRITTEN, SQLiteStageStore
+
+KEY = SELECTED_PROMPT_KEYS[0]
+
+
+def test_written_records_supersede_analyzed_ones(tmp_path):
+    store = SQLiteStageStore(str(tmp_path / "stages.sqlite"))
+    store.save_analyzed("queue/1", [("a", "P", {"width": 1}), ("b", "P", {"width": 2})])
+    store.mark_written("queue/1", [("a", "P")])
+    store.save_analyzed("queue/2", [("a", "P", {"width": 3})])
+
+    assert store.load("queue/1") == {
+        "a": {"P": (WRITTEN, None)},
+        "b": {"P": (ANALYZED, {"width": 2})},
+    }
+    store.clear("queue/1")
+    assert store.load("queue/1") == {}
+    assert store.load("queue/2") == {"a": {"P": (ANALYZED, {"width": 3})}}
+
+
+class FlakySink:
+    """Fails the first `failures` writes, then accepts every row."""
+
+    def __init__(self, failures=1):
+        self.failures = failures
+        self.rows = []
+
+    def write(self, rows):
+        if self.failures:
+            self.failures -= 1
+            return [{"index": i, "errors": ["backend error"]} for i in range(len(rows))]
+        self.rows.extend(rows)
+        return []
+
+
+class FailingModel(FakeGeminiModel):
+    def generate_content(self, contents, generation_config=None):
+        self.calls += 1
+        raise RuntimeError("model unavailable")
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """The /process endpoint with a fake model, sink, stage store and BigQuery."""
+    model = FakeGeminiModel(median_latency=0.0)
+    sink = FlakySink()
+    bq_client = FakeBigQueryClient(synthetic_source(0))
+    monkeypatch.setattr(main, "model", model)
+    overrides = {
+        main.get_result_sinks: {KEY: sink},
+        main.get_stage_store: SQLiteStageStore(str(tmp_path / "stages.sqlite")),
+        main.get_response_cache: None,
+        main.get_evaluators: {},
+        main.bigquery_client: bq_client,
+    }
+    for getter, value in overrides.items():
+        getter.override(value)
+    yield main.app.test_client(), model, sink, bq_client
+    for getter in overrides:
+        getter.reset()
+
+
+def post_task(client, body, retry_count):
+    return client.post(
+        "/process",
+        data=json.dumps(body),
+        content_type="application/json",
+        headers={
+            "X-CloudTasks-QueueName": "queue",
+            "X-CloudTasks-TaskName": "task-1",
+            "X-CloudTasks-TaskRetryCount": str(retry_count),
+        },
+    )
+
+
+def make_batch(count):
+    return {
+        "assets": [
+            {
+                "asset_id": f"asset-{i}",
+                "observations": [{"observation_id": f"obs-{i}", "gcs_uri": f"gs://b/{i}.jpg"}],
+            }
+            for i in range(count)
+        ]
+    }
+
+
+def test_retry_after_failed_insert_skips_the_model(service):
+    client, model, sink, _ = service
+
+    assert post_task(client, make_batch(3), retry_count=0).status_code == 500
+    assert model.calls == 3 and sink.rows == []
+
+    assert post_task(client, make_batch(3), retry_count=1).status_code == 200
+    assert model.calls == 3
+    assert sorted(row["asset_id"] for row in sink.rows) == ["asset-0", "asset-1", "asset-2"]
+
+
+def test_retry_writes_only_unwritten_rows(service):
+    client, model, sink, _ = service
+    sink.failures = 0
+    body = make_batch(2)
+    # The second asset fails analysis; the first is written.
+    body["assets"][1]["observations"] = None
+
+    assert post_task(client, body, retry_count=0).status_code == 500
+    assert [row["asset_id"] for row in sink.rows] == ["asset-0"]
+
+    body = make_batch(2)
+    assert post_task(client, body, retry_count=1).status_code == 200
+    assert [row["asset_id"] for row in sink.rows] == ["asset-0", "asset-1"]
+    assert model.calls == 2
+
+
+def test_repeatedly_failing_assets_are_dead_lettered(service, monkeypatch):
+    client, _, _, bq_client = service
+    monkeypatch.setattr(main, "model", FailingModel())
+
+    assert post_task(client, make_batch(2), retry_count=DEAD_LETTER_AFTER_RETRIES - 1).status_code == 500
+    response = post_task(client, make_batch(2), retry_count=DEAD_LETTER_AFTER_RETRIES)
+
+    assert response.status_code == 200
+    assert {r["status"] for r in response.get_json()["results"]} == {"dead_letter"}
+    dead_letters = bq_client.rows[main.DEAD_LETTER_TABLE_ID]
+    assert [row["asset_id"] for row in dead_letters] == ["asset-0", "asset-1"]
+    assert "model unavailable" in dead_letters[0]["error"]
+    assert json.loads(dead_letters[0]["payload"])["asset_id"] == "asset-0"